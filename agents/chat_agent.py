@@ -1,90 +1,255 @@
+import asyncio
+import logging
+import time
+from config.settings import settings
+from core.history_summarizer import HistorySummarizer
 from core.llm_manager import LLMManager
-from core.prompts import SYSTEM_PROMPTS
+from core.prompt_builder import PromptBuilder
+from core.prompts import SYSTEM_PROMPTS, USER_CONTEXT_TEMPLATES
+from core.tracing import record
 from memory.vector_store import VectorStore
 from memory.conversation_memory import ConversationMemory
+from memory.semantic_cache import SemanticCache
+from memory.user_context import NEW_USER_INFO, UserContext, UserContextCache
 from database.crud import UserCRUD
-from sqlalchemy.orm import Session
-from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class PreparedTurn:
+    system_prompt: str  # 静态人设
+    context: str  # 用户信息 + 历史摘要
+    user_message: str  # 包含RAG上下文的完整用户消息
+    history: List[Dict]
+    query_embedding: Optional[List[float]] = None
+    cached_reply: Optional[str] = None  # 语义缓存命中时的回复
+    history_size: int = 0  # 会话记忆中的消息条数（压缩前）
 
 class ChatAgent:
-    def __init__(self):
-        self.llm_manager = LLMManager()
-        self.vector_store = VectorStore()
-        self.conversation_memory = ConversationMemory()
+    def __init__(
+        self,
+        llm_manager: LLMManager,
+        vector_store: VectorStore,
+        conversation_memory: ConversationMemory,
+        semantic_cache: Optional[SemanticCache] = None,
+        summarizer: Optional[HistorySummarizer] = None,
+        user_contexts: Optional[UserContextCache] = None
+    ):
+        # 组件由 core.registry 统一创建并共享，避免重复加载Embedding模型
+        self.llm_manager = llm_manager
+        self.vector_store = vector_store
+        self.conversation_memory = conversation_memory
+        self.semantic_cache = semantic_cache
+        self.summarizer = summarizer
+        self.user_contexts = user_contexts
+        self._prompt_builders: Dict[str, PromptBuilder] = {}
     
-    async def chat(
+    @staticmethod
+    async def _stage(
+        name: str,
+        operation: Awaitable,
+        timeout: float,
+        default: Any
+    ) -> Any:
+        """执行一个检索阶段：超时或出错时降级为默认值，耗时记入追踪（stage.<name>）"""
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(operation, timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("检索阶段超时，降级为无上下文", extra={"stage": name, "timeout": timeout})
+            return default
+        except Exception as e:
+            logger.warning("检索阶段失败，降级为无上下文", extra={"stage": name, "error": repr(e)})
+            return default
+        finally:
+            record(f"stage.{name}", time.perf_counter() - start)
+    
+    @staticmethod
+    def _log_usage(usage: Dict[str, int]):
+        if usage:
+            logger.info("LLM用量", extra={"usage": usage})
+    
+    def _prompt_builder(self, language: str) -> PromptBuilder:
+        """每个模型一个PromptBuilder（tokenizer按模型选择）"""
+        model = self.llm_manager.model_name(language)
+        if model not in self._prompt_builders:
+            self._prompt_builders[model] = PromptBuilder(model)
+        return self._prompt_builders[model]
+    
+    def _cache_enabled(self, language: str) -> bool:
+        return self.semantic_cache is not None and self.semantic_cache.enabled_for(language)
+    
+    async def _load_user(self, db: AsyncSession, user_id: str) -> Optional[UserContext]:
+        """用户信息和画像（启用缓存时重复对话不查询数据库）"""
+        if self.user_contexts is not None:
+            return await self.user_contexts.get(db, user_id)
+        user = await UserCRUD.get_user_with_profile(db, user_id)
+        return UserContext.from_user(user) if user is not None else None
+    
+    async def _retrieve(
         self,
         user_id: str,
         user_message: str,
-        language: str,
-        db: Session
-    ) -> str:
-        """处理对话"""
+        language: str
+    ) -> Tuple[Optional[List[float]], Optional[str], List[Dict]]:
+        """计算一次query embedding，先查语义缓存，未命中再检索相似对话"""
+        query_embedding = await self.vector_store.embed_query(user_message)
+        if query_embedding is None:
+            return None, None, []
         
-        # 1. 获取用户信息
-        user = UserCRUD.get_user(db, user_id)
-        if user:
-            if language == "zh":
-                user_info = f"姓名: {user.name}, 年龄: {user.age}"
-            elif language == "nl":
-                user_info = f"Naam: {user.name}, Leeftijd: {user.age}"
-            else:
-                user_info = f"Name: {user.name}, Age: {user.age}"
-        else:
-            user_info = "新用户" if language == "zh" else ("Nieuwe gebruiker" if language == "nl" else "New user")
+        if self._cache_enabled(language):
+            cached_reply = self.semantic_cache.lookup(language, user_id, query_embedding)
+            if cached_reply is not None:
+                return query_embedding, cached_reply, []
         
-        # 2. 检索相似对话（RAG）
         similar_convs = await self.vector_store.search_similar_conversations(
-            user_id, language, user_message, limit=2
+            user_id, language, user_message, limit=4,  # 多取几条候选，由PromptBuilder按预算取舍
+            query_embedding=query_embedding
         )
+        return query_embedding, None, similar_convs
+    
+    async def _prepare(
+        self,
+        user_id: str,
+        user_message: str,
+        language: str,
+        db: AsyncSession
+    ) -> PreparedTurn:
+        """准备调用LLM所需的系统提示词、用户消息和历史"""
         
-        if similar_convs:
-            # 使用XML标签包裹上下文，防止提示词注入
-            context_text = "\n".join([f"<conversation>\n{conv['text']}\n</conversation>" for conv in similar_convs])
-            
-            # 将上下文附加到用户消息中，而不是系统提示词
-            if language == "zh":
-                full_user_message = f"""<relevant_context>
-{context_text}
-</relevant_context>
-
-请根据上述相关上下文（如果有用的话）回答用户的问题：
-{user_message}"""
-            elif language == "nl":
-                full_user_message = f"""<relevant_context>
-{context_text}
-</relevant_context>
-
-Beantwoord de vraag van de gebruiker op basis van de bovenstaande context (indien relevant):
-{user_message}"""
-            else:
-                full_user_message = f"""<relevant_context>
-{context_text}
-</relevant_context>
-
-Answer the user's question based on the relevant context above (if applicable):
-{user_message}"""
-        else:
-            full_user_message = user_message
+        # 1. 并发获取用户信息、相似对话（RAG）和会话记忆（摘要 + 最近消息），三者互不依赖
+        user, (query_embedding, cached_reply, similar_convs), (summary, history) = await asyncio.gather(
+            self._stage(
+                "user", self._load_user(db, user_id),
+                settings.stage_timeout_user, None
+            ),
+            self._stage(
+                "rag", self._retrieve(user_id, user_message, language),
+                settings.stage_timeout_rag, (None, None, [])
+            ),
+            self._stage(
+                "memory", self.conversation_memory.get_history(user_id),
+                settings.stage_timeout_memory, (None, [])
+            )
+        )
         
-        # 3. 获取会话记忆
-        history = self.conversation_memory.get_messages(user_id)
+        if user:
+            user_info = user.info(language)
+        else:
+            user_info = NEW_USER_INFO.get(language, NEW_USER_INFO["en"])
         
-        # 4. 构建系统提示词 (不再包含context)
-        system_prompt = SYSTEM_PROMPTS[language].format(
-            user_info=user_info
+        # 2. 按模型token预算组装：静态人设在最前，用户信息、摘要、历史、RAG依次在后；
+        #    RAG片段按相似度取舍，历史从最新往前填充
+        builder = self._prompt_builder(language)
+        prompt = builder.build(
+            language=language,
+            system_prompt=SYSTEM_PROMPTS[language],
+            user_message=user_message,
+            context=USER_CONTEXT_TEMPLATES[language].format(user_info=user_info),
+            history=history,
+            summary=summary,
+            snippets=similar_convs
         )
+        logger.info("提示词组装完成", extra={
+            "model": builder.model,
+            "budget": prompt.budget,
+            "prompt_tokens": prompt.tokens,
+            "dropped_snippets": prompt.dropped_snippets,
+            "dropped_messages": prompt.dropped_messages,
+        })
         
-        # 5. 调用LLM
-        bot_response = await self.llm_manager.chat(
-            language=language,
-            system_prompt=system_prompt,
-            user_message=full_user_message,  # 使用包含上下文的完整消息
-            history=history
+        return PreparedTurn(
+            system_prompt=prompt.system_prompt,
+            context=prompt.context,
+            user_message=prompt.user_message,
+            history=prompt.history,
+            query_embedding=query_embedding,
+            cached_reply=cached_reply,
+            history_size=len(history)
         )
+    
+    def _cache_reply(self, user_id: str, language: str, turn: PreparedTurn, bot_response: str):
+        """把LLM生成的回复写入语义缓存"""
+        if turn.query_embedding is not None and bot_response and self._cache_enabled(language):
+            self.semantic_cache.store(language, user_id, turn.query_embedding, bot_response)
+    
+    async def _remember(self, user_id: str, language: str, turn: PreparedTurn, user_message: str, bot_response: str):
+        """更新会话记忆（用户消息和回复在一次往返中原子写入），历史较长时在后台生成摘要"""
+        await self.conversation_memory.add_turn(user_id, user_message, bot_response)
+        if self.summarizer is not None and self.summarizer.needs_summary(turn.history_size + 2):
+            self.summarizer.schedule(user_id, language)
+    
+    async def chat(
+        self,
+        user_id: str,
+        user_message: str,
+        language: str,
+        db: AsyncSession
+    ) -> str:
+        """处理对话"""
+        turn = await self._prepare(user_id, user_message, language, db)
         
-        # 6. 更新记忆
-        self.conversation_memory.add_message(user_id, "user", user_message)
-        self.conversation_memory.add_message(user_id, "assistant", bot_response)
+        if turn.cached_reply is not None:
+            bot_response = turn.cached_reply
+            logger.info("语义缓存命中，跳过LLM调用")
+        else:
+            # 调用LLM
+            usage: Dict[str, int] = {}
+            start = time.perf_counter()
+            bot_response = await self.llm_manager.chat(
+                language=language,
+                system_prompt=turn.system_prompt,
+                user_message=turn.user_message,  # 使用包含上下文的完整消息
+                history=turn.history,
+                context=turn.context,
+                usage=usage
+            )
+            record("llm", time.perf_counter() - start)
+            self._log_usage(usage)
+            self._cache_reply(user_id, language, turn, bot_response)
         
+        await self._remember(user_id, language, turn, user_message, bot_response)
         return bot_response
+    
+    async def stream_chat(
+        self,
+        user_id: str,
+        user_message: str,
+        language: str,
+        db: AsyncSession
+    ) -> AsyncIterator[str]:
+        """流式处理对话：逐个产出token，结束后写入会话记忆"""
+        turn = await self._prepare(user_id, user_message, language, db)
+        
+        if turn.cached_reply is not None:
+            # 语义缓存命中：整条回复作为一个token发送
+            logger.info("语义缓存命中，跳过LLM调用")
+            yield turn.cached_reply
+            await self._remember(user_id, language, turn, user_message, turn.cached_reply)
+            return
+        
+        chunks = []
+        usage: Dict[str, int] = {}
+        start = time.perf_counter()
+        async for token in self.llm_manager.stream_chat(
+            language=language,
+            system_prompt=turn.system_prompt,
+            user_message=turn.user_message,
+            history=turn.history,
+            context=turn.context,
+            usage=usage
+        ):
+            if not chunks:
+                record("llm.first_token", time.perf_counter() - start)
+            chunks.append(token)
+            yield token
+        record("llm", time.perf_counter() - start)
+        self._log_usage(usage)
+        
+        # 只有完整生成的回复才写入记忆和缓存
+        bot_response = "".join(chunks)
+        self._cache_reply(user_id, language, turn, bot_response)
+        await self._remember(user_id, language, turn, user_message, bot_response)
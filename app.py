@@ -1,17 +1,28 @@
-from fastapi import FastAPI, Request, Depends
+from fastapi import FastAPI, Request, Depends, HTTPException, Query
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, Union
+import csv
+import io
+import json
+import logging
 import os
 
 # 导入模块
 from config.settings import settings
 from core.language_router import LanguageRouter
+from core.log import setup_logging
+from core.tracing import metrics, span, trace_request
 from agents.chat_agent import ChatAgent
-from database import get_db, init_db
-from database.crud import UserCRUD, ConversationCRUD
-from memory.vector_store import VectorStore
+from core.registry import registry
+from database import SessionLocal, get_db
+from database import models
+from database.crud import ConversationCRUD, UserCRUD, decode_cursor, encode_cursor
+
+setup_logging()
+logger = logging.getLogger(__name__)
 
 # 初始化FastAPI应用
 app = FastAPI(title="暖洋洋 - Nuanyangyang")
@@ -19,23 +30,45 @@ app = FastAPI(title="暖洋洋 - Nuanyangyang")
 # 挂载静态文件
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# 初始化组件
-chat_agent = ChatAgent()
+# 初始化组件（重量级组件由registry在启动时后台预热，每个进程只有一份）
 language_router = LanguageRouter()
-vector_store = VectorStore()
 
 class ChatMessage(BaseModel):
     message: str
     language: str = None  # 可选，如果不提供则自动检测
 
+class UserUpdate(BaseModel):
+    """只更新请求中给出的字段"""
+    name: Optional[str] = None
+    age: Optional[int] = None
+    gender: Optional[str] = None
+    preferred_language: Optional[str] = None
+    dialect: Optional[str] = None
+    voice_gender: Optional[str] = None
+
+class ProfileUpdate(BaseModel):
+    """只更新请求中给出的字段；值为列表或字典，如 ["园艺"] / [{"name": "小明", "relation": "孙子"}]"""
+    family_members: Optional[Union[list, dict]] = None
+    interests: Optional[Union[list, dict]] = None
+    medical_history: Optional[Union[list, dict]] = None
+    medications: Optional[Union[list, dict]] = None
+
 @app.on_event("startup")
 async def startup_event():
-    """应用启动时初始化数据库"""
-    try:
-        init_db()
-        print("✅ Database initialized successfully!")
-    except Exception as e:
-        print(f"❌ Error initializing database: {e}")
+    """应用启动时在后台并行初始化数据库和各组件，不阻塞启动"""
+    registry.start_warmup()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时写完队列中剩余的对话"""
+    await registry.shutdown()
+
+async def get_chat_agent() -> ChatAgent:
+    """获取共享的ChatAgent，预热未完成时等待"""
+    await registry.wait_until_ready()
+    if registry.status.get("chat_agent") != "ready":
+        raise HTTPException(status_code=503, detail="服务组件未就绪，请稍后再试")
+    return registry.chat_agent
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
@@ -43,70 +76,276 @@ async def read_root():
     with open("static/index.html", encoding="utf-8") as f:
         return HTMLResponse(content=f.read(), status_code=200)
 
+def _resolve_language(message: ChatMessage, user_id: str) -> str:
+    """检测或使用指定语言"""
+    if message.language:
+        return message.language
+    with span("language_detect"):
+        return language_router.detect_language(message.message, user_id=user_id)
+
+async def _default_user_id(db: AsyncSession) -> str:
+    """默认用户（MVP阶段）；启用用户上下文缓存时每个进程只查询一次"""
+    if registry.user_contexts is not None:
+        return await registry.user_contexts.default_user_id(db)
+    user = await UserCRUD.get_or_create_default_user(db)
+    return user.user_id
+
+def _sse(event: str, data: dict) -> str:
+    """格式化一条Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @app.post("/api/chat")
-async def chat(message: ChatMessage, db: Session = Depends(get_db)):
+async def chat(
+    message: ChatMessage,
+    db: AsyncSession = Depends(get_db),
+    chat_agent: ChatAgent = Depends(get_chat_agent)
+):
     """处理聊天请求"""
-    try:
-        # 1. 检测或使用指定语言
-        if message.language:
-            language = message.language
-        else:
-            language = language_router.detect_language(message.message)
-        
-        # 2. 获取或创建默认用户（MVP阶段）
-        user = UserCRUD.get_or_create_default_user(db)
+    tracer = trace_request("chat")
+    with tracer:
+        try:
+            # 1. 获取或创建默认用户（MVP阶段）
+            user_id = await _default_user_id(db)
+            
+            # 2. 检测或使用指定语言
+            language = _resolve_language(message, user_id)
+            
+            # 3. 调用ChatAgent处理对话
+            bot_response = await chat_agent.chat(
+                user_id=user_id,
+                user_message=message.message,
+                language=language,
+                db=db
+            )
+            
+            # 4. 提交到后台写入队列（数据库 + 向量数据库），不阻塞回复
+            with span("write_submit"):
+                await registry.conversation_writer.submit(
+                    user_id, language, message.message, bot_response
+                )
+            
+            return {
+                "reply": bot_response,
+                "language": language,
+                "user_id": user_id
+            }
         
-        # 3. 调用ChatAgent处理对话
-        bot_response = await chat_agent.chat(
-            user_id=user.user_id,
-            user_message=message.message,
-            language=language,
-            db=db
-        )
-        
-        # 4. 保存对话到数据库
-        conversation = ConversationCRUD.save_conversation(
-            db=db,
-            user_id=user.user_id,
-            language=language,
-            user_message=message.message,
-            bot_response=bot_response
-        )
-        
-        # 5. 保存到向量数据库（异步）
-        await vector_store.add_conversation(
-            user_id=user.user_id,
-            language=language,
-            user_message=message.message,
-            bot_response=bot_response,
-            conversation_id=conversation.conversation_id
-        )
-        
-        return {
-            "reply": bot_response,
-            "language": language,
-            "user_id": user.user_id
-        }
+        except Exception:
+            tracer.status = "error"
+            logger.exception("对话请求处理失败")
+            return {
+                "reply": "抱歉，我遇到了一些问题。请稍后再试。",
+                "language": "zh"
+            }
+
+@app.post("/api/chat/stream")
+async def chat_stream(
+    message: ChatMessage,
+    chat_agent: ChatAgent = Depends(get_chat_agent)
+):
+    """流式处理聊天请求（Server-Sent Events）
     
-    except Exception as e:
-        print(f"Error in chat endpoint: {e}")
-        return {
-            "reply": "抱歉，我遇到了一些问题。请稍后再试。",
-            "language": "zh"
+    事件顺序: meta -> token* -> done，出错时发送 error。
+    数据库会话在生成器内部创建，保证在整个流式响应期间有效。
+    """
+    async def event_stream():
+        tracer = trace_request("chat_stream")
+        with tracer:
+            async with SessionLocal() as db:
+                try:
+                    user_id = await _default_user_id(db)
+                    language = _resolve_language(message, user_id)
+                    yield _sse("meta", {"language": language, "user_id": user_id})
+                    
+                    chunks = []
+                    async for token in chat_agent.stream_chat(
+                        user_id=user_id,
+                        user_message=message.message,
+                        language=language,
+                        db=db
+                    ):
+                        chunks.append(token)
+                        yield _sse("token", {"token": token})
+                    
+                    bot_response = "".join(chunks)
+                    with span("write_submit"):
+                        await registry.conversation_writer.submit(
+                            user_id, language, message.message, bot_response
+                        )
+                    yield _sse("done", {
+                        "reply": bot_response,
+                        "language": language,
+                        "user_id": user_id
+                    })
+                except Exception:
+                    tracer.status = "error"
+                    logger.exception("流式对话请求处理失败")
+                    yield _sse("error", {
+                        "reply": "抱歉，我遇到了一些问题。请稍后再试。",
+                        "language": "zh"
+                    })
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # 关闭nginx缓冲，保证token实时到达
         }
+    )
+
+async def _invalidate_user_context(user_id: str):
+    """用户或画像修改后，通知所有进程删除缓存的用户上下文"""
+    if registry.user_contexts is not None:
+        await registry.user_contexts.invalidate(user_id)
+
+@app.put("/api/users/{user_id}")
+async def update_user(user_id: str, update: UserUpdate, db: AsyncSession = Depends(get_db)):
+    """修改用户基本信息"""
+    if update.preferred_language is not None and update.preferred_language not in settings.supported_languages:
+        raise HTTPException(status_code=400, detail=f"不支持的语言: {update.preferred_language}")
+    user = await UserCRUD.update_user(db, user_id, update.model_dump(exclude_unset=True))
+    if user is None:
+        raise HTTPException(status_code=404, detail="用户不存在")
+    await _invalidate_user_context(user_id)
+    return {"user_id": user.user_id, "name": user.name, "age": user.age, "preferred_language": user.preferred_language}
+
+@app.put("/api/users/{user_id}/profile")
+async def update_profile(user_id: str, update: ProfileUpdate, db: AsyncSession = Depends(get_db)):
+    """修改用户画像（家人、兴趣爱好、病史、用药）"""
+    profile = await UserCRUD.update_profile(db, user_id, update.model_dump(exclude_unset=True))
+    if profile is None:
+        raise HTTPException(status_code=404, detail="用户不存在")
+    await _invalidate_user_context(user_id)
+    return {
+        "user_id": user_id,
+        "family_members": profile.family_members,
+        "interests": profile.interests,
+        "medical_history": profile.medical_history,
+        "medications": profile.medications,
+    }
+
+EXPORT_FIELDS = ["conversation_id", "created_at", "language", "user_message", "bot_response", "emotion_score"]
+
+def _conversation_dict(conversation: models.Conversation) -> dict:
+    return {
+        "conversation_id": conversation.conversation_id,
+        "created_at": conversation.created_at.isoformat() if conversation.created_at else None,
+        "language": conversation.language,
+        "user_message": conversation.user_message,
+        "bot_response": conversation.bot_response,
+        "emotion_score": conversation.emotion_score,
+    }
+
+@app.get("/api/conversations")
+async def conversation_history(
+    user_id: Optional[str] = None,
+    limit: int = Query(settings.history_page_size, ge=1, le=settings.history_page_max),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """对话历史（按时间倒序），用返回的next_cursor请求下一页，为null表示已到最早的对话"""
+    try:
+        before = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    user_id = user_id or await _default_user_id(db)
+    conversations = await ConversationCRUD.get_conversation_page(db, user_id, limit, before)
+    return {
+        "user_id": user_id,
+        "items": [_conversation_dict(c) for c in conversations],
+        "next_cursor": encode_cursor(conversations[-1]) if len(conversations) == limit else None
+    }
+
+@app.get("/api/conversations/export")
+async def export_conversations(
+    user_id: Optional[str] = None,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$")
+):
+    """导出用户的全部对话（按时间顺序，NDJSON或CSV）
+    
+    边读边写：服务端游标分批读取，约64KB发送一次，不在内存中保存完整历史。
+    """
+    async def rows():
+        buffer = io.StringIO()
+        if format == "csv":
+            writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+            buffer.write("\ufeff")  # BOM，Excel打开时能正确识别中文
+            writer.writeheader()
+        async with SessionLocal() as db:
+            target = user_id or await _default_user_id(db)
+            async for conversation in ConversationCRUD.stream_conversations(
+                db, target, settings.history_export_batch_size
+            ):
+                row = _conversation_dict(conversation)
+                if format == "csv":
+                    writer.writerow(row)
+                else:
+                    buffer.write(json.dumps(row, ensure_ascii=False) + "\n")
+                if buffer.tell() >= 65536:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+        yield buffer.getvalue()
+    
+    return StreamingResponse(
+        rows(),
+        media_type="text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f"attachment; filename=conversations.{format}"}
+    )
+
+@app.get("/api/stats")
+async def stats():
+    """运行统计（语义缓存、Embedding缓存、近期对话索引、LLM前缀缓存的命中率等）"""
+    return {
+        "semantic_cache": registry.semantic_cache.stats(),
+        "embedding_cache": registry.embedding_cache_stats(),
+        "hot_index": registry.hot_index_stats(),
+        "user_context_cache": registry.user_contexts.stats() if registry.user_contexts is not None else None,
+        "health_extraction": registry.health_extractor.stats() if registry.health_extractor is not None else None,
+        "llm_usage": registry.llm_manager.usage_stats.snapshot(),
+        "llm_providers": registry.llm_manager.stats(),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus指标：请求总耗时和各阶段耗时直方图、请求数、LLM token用量、缓存命中"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/api/health")
 async def health_check():
-    """健康检查端点"""
+    """存活检查端点：进程能响应即为存活，不依赖组件预热
+
+    附带各依赖的探测结果（缓存），依赖故障只标记为degraded，
+    不返回错误码，避免容器因外部服务故障被反复重启。
+    """
+    checks = await registry.health.check()
+    degraded = not all(r.ok for r in checks.values())
     return {
-        "status": "healthy",
-        "services": {
-            "database": "connected",
-            "redis": "connected",
-            "qdrant": "connected"
-        }
+        "status": "degraded" if degraded else "alive",
+        "checks": registry.health.snapshot()
     }
 
+@app.get("/api/ready")
+async def readiness_check():
+    """就绪检查端点：组件预热完成且数据库、Redis、Qdrant、Embedding模型均可用时才接收流量"""
+    healthy = await registry.health.healthy()
+    ready = registry.ready and healthy
+    if ready:
+        status = "ready"
+    elif registry.warming_up:
+        status = "starting"
+    else:
+        status = "unavailable"
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": status,
+            "components": registry.status,
+            "checks": registry.health.snapshot()
+        }
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
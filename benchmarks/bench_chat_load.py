@@ -0,0 +1,228 @@
+"""端到端压测：按并发数驱动 /api/chat（或 /api/chat/stream），报告吞吐量、尾延迟和各阶段耗时
+
+用法（在项目根目录执行）:
+    # 本地替身（默认）：模拟LLM服务 + 内存向量库/会话记忆/数据库 + 确定性Embedding
+    python -m benchmarks.bench_chat_load --concurrency 1,8,32 --requests 200 --save local
+    python -m benchmarks.bench_chat_load --concurrency 1,8,32 --requests 200 --compare local
+
+    # 调整模拟LLM的延迟和token速率、存储往返延迟
+    python -m benchmarks.bench_chat_load --llm-latency 0.5 --token-rate 30 --store-latency 0.002
+
+    # 压测已经运行的服务（本地PostgreSQL/Redis/Qdrant，LLM可指向 benchmarks.mock_llm_server）
+    python -m benchmarks.bench_chat_load --target http://127.0.0.1:8000 --endpoint stream
+
+每个并发级别由固定数量的worker循环发送请求（闭环），消息从常见的中文/荷兰语/英语
+短句中按固定种子抽取。各阶段耗时来自压测前后两次抓取 /metrics 的直方图差值
+（p50/p95为桶内插值估算）。--save 保存JSON基线，--compare 与基线对比，
+延迟或吞吐量变差超过 --tolerance 时标记为回归并以非零状态退出。
+"""
+import argparse
+import asyncio
+import logging
+import random
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from config.settings import settings
+from benchmarks.bench_language import SAMPLES
+from benchmarks.common import (
+    ServerThread, compare, histogram_breakdown, load_baseline, parse_metrics,
+    report_regressions, save_baseline, summarize
+)
+
+async def one_request(client: httpx.AsyncClient, endpoint: str, message: str, language: Optional[str]) -> Dict:
+    """发送一次请求，返回 {ok, latency, ttft}（毫秒）"""
+    payload = {"message": message}
+    if language:
+        payload["language"] = language
+    start = time.perf_counter()
+    ttft = None
+    if endpoint == "chat":
+        response = await client.post("/api/chat", json=payload)
+        ok = response.status_code == 200 and "user_id" in response.json()
+    else:
+        ok = False
+        async with client.stream("POST", "/api/chat/stream", json=payload) as response:
+            event = None
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[7:]
+                    if event == "token" and ttft is None:
+                        ttft = (time.perf_counter() - start) * 1000
+                    elif event == "done":
+                        ok = True
+                    elif event == "error":
+                        break
+    return {"ok": ok, "latency": (time.perf_counter() - start) * 1000, "ttft": ttft}
+
+async def run_level(client: httpx.AsyncClient, args, concurrency: int, rng: random.Random) -> Dict:
+    """以固定并发数发送args.requests个请求"""
+    messages = [rng.choice(SAMPLES) for _ in range(args.requests)]
+    next_index = 0
+    results: List[Dict] = []
+
+    async def worker():
+        nonlocal next_index
+        while next_index < len(messages):
+            language, text = messages[next_index]
+            next_index += 1
+            try:
+                results.append(await one_request(
+                    client, args.endpoint, text, language if args.fixed_language else None
+                ))
+            except httpx.HTTPError:
+                results.append({"ok": False, "latency": 0.0, "ttft": None})
+
+    before = parse_metrics((await client.get("/metrics")).text)
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    after = parse_metrics((await client.get("/metrics")).text)
+
+    ok = [r for r in results if r["ok"]]
+    summary = summarize([r["latency"] for r in ok])
+    summary.pop("count", None)
+    level = {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "throughput": round(len(ok) / elapsed, 2),
+        **summary,
+    }
+    ttfts = [r["ttft"] for r in ok if r["ttft"] is not None]
+    if ttfts:
+        ttft = summarize(ttfts)
+        level["ttft_p50"], level["ttft_p95"] = ttft["p50"], ttft["p95"]
+    stages = histogram_breakdown(before, after, "nuanyangyang_span_seconds", "span")
+    return {"summary": level, "stages": stages}
+
+def print_level(name: str, result: Dict):
+    s = result["summary"]
+    line = (f"{name:<14}{s['requests']:>6}{s['errors']:>6}{s['throughput']:>9.1f}"
+            f"{s.get('p50', 0):>10.1f}{s.get('p95', 0):>10.1f}{s.get('p99', 0):>10.1f}")
+    if "ttft_p50" in s:
+        line += f"{s['ttft_p50']:>11.1f}{s['ttft_p95']:>11.1f}"
+    print(line)
+
+def print_stages(name: str, stages: Dict[str, Dict]):
+    print(f"\n{name} 各阶段耗时（ms）")
+    print(f"  {'阶段':<32}{'次数':>8}{'均值':>10}{'p50≈':>10}{'p95≈':>10}")
+    for stage, s in sorted(stages.items(), key=lambda item: -item[1]["mean"] * item[1]["count"]):
+        print(f"  {stage:<32}{s['count']:>8}{s['mean']:>10.2f}{s['p50']:>10.2f}{s['p95']:>10.2f}")
+
+async def drive(base_url: str, args) -> Dict[str, Dict]:
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=max(args.concurrency) + 2)
+    results: Dict[str, Dict] = {}
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        # 预热：建立连接、填充会话记忆，避免首批请求的冷启动影响结果
+        for language, text in SAMPLES[:args.warmup]:
+            await one_request(client, args.endpoint, text, language)
+
+        header = (f"{'场景':<14}{'请求':>6}{'失败':>6}{'req/s':>9}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}"
+                  + (f"{'TTFT p50':>11}{'TTFT p95':>11}" if args.endpoint == "stream" else ""))
+        print(header)
+        levels = {}
+        for concurrency in args.concurrency:
+            name = f"{args.endpoint}@c{concurrency}"
+            levels[name] = await run_level(client, args, concurrency, rng)
+            print_level(name, levels[name])
+
+    for name, level in levels.items():
+        print_stages(name, level["stages"])
+        results[name] = level["summary"]
+        for stage, s in level["stages"].items():
+            results[f"{name}/{stage}"] = {"mean": s["mean"], "p95": s["p95"]}
+    return results
+
+def run_local(args) -> Dict[str, Dict]:
+    """启动模拟LLM服务和使用内存替身的应用，在同一进程内压测"""
+    from benchmarks.fakes import (
+        InMemoryConversationMemory, InMemoryDatabase, InMemoryVectorStore, LocalPubSubRedis, StubEmbeddings
+    )
+    from benchmarks.mock_llm_server import MockLLMServer
+    from memory.user_context import UserContextCache
+
+    llm_options = {
+        "latency": args.llm_latency,
+        "jitter": args.llm_jitter,
+        "slow_rate": args.llm_slow_rate,
+        "slow_latency": args.llm_slow_latency,
+        "token_delay": 1.0 / args.token_rate if args.token_rate > 0 else 0.0,
+        "seed": args.seed,
+    }
+    with InMemoryDatabase(latency=args.db_latency), MockLLMServer(args.port + 1, **llm_options) as llm:
+        settings.deepseek_api_key = settings.deepseek_api_key or "mock"
+        settings.deepseek_api_base = llm.base
+        settings.openai_api_key = "mock"
+        settings.openai_api_base = llm.base
+        settings.semantic_cache_enabled = args.semantic_cache
+        settings.tracing_enabled = True
+
+        from app import app
+        from core.registry import registry
+        logging.getLogger().setLevel(args.log_level)
+
+        embeddings = StubEmbeddings(args.embedding_dim, seconds_per_batch=args.embed_ms / 1000)
+        registry._components.update({
+            "embeddings": (embeddings, args.embedding_dim),
+            "vector_store": InMemoryVectorStore(embeddings, args.embedding_dim, latency=args.store_latency),
+            "conversation_memory": InMemoryConversationMemory(latency=args.store_latency),
+            "user_contexts": UserContextCache(redis_client=LocalPubSubRedis()),
+        })
+
+        with ServerThread(app, args.port) as server:
+            deadline = time.time() + 60
+            while not registry.ready:
+                if time.time() > deadline:
+                    raise RuntimeError(f"应用预热失败: {registry.status}")
+                time.sleep(0.1)
+            return asyncio.run(drive(server.url, args))
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端压测 /api/chat")
+    parser.add_argument("--target", help="压测已运行的服务（如 http://127.0.0.1:8000），不指定则使用本地替身")
+    parser.add_argument("--endpoint", choices=["chat", "stream"], default="chat")
+    parser.add_argument("--concurrency", default="1,8,32", help="逗号分隔的并发数")
+    parser.add_argument("--requests", type=int, default=200, help="每个并发级别的请求数")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fixed-language", action="store_true", help="请求中带上语言，跳过语言检测")
+    # 本地替身参数
+    parser.add_argument("--port", type=int, default=9201, help="应用端口（模拟LLM服务使用下一个端口）")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="模拟LLM首token延迟（秒）")
+    parser.add_argument("--llm-jitter", type=float, default=0.05)
+    parser.add_argument("--llm-slow-rate", type=float, default=0.0, help="慢请求比例")
+    parser.add_argument("--llm-slow-latency", type=float, default=3.0)
+    parser.add_argument("--token-rate", type=float, default=50.0, help="流式输出速率（token/秒），0表示不限速")
+    parser.add_argument("--embed-ms", type=float, default=5.0, help="模拟每批Embedding推理耗时（毫秒）")
+    parser.add_argument("--embedding-dim", type=int, default=1024)
+    parser.add_argument("--store-latency", type=float, default=0.001, help="模拟Qdrant/Redis往返延迟（秒）")
+    parser.add_argument("--db-latency", type=float, default=0.002, help="模拟数据库往返延迟（秒）")
+    parser.add_argument("--semantic-cache", action="store_true", help="开启语义缓存（默认关闭，避免重复消息绕过LLM）")
+    parser.add_argument("--log-level", default="WARNING")
+    # 基线
+    parser.add_argument("--save", help="保存结果为基线（名称或.json路径）")
+    parser.add_argument("--compare", help="与基线对比（名称或.json路径）")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="判定回归的相对变化阈值")
+    parser.add_argument("--noise-floor", type=float, default=1.0, help="绝对变化小于该值（ms或req/s）时不判定回归")
+    args = parser.parse_args()
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+
+    stack = args.target or "local"
+    print(f"\n目标: {stack}, 端点: {args.endpoint}, 每级请求数: {args.requests}\n")
+    results = asyncio.run(drive(args.target, args)) if args.target else run_local(args)
+
+    params = {k: v for k, v in vars(args).items() if k not in ("save", "compare")}
+    if args.save:
+        print(f"\n基线已保存: {save_baseline(args.save, results, params)}")
+    if args.compare:
+        regressions = compare(results, load_baseline(args.compare), args.tolerance, args.noise_floor)
+        if report_regressions(regressions, args.tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
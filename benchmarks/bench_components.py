@@ -0,0 +1,316 @@
+"""core/ 和 memory/ 各组件的微基准测试
+
+用法（在项目根目录执行）:
+    python -m benchmarks.bench_components
+    python -m benchmarks.bench_components --only memory. --save components
+    python -m benchmarks.bench_components --compare components --tolerance 0.3
+
+每项测量单次操作的耗时（均值和p99，微秒）和每秒操作数。纯CPU组件直接调用；
+Embedding相关的项使用确定性的 StubEmbeddings（只测调度和批处理开销，
+真实模型的吞吐见 bench_embedding）。conversation_memory 和 vector_store
+需要本地Redis / Qdrant，连接失败时跳过；vector_store使用临时集合，测试结束后删除。
+"""
+import argparse
+import asyncio
+import sys
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from config.settings import settings
+from benchmarks.bench_language import SAMPLES
+from benchmarks.common import compare, load_baseline, percentile, report_regressions, save_baseline
+
+def measure(op: Callable[[int], object], iterations: int) -> Dict[str, float]:
+    """逐次计时同步操作"""
+    timings = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        op(i)
+        timings.append(time.perf_counter() - start)
+    return _result(timings)
+
+async def measure_async(op: Callable[[int], Awaitable], iterations: int, concurrency: int = 1) -> Dict[str, float]:
+    """逐次计时异步操作；concurrency>1时按总耗时计算吞吐量"""
+    timings = []
+
+    async def worker(offset: int):
+        for i in range(offset, iterations, concurrency):
+            start = time.perf_counter()
+            await op(i)
+            timings.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(w) for w in range(concurrency)])
+    result = _result(timings)
+    result["ops_per_sec"] = round(iterations / (time.perf_counter() - start), 1)
+    return result
+
+def _result(timings: List[float]) -> Dict[str, float]:
+    timings.sort()
+    mean = sum(timings) / len(timings)
+    return {
+        "ops_per_sec": round(1 / mean, 1) if mean else 0.0,
+        "us_per_op": round(mean * 1e6, 2),
+        "p99_us": round(percentile(timings, 0.99) * 1e6, 2),
+    }
+
+# ---------------------------------------------------------------- core/
+
+def bench_language_router(n: int) -> Dict[str, Dict]:
+    from core.language_router import LanguageRouter
+    router = LanguageRouter()
+    texts = [text for _, text in SAMPLES]
+    return {
+        "core.language_router.detect": measure(
+            lambda i: router.detect_language(texts[i % len(texts)], user_id=f"u{i % 100}"), n
+        ),
+    }
+
+def bench_prompt_builder(n: int) -> Dict[str, Dict]:
+    from core.prompt_builder import PromptBuilder
+    from core.prompts import SYSTEM_PROMPTS
+    builder = PromptBuilder("deepseek-chat")
+    history = [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": SAMPLES[i % len(SAMPLES)][1] * 3}
+        for i in range(8)
+    ]
+    snippets = [{"text": f"用户: {text}\n助手: 好的，我记住了。", "score": 0.9 - i * 0.1}
+                for i, (_, text) in enumerate(SAMPLES[:4])]
+    return {
+        "core.prompt_builder.build": measure(lambda i: builder.build(
+            "zh", SYSTEM_PROMPTS["zh"], "今天膝盖有点疼", context="## 用户信息\n姓名: 测试, 年龄: 70\n",
+            history=history, summary="老人最近膝盖疼，孙子周末会来看她。", snippets=snippets
+        ), n),
+    }
+
+def bench_tracing(n: int) -> Dict[str, Dict]:
+    from core import tracing
+
+    def with_span(i):
+        with tracing.span("bench"):
+            pass
+
+    results = {"core.tracing.span": measure(with_span, n)}
+    enabled = settings.tracing_enabled
+    settings.tracing_enabled = False
+    try:
+        results["core.tracing.span_disabled"] = measure(with_span, n)
+    finally:
+        settings.tracing_enabled = enabled
+    results["core.tracing.render"] = measure(lambda i: tracing.metrics.render(), max(1, n // 100))
+    return results
+
+def bench_llm_routing(n: int) -> Dict[str, Dict]:
+    from core.llm_routing import CircuitBreaker, LatencyTracker
+    breaker = CircuitBreaker(5, 30.0)
+    tracker = LatencyTracker()
+
+    def breaker_op(i):
+        if breaker.allow():
+            breaker.record_success()
+
+    def tracker_op(i):
+        tracker.record(0.2 + (i % 50) / 100)
+        tracker.quantile(0.95)
+
+    return {
+        "core.llm_routing.breaker": measure(breaker_op, n),
+        "core.llm_routing.latency_quantile": measure(tracker_op, n),
+    }
+
+def bench_llm_manager(n: int) -> Dict[str, Dict]:
+    from langchain_core.messages import AIMessage
+    from core.llm_manager import UsageStats, extract_usage
+    message = AIMessage(content="好的", response_metadata={"token_usage": {
+        "prompt_tokens": 1200, "completion_tokens": 40, "prompt_cache_hit_tokens": 1024
+    }})
+    stats = UsageStats()
+    return {
+        "core.llm_manager.usage": measure(lambda i: stats.record("deepseek-chat", extract_usage(message)), n),
+    }
+
+def bench_history_summarizer(n: int) -> Dict[str, Dict]:
+    from core.history_summarizer import HistorySummarizer
+    summarizer = HistorySummarizer(None, None)
+    messages = [{"role": "user" if i % 2 == 0 else "assistant", "content": SAMPLES[i][1]} for i in range(6)]
+    return {
+        "core.history_summarizer.render": measure(
+            lambda i: summarizer._render("zh", "之前聊过孙子和膝盖疼。", messages), n
+        ),
+    }
+
+async def bench_health(n: int) -> Dict[str, Dict]:
+    from core.health import HealthChecker
+
+    async def probe():
+        await asyncio.sleep(0.001)
+
+    checker = HealthChecker({name: probe for name in ("database", "redis", "qdrant", "embeddings")}, ttl=60)
+    await checker.check()
+    return {"core.health.check_cached": await measure_async(lambda i: checker.check(), n)}
+
+async def bench_conversation_writer(n: int) -> Dict[str, Dict]:
+    from benchmarks.fakes import InMemoryDatabase, InMemoryVectorStore, StubEmbeddings
+    from core.conversation_writer import ConversationWriter
+    embeddings = StubEmbeddings(256)
+    store = InMemoryVectorStore(embeddings, 256)
+    with InMemoryDatabase():
+        writer = ConversationWriter(store)
+        await writer.start()
+        start = time.perf_counter()
+        result = await measure_async(
+            lambda i: writer.submit(f"u{i % 50}", "zh", SAMPLES[i % 10][1], "好的，我在听。"), n, concurrency=32
+        )
+        await writer.stop()
+        # 吞吐量包含后台写完所有对话的时间
+        result["ops_per_sec"] = round(n / (time.perf_counter() - start), 1)
+    await store.close()
+    return {"core.conversation_writer.submit": result}
+
+# ---------------------------------------------------------------- memory/
+
+def bench_semantic_cache(n: int) -> Dict[str, Dict]:
+    import numpy as np
+    from memory.semantic_cache import SemanticCache
+    rng = np.random.default_rng(0)
+    cache = SemanticCache(threshold=0.95, max_users=1000, max_entries_per_user=20)
+    vectors = rng.standard_normal((64, 1024)).astype(np.float32)
+    for user in range(100):
+        for j in range(20):
+            cache.store("zh", f"u{user}", vectors[(user + j) % 64], "好的")
+    return {
+        "memory.semantic_cache.lookup": measure(lambda i: cache.lookup("zh", f"u{i % 100}", vectors[i % 64]), n),
+        "memory.semantic_cache.store": measure(lambda i: cache.store("zh", f"u{i % 100}", vectors[i % 64], "好的"), n),
+    }
+
+async def bench_embedding_service(n: int) -> Dict[str, Dict]:
+    from benchmarks.fakes import StubEmbeddings
+    from memory.embedding_service import EmbeddingService
+    texts = [text for _, text in SAMPLES]
+    service = EmbeddingService(StubEmbeddings(1024, seconds_per_batch=0.002))
+    try:
+        return {
+            "memory.embedding_service.embed_c1": await measure_async(
+                lambda i: service.embed(texts[i % len(texts)]), max(1, n // 50)
+            ),
+            "memory.embedding_service.embed_c32": await measure_async(
+                lambda i: service.embed(texts[i % len(texts)]), max(1, n // 5), concurrency=32
+            ),
+        }
+    finally:
+        await service.close()
+
+def bench_embedding_cache(n: int) -> Dict[str, Dict]:
+    from benchmarks.fakes import StubEmbeddings
+    from memory.embedding_cache import EmbeddingCache
+    texts = [text for _, text in SAMPLES]
+    vectors = StubEmbeddings(1024).embed_documents(texts)
+    cache = EmbeddingCache("stub", 1024)
+    # 只预填进程内缓存（不写Redis）
+    for text, vector in zip(texts, vectors):
+        cache._remember(cache._key(text), cache._decode(cache._encode(vector)))
+    return {
+        "memory.embedding_cache.local_hit": measure(lambda i: cache.get_local(texts[i % len(texts)]), n),
+        "memory.embedding_cache.encode": measure(lambda i: cache._encode(vectors[i % len(vectors)]), n),
+    }
+
+async def bench_conversation_memory(n: int) -> Optional[Dict[str, Dict]]:
+    from memory.conversation_memory import ConversationMemory
+    memory = ConversationMemory()
+    try:
+        await memory.redis_client.ping()
+    except Exception as e:
+        print(f"跳过 memory.conversation_memory（Redis不可用: {type(e).__name__}）")
+        return None
+    users = [f"bench-{i}" for i in range(20)]
+    try:
+        return {
+            "memory.conversation_memory.add_turn": await measure_async(
+                lambda i: memory.add_turn(users[i % 20], "今天天气不错", "是呀，出去走走吧。"), n // 10, concurrency=8
+            ),
+            "memory.conversation_memory.get_history": await measure_async(
+                lambda i: memory.get_history(users[i % 20]), n // 10, concurrency=8
+            ),
+        }
+    finally:
+        for user in users:
+            await memory.clear(user)
+
+async def bench_vector_store(n: int) -> Optional[Dict[str, Dict]]:
+    from qdrant_client.models import Distance, VectorParams
+    from benchmarks.fakes import StubEmbeddings
+    from database.models import generate_uuid
+    from memory.vector_store import VectorStore
+    dim = 256
+    store = VectorStore(StubEmbeddings(dim), dim)
+    language = "bench"
+    collection = f"conversations_{language}"
+    try:
+        await store.client.create_collection(collection, vectors_config=VectorParams(size=dim, distance=Distance.COSINE))
+    except Exception as e:
+        print(f"跳过 memory.vector_store（Qdrant不可用: {type(e).__name__}）")
+        await store.close()
+        return None
+    try:
+        rows = [{
+            "user_id": f"u{i % 20}", "language": language, "user_message": SAMPLES[i % len(SAMPLES)][1],
+            "bot_response": "好的，我记住了。", "conversation_id": generate_uuid()
+        } for i in range(max(20, n // 10))]
+        add = await measure_async(lambda i: store.add_conversations(rows[i:i + 1]), len(rows), concurrency=8)
+        search = await measure_async(
+            lambda i: store.search_similar_conversations(f"u{i % 20}", language, SAMPLES[i % len(SAMPLES)][1]),
+            n // 10, concurrency=8
+        )
+        return {"memory.vector_store.add": add, "memory.vector_store.search": search}
+    finally:
+        await store.client.delete_collection(collection)
+        await store.close()
+
+BENCHMARKS = [
+    ("core.language_router", bench_language_router),
+    ("core.prompt_builder", bench_prompt_builder),
+    ("core.tracing", bench_tracing),
+    ("core.llm_routing", bench_llm_routing),
+    ("core.llm_manager", bench_llm_manager),
+    ("core.history_summarizer", bench_history_summarizer),
+    ("core.health", bench_health),
+    ("core.conversation_writer", bench_conversation_writer),
+    ("memory.semantic_cache", bench_semantic_cache),
+    ("memory.embedding_cache", bench_embedding_cache),
+    ("memory.embedding_service", bench_embedding_service),
+    ("memory.conversation_memory", bench_conversation_memory),
+    ("memory.vector_store", bench_vector_store),
+]
+
+def main():
+    parser = argparse.ArgumentParser(description="core/ 和 memory/ 组件微基准测试")
+    parser.add_argument("--iterations", type=int, default=5000, help="同步组件的迭代次数（I/O类按比例减少）")
+    parser.add_argument("--only", default="", help="只运行名称以该前缀开头的项（如 memory.）")
+    parser.add_argument("--save", help="保存结果为基线（名称或.json路径）")
+    parser.add_argument("--compare", help="与基线对比（名称或.json路径）")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="判定回归的相对变化阈值")
+    args = parser.parse_args()
+
+    results: Dict[str, Dict] = {}
+    for name, bench in BENCHMARKS:
+        if not name.startswith(args.only):
+            continue
+        result = bench(args.iterations)
+        if asyncio.iscoroutine(result):
+            result = asyncio.run(result)
+        if result:
+            results.update(result)
+
+    print(f"\n{'组件':<44}{'ops/s':>14}{'us/op':>12}{'p99(us)':>12}")
+    for name, r in results.items():
+        print(f"{name:<44}{r['ops_per_sec']:>14,.1f}{r['us_per_op']:>12.2f}{r['p99_us']:>12.2f}")
+
+    if args.save:
+        print(f"\n基线已保存: {save_baseline(args.save, results, {'iterations': args.iterations})}")
+    if args.compare:
+        regressions = compare(results, load_baseline(args.compare), args.tolerance)
+        if report_regressions(regressions, args.tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Embedding吞吐量基准测试
+
+用法（在项目根目录执行）:
+    python -m benchmarks.bench_embedding --batch-sizes 1,4,16,32,64 --texts 256
+
+分别测量:
+1. 直接调用 embed_documents，在不同批大小下的 embeddings/sec
+2. 逐条 embed_query（当前请求路径的旧做法）
+3. EmbeddingService 在不同并发数下的 embeddings/sec（微批处理）
+"""
+import argparse
+import asyncio
+import time
+
+from config.settings import settings
+from memory.embeddings import create_embeddings
+from memory.embedding_service import EmbeddingService
+
+SAMPLE_TEXTS = [
+    "你好，今天天气怎么样？",
+    "我昨晚睡得不太好，腰有点疼。",
+    "孙子下周末要来看我，我很高兴。",
+    "Goedemorgen, hoe gaat het met je?",
+    "Ik heb vandaag een wandeling gemaakt in het park.",
+    "Good morning, I had a lovely breakfast today.",
+    "My knee has been hurting since yesterday.",
+    "今天中午吃了饺子，味道不错。",
+]
+
+def make_texts(count: int):
+    return [f"{SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)]} ({i})" for i in range(count)]
+
+def bench_direct(embeddings, texts, batch_size: int) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        embeddings.embed_documents(texts[i:i + batch_size])
+    return len(texts) / (time.perf_counter() - start)
+
+def bench_sequential_query(embeddings, texts) -> float:
+    start = time.perf_counter()
+    for text in texts:
+        embeddings.embed_query(text)
+    return len(texts) / (time.perf_counter() - start)
+
+async def bench_service(embeddings, texts, batch_size: int, concurrency: int) -> float:
+    service = EmbeddingService(embeddings, max_batch_size=batch_size)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(text):
+        async with semaphore:
+            await service.embed(text)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(text) for text in texts])
+    elapsed = time.perf_counter() - start
+    await service.close()
+    return len(texts) / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding吞吐量基准测试")
+    parser.add_argument("--texts", type=int, default=256, help="每轮测试的文本数量")
+    parser.add_argument("--batch-sizes", default="1,2,4,8,16,32,64")
+    parser.add_argument("--concurrency", default="1,8,32,64")
+    args = parser.parse_args()
+
+    batch_sizes = [int(x) for x in args.batch_sizes.split(",")]
+    concurrencies = [int(x) for x in args.concurrency.split(",")]
+
+    embeddings, dim = create_embeddings()
+    if embeddings is None:
+        print("❌ 未配置Embedding模型")
+        return
+
+    texts = make_texts(args.texts)
+    embeddings.embed_documents(texts[:8])  # 预热
+
+    print(f"\n模型: {settings.embedding_model} (维度: {dim}), 文本数: {len(texts)}\n")
+    print(f"{'方式':<28}{'embeddings/sec':>16}")
+    print(f"{'逐条 embed_query':<28}{bench_sequential_query(embeddings, texts):>16.1f}")
+    for batch_size in batch_sizes:
+        rate = bench_direct(embeddings, texts, batch_size)
+        print(f"{f'embed_documents batch={batch_size}':<28}{rate:>16.1f}")
+    for concurrency in concurrencies:
+        rate = asyncio.run(bench_service(
+            embeddings, texts, settings.embedding_batch_size, concurrency
+        ))
+        print(f"{f'EmbeddingService 并发={concurrency}':<28}{rate:>16.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Embedding后端对比：PyTorch BGE-M3 vs ONNX float32 vs ONNX int8
+
+用法（在项目根目录执行，需先运行 python -m memory.export_onnx）:
+    python -m benchmarks.bench_embedding_backends
+    python -m benchmarks.bench_embedding_backends --threads 1,2,4 --texts 256 --batch-size 32
+
+每个后端在独立的子进程中加载（内存占用互不影响），报告:
+- 加载耗时和加载后的常驻内存（RSS）
+- 单条文本的延迟（p50/p95，请求路径上的查询向量）
+- 批量吞吐量（texts/sec，写入路径上的对话向量）
+- 与PyTorch模型输出向量的余弦相似度（平均/最低），以及检索top-5与之一致的比例
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_embedding import make_texts
+
+def rss_mb() -> float:
+    """当前常驻内存（MB）；非Linux平台用峰值RSS代替"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+def load_backend(backend: str, threads: int):
+    if backend == "torch":
+        import torch
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        if threads:
+            torch.set_num_threads(threads)
+        return HuggingFaceEmbeddings(
+            model_name="BAAI/bge-m3",
+            model_kwargs={'device': 'cpu'},
+            encode_kwargs={'normalize_embeddings': True}
+        )
+    from memory.onnx_embeddings import OnnxEmbeddings
+    return OnnxEmbeddings(quantized=backend == "onnx-int8", threads=threads)
+
+def worker(backend: str, threads: int, texts_count: int, batch_size: int, output: str):
+    """子进程：加载一个后端，测量后把结果和向量写到output"""
+    baseline_rss = rss_mb()
+    start = time.perf_counter()
+    model = load_backend(backend, threads)
+    model.embed_documents(["预热"])
+    load_seconds = time.perf_counter() - start
+
+    texts = make_texts(texts_count)
+    latencies = []
+    for text in texts[:64]:
+        t = time.perf_counter()
+        model.embed_query(text)
+        latencies.append((time.perf_counter() - t) * 1000)
+    latencies.sort()
+
+    start = time.perf_counter()
+    vectors = []
+    for i in range(0, len(texts), batch_size):
+        vectors.extend(model.embed_documents(texts[i:i + batch_size]))
+    throughput = len(texts) / (time.perf_counter() - start)
+
+    np.save(output, np.asarray(vectors, dtype=np.float32))
+    print(json.dumps({
+        "load_s": round(load_seconds, 1),
+        "rss_mb": round(rss_mb() - baseline_rss),
+        "p50_ms": round(statistics.median(latencies), 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 1),
+        "texts_per_sec": round(throughput, 1),
+    }))
+
+def run_worker(backend: str, threads: int, args, output: str) -> dict:
+    command = [
+        sys.executable, "-m", "benchmarks.bench_embedding_backends", "--worker", backend,
+        "--worker-threads", str(threads), "--texts", str(args.texts),
+        "--batch-size", str(args.batch_size), "--worker-output", output,
+    ]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{backend} 失败:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def agreement(vectors: np.ndarray, reference: np.ndarray, k: int = 5) -> dict:
+    """逐条余弦相似度，以及以前64条为查询、检索top-k与参考后端一致的比例"""
+    cosine = np.sum(vectors * reference, axis=1)
+    queries = min(64, len(vectors))
+    overlap = []
+    for i in range(queries):
+        top = set(np.argsort(-(vectors @ vectors[i]))[1:k + 1])
+        ref_top = set(np.argsort(-(reference @ reference[i]))[1:k + 1])
+        overlap.append(len(top & ref_top) / k)
+    return {"cos_mean": float(cosine.mean()), "cos_min": float(cosine.min()), "topk": float(np.mean(overlap))}
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding后端对比")
+    parser.add_argument("--backends", default="torch,onnx-fp32,onnx-int8")
+    parser.add_argument("--threads", default="0", help="逗号分隔的线程数，0表示后端默认")
+    parser.add_argument("--texts", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-threads", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.worker_threads, args.texts, args.batch_size, args.worker_output)
+        return
+
+    backends = args.backends.split(",")
+    threads_list = [int(t) for t in args.threads.split(",")]
+    output_dir = tempfile.mkdtemp(prefix="bench_embedding_")
+
+    print(f"\n文本数: {args.texts}, 批大小: {args.batch_size}\n")
+    print(f"{'后端':<12}{'线程':>6}{'加载(s)':>9}{'RSS(MB)':>9}{'p50(ms)':>9}{'p95(ms)':>9}"
+          f"{'texts/s':>10}{'余弦均值':>10}{'余弦最低':>10}{'top5一致':>10}")
+    reference = None
+    for backend in backends:
+        for threads in threads_list:
+            output = os.path.join(output_dir, f"vectors_{backend}_{threads}.npy")
+            try:
+                r = run_worker(backend, threads, args, output)
+            except RuntimeError as e:
+                print(f"{backend:<12}{threads:>6}  {e}")
+                continue
+            vectors = np.load(output)
+            os.remove(output)
+            if reference is None and backend == "torch":
+                reference = vectors
+            line = (f"{backend:<12}{threads or '默认':>6}{r['load_s']:>9}{r['rss_mb']:>9}{r['p50_ms']:>9}"
+                    f"{r['p95_ms']:>9}{r['texts_per_sec']:>10}")
+            if reference is not None:
+                a = agreement(vectors, reference)
+                line += f"{a['cos_mean']:>10.4f}{a['cos_min']:>10.4f}{a['topk']:>10.2f}"
+            print(line)
+    os.rmdir(output_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""近期对话索引（进程内）的检索延迟和每用户内存 vs Qdrant按用户过滤检索
+
+用法（在项目根目录执行）:
+    python -m benchmarks.bench_hot_index
+    python -m benchmarks.bench_hot_index --turns 32,128,256 --users 200 --dim 1024 --qdrant
+
+对每个"每用户对话数"分别用float16和float32构建HotIndex（每位用户一个环形缓冲区），
+测量top-k检索的p50/p95/p99延迟和每用户内存（向量 + 文本）。--qdrant 时把相同数据
+写入本地Qdrant的临时集合，对比按user_id过滤检索的延迟（含网络往返），结束后删除集合。
+"""
+import argparse
+import statistics
+import time
+import tracemalloc
+import uuid
+
+import numpy as np
+
+from memory.hot_index import HotIndex
+
+def make_vectors(rng, count: int, dim: int) -> np.ndarray:
+    vectors = rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def latency_summary(latencies):
+    latencies = sorted(latencies)
+    return {
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "p99": latencies[int(len(latencies) * 0.99) - 1],
+    }
+
+def build(users: int, turns: int, dim: int, dtype: str, vectors: np.ndarray):
+    """返回 (索引, 每用户内存KB)；内存包含向量、时间戳和文本"""
+    tracemalloc.start()
+    index = HotIndex(dim, capacity=turns, max_bytes=2 ** 40, dtype=dtype, ttl=0)
+    now = time.time()
+    for u in range(users):
+        index.seed(f"user-{u}", "zh", [], complete=True)
+        for t in range(turns):
+            index.add(f"user-{u}", "zh", str(uuid.uuid4()), f"用户: 第{t}轮对话\n助手: 好的", vectors[u * turns + t], now + t)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return index, current / users / 1024
+
+def measure_hot(index: HotIndex, users: int, queries: np.ndarray, limit: int):
+    latencies = []
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        index.search(f"user-{i % users}", "zh", query, limit)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latency_summary(latencies)
+
+def measure_qdrant(users: int, turns: int, dim: int, vectors: np.ndarray, queries: np.ndarray, limit: int):
+    from qdrant_client import QdrantClient
+    from qdrant_client.models import (
+        Distance, FieldCondition, Filter, MatchValue, PayloadSchemaType, PointStruct, VectorParams
+    )
+    from config.settings import settings
+
+    client = QdrantClient(host=settings.qdrant_host, port=settings.qdrant_port)
+    name = f"bench_hot_index_{uuid.uuid4().hex[:8]}"
+    client.create_collection(name, vectors_config=VectorParams(size=dim, distance=Distance.COSINE))
+    client.create_payload_index(name, field_name="user_id", field_schema=PayloadSchemaType.KEYWORD)
+    try:
+        for start in range(0, users * turns, 1000):
+            client.upsert(name, points=[
+                PointStruct(id=str(uuid.uuid4()), vector=vectors[i].tolist(),
+                            payload={"user_id": f"user-{i // turns}", "text": f"第{i % turns}轮对话"})
+                for i in range(start, min(start + 1000, users * turns))
+            ], wait=True)
+        latencies = []
+        for i, query in enumerate(queries):
+            user_filter = Filter(must=[FieldCondition(key="user_id", match=MatchValue(value=f"user-{i % users}"))])
+            start = time.perf_counter()
+            client.query_points(name, query=query.tolist(), query_filter=user_filter, limit=limit)
+            latencies.append((time.perf_counter() - start) * 1000)
+        return latency_summary(latencies)
+    finally:
+        client.delete_collection(name)
+        client.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="近期对话索引基准测试")
+    parser.add_argument("--turns", default="32,128,256", help="每位用户的对话数（逗号分隔）")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=4)
+    parser.add_argument("--qdrant", action="store_true", help="同时测量本地Qdrant的按用户过滤检索")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"\n用户数: {args.users}, 维度: {args.dim}, top-{args.limit}, 查询数: {args.queries}\n")
+    print(f"{'对话数/用户':<12}{'方式':<10}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'内存/用户(KB)':>16}")
+    for turns in [int(t) for t in args.turns.split(",")]:
+        vectors = make_vectors(rng, args.users * turns, args.dim)
+        queries = make_vectors(rng, args.queries, args.dim)
+        for dtype in ("float16", "float32"):
+            index, kb_per_user = build(args.users, turns, args.dim, dtype, vectors)
+            r = measure_hot(index, args.users, queries, args.limit)
+            print(f"{turns:<12}{dtype:<10}{r['p50']:>10.3f}{r['p95']:>10.3f}{r['p99']:>10.3f}{kb_per_user:>16.0f}")
+        if args.qdrant:
+            try:
+                r = measure_qdrant(args.users, turns, args.dim, vectors, queries, args.limit)
+                print(f"{turns:<12}{'qdrant':<10}{r['p50']:>10.3f}{r['p95']:>10.3f}{r['p99']:>10.3f}{'-':>16}")
+            except Exception as e:
+                print(f"{turns:<12}{'qdrant':<10}  跳过（{type(e).__name__}）")
+
+if __name__ == "__main__":
+    main()
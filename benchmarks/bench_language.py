@@ -0,0 +1,118 @@
+"""语言检测对比：LanguageRouter（文字系统 + n-gram） vs langdetect
+
+用法（在项目根目录执行）:
+    python -m benchmarks.bench_language --repeat 200
+
+样本是老人聊天里常见的短句（问候、身体状况、家人），按语言标注。
+报告每秒检测次数和准确率。"ok"、"ja" 这类单独无法判断的短句
+在实际服务中沿用用户上一次的语言，不在样本里。
+langdetect只用于对比，不在依赖中，需要时单独安装: pip install langdetect
+"""
+import argparse
+import time
+
+from core.language_router import Detection, LanguageRouter
+
+class LangdetectDetector:
+    """langdetect检测器（固定随机种子，结果确定），只用于对比"""
+
+    LANGUAGE_MAP = {
+        'zh-cn': 'zh',
+        'zh-tw': 'zh',
+        'nl': 'nl',
+        'en': 'en'
+    }
+
+    def __init__(self):
+        from langdetect import DetectorFactory
+        DetectorFactory.seed = 0
+
+    def detect(self, text: str) -> Detection:
+        from langdetect import detect_langs, LangDetectException
+        try:
+            for candidate in detect_langs(text):
+                lang = self.LANGUAGE_MAP.get(candidate.lang)
+                if lang:
+                    return lang, candidate.prob
+        except LangDetectException:
+            pass
+        return None
+
+SAMPLES = [
+    ("zh", "早上好"),
+    ("zh", "今天天气不错"),
+    ("zh", "我昨晚没睡好"),
+    ("zh", "膝盖有点疼"),
+    ("zh", "孙子下午来看我"),
+    ("zh", "吃过饭了"),
+    ("zh", "血压有点高，医生让我少吃盐"),
+    ("zh", "谢谢你陪我聊天"),
+    ("zh", "我有点想我女儿了"),
+    ("zh", "今天去公园散步了"),
+    ("nl", "Goedemorgen"),
+    ("nl", "Ik heb slecht geslapen"),
+    ("nl", "Mijn rug doet pijn"),
+    ("nl", "Hoe gaat het met je?"),
+    ("nl", "Mijn kleinzoon komt vandaag"),
+    ("nl", "Ik ben een beetje moe"),
+    ("nl", "Lekker weer vandaag"),
+    ("nl", "Dank je wel"),
+    ("nl", "Ik drink een kopje koffie"),
+    ("nl", "Morgen ga ik naar de dokter"),
+    ("en", "Good morning"),
+    ("en", "I slept badly last night"),
+    ("en", "My knee hurts a little"),
+    ("en", "How are you today?"),
+    ("en", "My granddaughter is visiting"),
+    ("en", "I feel a bit tired"),
+    ("en", "Lovely weather this afternoon"),
+    ("en", "Thank you dear"),
+    ("en", "I had some tea"),
+    ("en", "The doctor said I should walk more"),
+]
+
+def run(name, detect, repeat: int) -> dict:
+    correct = 0
+    for expected, text in SAMPLES:
+        if detect(text) == expected:
+            correct += 1
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _, text in SAMPLES:
+            detect(text)
+    elapsed = time.perf_counter() - start
+    return {
+        "name": name,
+        "accuracy": correct / len(SAMPLES),
+        "per_sec": repeat * len(SAMPLES) / elapsed,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="语言检测对比")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    router = LanguageRouter()
+    candidates = [("router", router.detect_language)]
+    try:
+        langdetect = LanguageRouter(detectors=[LangdetectDetector()], min_confidence=0.01)
+        candidates.append(("langdetect", langdetect.detect_language))
+    except ImportError:
+        print("⚠️ 未安装langdetect（pip install langdetect），只测试LanguageRouter")
+
+    print(f"\n样本数: {len(SAMPLES)}, 重复: {args.repeat}\n")
+    print(f"{'检测器':<12}{'准确率':>8}{'次/秒':>12}")
+    for name, detect in candidates:
+        r = run(name, detect, args.repeat)
+        print(f"{r['name']:<12}{r['accuracy']:>8.1%}{r['per_sec']:>12.0f}")
+
+    misses = [(lang, text, router.detect_language(text)) for lang, text in SAMPLES
+              if router.detect_language(text) != lang]
+    if misses:
+        print("\nLanguageRouter 判错的样本:")
+        for lang, text, got in misses:
+            print(f"  [{lang} -> {got}] {text}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""LLM路由层测试：对冲请求和熔断回退（基于本地模拟服务，不调用真实服务商）
+
+用法（在项目根目录执行）:
+    python -m benchmarks.bench_llm_routing --requests 200 --concurrency 20
+
+在本进程内启动两个模拟服务（mock_llm_server），分别充当DeepSeek和OpenAI，
+对每个场景新建一个LLMManager并发送中文请求（首选DeepSeek）：
+- slow_tail:    首选服务商有一定比例的慢请求，对比关闭/开启对冲时的尾延迟
+- primary_down: 首选服务商全部返回503，验证熔断后直接走备用服务商
+- stream:       流式请求的首token延迟，对冲在首token之前生效
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from config.settings import settings
+from benchmarks.mock_llm_server import MockLLMServer
+
+async def drive(manager, requests: int, concurrency: int, stream: bool) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                if stream:
+                    async for _ in manager.stream_chat("zh", "你是助手", "你好"):
+                        break  # 只测首token
+                else:
+                    await manager.chat("zh", "你是助手", "你好")
+                latencies.append((time.perf_counter() - start) * 1000)
+            except Exception:
+                errors += 1
+
+    await asyncio.gather(*[one() for _ in range(requests)])
+    latencies.sort()
+    if not latencies:
+        return {"ok": 0, "errors": errors}
+    return {
+        "ok": len(latencies),
+        "errors": errors,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "p99": latencies[int(len(latencies) * 0.99) - 1],
+    }
+
+def run_scenario(name: str, primary_options: dict, alternate_options: dict, hedge: bool,
+                 stream: bool, args, ports) -> None:
+    from core.llm_manager import LLMManager
+
+    with MockLLMServer(ports[0], **primary_options) as primary, MockLLMServer(ports[1], **alternate_options) as alternate:
+        settings.deepseek_api_base = primary.base
+        settings.openai_api_base = alternate.base
+        settings.openai_api_key = settings.openai_api_key or "mock"
+        settings.llm_hedge_enabled = hedge
+        settings.llm_hedge_min_delay = args.hedge_min_delay
+        settings.llm_max_retries = 0
+
+        async def main():
+            manager = LLMManager()
+            try:
+                return await drive(manager, args.requests, args.concurrency, stream), manager.stats()
+            finally:
+                await manager.close()
+
+        r, provider_stats = asyncio.run(main())
+        p, a = primary.stats(), alternate.stats()
+
+    label = f"{name}{' +hedge' if hedge else ''}"
+    if r["ok"]:
+        print(f"{label:<22}{r['ok']:>6}{r['errors']:>6}{r['p50']:>10.0f}{r['p95']:>10.0f}{r['p99']:>10.0f}"
+              f"{p['requests']:>8}{a['requests']:>8}  {provider_stats['deepseek']['circuit']}")
+    else:
+        print(f"{label:<22}{0:>6}{r['errors']:>6}")
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM路由层测试")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--hedge-min-delay", type=float, default=0.3)
+    parser.add_argument("--port", type=int, default=9101)
+    args = parser.parse_args()
+
+    fast = {"latency": 0.2, "jitter": 0.05, "token_delay": 0.0}
+    slow_tail = {**fast, "slow_rate": 0.1, "slow_latency": 3.0}
+    down = {**fast, "error_rate": 1.0}
+
+    print(f"\n请求数: {args.requests}, 并发: {args.concurrency}, 对冲最短等待: {args.hedge_min_delay}s\n")
+    print(f"{'场景':<22}{'成功':>6}{'失败':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}"
+          f"{'首选请求':>8}{'备用请求':>8}  熔断状态")
+    scenarios = [
+        ("slow_tail", slow_tail, fast, False, False),
+        ("slow_tail", slow_tail, fast, True, False),
+        ("primary_down", down, fast, False, False),
+        ("stream", slow_tail, fast, False, True),
+        ("stream", slow_tail, fast, True, True),
+    ]
+    for i, (name, primary, alternate, hedge, stream) in enumerate(scenarios):
+        ports = (args.port + 2 * i, args.port + 2 * i + 1)
+        run_scenario(name, primary, alternate, hedge, stream, args, ports)
+
+if __name__ == "__main__":
+    main()
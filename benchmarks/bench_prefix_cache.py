@@ -0,0 +1,154 @@
+"""提示词前缀稳定性回放：旧布局 vs 静态前缀布局
+
+用法（在项目根目录执行，无需LLM服务）:
+    python -m benchmarks.bench_prefix_cache
+    python -m benchmarks.bench_prefix_cache --log conversations.jsonl
+
+按时间顺序回放对话记录（JSONL，每行包含 user_id、language、user_message、
+bot_response），像服务端一样为每轮组装提示词，然后模拟服务商的自动前缀缓存：
+每个请求与之前所有请求（同一模型）的最长公共前缀即可命中缓存的部分。
+
+- legacy: 用户信息拼接在唯一的系统提示词里，历史为最近10条的滑动窗口
+  （每轮都丢掉最早的消息，历史部分的前缀每轮都会变化）
+- stable: 静态人设单独作为第一条消息，用户信息和摘要放在第二条系统消息；
+  历史只追加，达到 history_summary_trigger 条时一次性折叠进摘要
+
+缓存粒度按服务商文档估算：DeepSeek以64 token为单位；OpenAI前缀至少1024 token，
+之后以128 token为单位。未提供记录时用 bench_language 的样本句生成模拟对话。
+"""
+import argparse
+import json
+import os
+from typing import Dict, List
+
+from config.settings import settings
+from benchmarks.bench_language import SAMPLES
+from core.llm_manager import DEEPSEEK_MODEL, GPT_MODEL
+from core.prompt_builder import PromptBuilder
+from core.prompts import SYSTEM_PROMPTS, USER_CONTEXT_TEMPLATES
+
+PROVIDERS = {
+    # 模型: (最小可缓存前缀token, 缓存粒度)
+    "deepseek-chat": (64, 64),
+    "gpt-4o-mini": (1024, 128),
+}
+
+def synthetic_log(users: int, turns: int) -> List[Dict]:
+    by_language: Dict[str, List[str]] = {}
+    for language, text in SAMPLES:
+        by_language.setdefault(language, []).append(text)
+    languages = sorted(by_language)
+    log = []
+    for turn in range(turns):
+        for u in range(users):
+            language = languages[u % len(languages)]
+            texts = by_language[language]
+            log.append({
+                "user_id": f"user-{u}",
+                "language": language,
+                "user_message": texts[(turn + u) % len(texts)],
+                "bot_response": f"({language}) reply {turn} " * 8,
+            })
+    return log
+
+def serialize(messages: List[Dict]) -> str:
+    return "".join(f"<|{m['role']}|>{m['content']}<|end|>" for m in messages)
+
+def legacy_messages(language: str, user_info: str, history: List[Dict], user_message: str) -> List[Dict]:
+    """旧布局：用户信息拼接在系统提示词末尾"""
+    system = f"{SYSTEM_PROMPTS[language]}\n\n{USER_CONTEXT_TEMPLATES[language].format(user_info=user_info)}"
+    return [{"role": "system", "content": system}, *history, {"role": "user", "content": user_message}]
+
+def stable_messages(builder: PromptBuilder, language: str, user_info: str, summary: str,
+                    history: List[Dict], user_message: str) -> List[Dict]:
+    """新布局：与 ChatAgent + LLMManager 一致"""
+    prompt = builder.build(
+        language=language,
+        system_prompt=SYSTEM_PROMPTS[language],
+        user_message=user_message,
+        context=USER_CONTEXT_TEMPLATES[language].format(user_info=user_info),
+        history=history,
+        summary=summary
+    )
+    return [
+        {"role": "system", "content": prompt.system_prompt},
+        {"role": "system", "content": prompt.context},
+        *prompt.history,
+        {"role": "user", "content": prompt.user_message},
+    ]
+
+def cached_tokens(builder: PromptBuilder, prefix: str, model: str) -> int:
+    minimum, unit = PROVIDERS.get(model, (1024, 128))
+    tokens = builder.counter.count(prefix)
+    if tokens < minimum:
+        return 0
+    return tokens // unit * unit
+
+def replay(log: List[Dict], window: int) -> Dict[str, Dict[str, float]]:
+    builders = {model: PromptBuilder(model) for model in PROVIDERS}
+    layouts = ("legacy", "stable")
+    histories: Dict[str, Dict[str, List[Dict]]] = {layout: {} for layout in layouts}
+    summaries: Dict[str, str] = {}
+    seen: Dict[str, Dict[str, List[str]]] = {layout: {} for layout in layouts}
+    totals = {layout: {"prompt": 0, "cached": 0, "requests": 0} for layout in layouts}
+
+    for i, row in enumerate(log):
+        user_id, language = row["user_id"], row["language"]
+        model = DEEPSEEK_MODEL if language == "zh" else GPT_MODEL
+        builder = builders[model]
+        user_info = f"user {user_id}, age {70 + sum(map(ord, user_id)) % 20}"
+        turn = [
+            {"role": "user", "content": row["user_message"]},
+            {"role": "assistant", "content": row["bot_response"]},
+        ]
+
+        for layout in layouts:
+            history = histories[layout].setdefault(user_id, [])
+            if layout == "legacy":
+                messages = legacy_messages(language, user_info, history, row["user_message"])
+            else:
+                messages = stable_messages(builder, language, user_info, summaries.get(user_id, ""),
+                                           history, row["user_message"])
+            text = serialize(messages)
+            previous = seen[layout].setdefault(model, [])
+            common = max((len(os.path.commonprefix([text, p])) for p in previous), default=0)
+            totals[layout]["prompt"] += builder.counter.count(text)
+            totals[layout]["cached"] += cached_tokens(builder, text[:common], model)
+            totals[layout]["requests"] += 1
+            previous.append(text)
+            del previous[:-window]
+
+            history.extend(turn)
+            if layout == "legacy":
+                del history[:-10]  # ConversationMemory.max_messages
+            elif len(history) >= settings.history_summary_trigger:
+                summaries[user_id] = f"{summaries.get(user_id, '')} summary of turn {i}.".strip()
+                del history[:-settings.history_keep_recent]
+
+    return {
+        layout: {**t, "hit_rate": t["cached"] / t["prompt"] if t["prompt"] else 0.0}
+        for layout, t in totals.items()
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="提示词前缀稳定性回放")
+    parser.add_argument("--log", help="对话记录JSONL（按时间排序）")
+    parser.add_argument("--users", type=int, default=30)
+    parser.add_argument("--turns", type=int, default=12)
+    parser.add_argument("--window", type=int, default=500, help="参与前缀匹配的最近请求数（模拟缓存容量）")
+    args = parser.parse_args()
+
+    if args.log:
+        with open(args.log, encoding="utf-8") as f:
+            log = [json.loads(line) for line in f if line.strip()]
+    else:
+        log = synthetic_log(args.users, args.turns)
+
+    results = replay(log, args.window)
+    print(f"\n请求数: {len(log)}\n")
+    print(f"{'布局':<10}{'prompt tokens':>15}{'可缓存tokens':>15}{'命中率':>10}")
+    for layout, r in results.items():
+        print(f"{layout:<10}{r['prompt']:>15}{r['cached']:>15}{r['hit_rate']:>10.1%}")
+
+if __name__ == "__main__":
+    main()
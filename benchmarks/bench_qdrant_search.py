@@ -0,0 +1,108 @@
+"""Qdrant按用户过滤检索的延迟 vs 集合规模
+
+用法（需要本地Qdrant，在项目根目录执行）:
+    python -m benchmarks.bench_qdrant_search --sizes 10000,50000,200000 --users 500
+
+对每个规模分别创建三种布局的临时集合并写入随机向量:
+- no_index: 旧布局，没有payload索引
+- indexed:  user_id keyword索引（settings.qdrant_tenant_mode="shared"）
+- tenant:   user_id租户索引 + 按用户建图（settings.qdrant_tenant_mode="tenant"）
+然后测量按user_id过滤的top-k检索延迟。测试结束后删除临时集合。
+"""
+import argparse
+import statistics
+import time
+import uuid
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    Distance, FieldCondition, Filter, HnswConfigDiff, KeywordIndexParams,
+    MatchValue, PointStruct, VectorParams
+)
+
+from config.settings import settings
+
+LAYOUTS = ("no_index", "indexed", "tenant")
+
+def create_collection(client: QdrantClient, name: str, layout: str, dim: int):
+    client.create_collection(
+        collection_name=name,
+        vectors_config=VectorParams(size=dim, distance=Distance.COSINE),
+        hnsw_config=HnswConfigDiff(payload_m=16, m=0) if layout == "tenant" else None
+    )
+    if layout != "no_index":
+        client.create_payload_index(
+            collection_name=name,
+            field_name="user_id",
+            field_schema=KeywordIndexParams(type="keyword", is_tenant=layout == "tenant")
+        )
+
+def fill(client: QdrantClient, name: str, size: int, users: int, dim: int, rng, batch: int = 1000):
+    for start in range(0, size, batch):
+        count = min(batch, size - start)
+        vectors = rng.standard_normal((count, dim)).astype(np.float32)
+        client.upsert(
+            collection_name=name,
+            points=[
+                PointStruct(
+                    id=str(uuid.uuid4()),
+                    vector=vector.tolist(),
+                    payload={"user_id": f"user-{(start + i) % users}", "created_at": time.time()}
+                )
+                for i, vector in enumerate(vectors)
+            ],
+            wait=True
+        )
+
+def wait_indexed(client: QdrantClient, name: str, timeout: float = 300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if client.get_collection(name).status == "green":
+            return
+        time.sleep(0.5)
+
+def measure(client: QdrantClient, name: str, users: int, dim: int, queries: int, rng) -> dict:
+    latencies = []
+    for i in range(queries):
+        vector = rng.standard_normal(dim).astype(np.float32).tolist()
+        user_filter = Filter(must=[
+            FieldCondition(key="user_id", match=MatchValue(value=f"user-{i % users}"))
+        ])
+        start = time.perf_counter()
+        client.query_points(collection_name=name, query=vector, query_filter=user_filter, limit=2)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Qdrant过滤检索延迟基准测试")
+    parser.add_argument("--sizes", default="10000,50000,200000")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    client = QdrantClient(host=settings.qdrant_host, port=settings.qdrant_port)
+    rng = np.random.default_rng(args.seed)
+
+    print(f"\n用户数: {args.users}, 维度: {args.dim}, 查询次数: {args.queries}\n")
+    print(f"{'规模':>10}{'布局':>10}{'p50(ms)':>10}{'p95(ms)':>10}")
+    for size in [int(x) for x in args.sizes.split(",")]:
+        for layout in LAYOUTS:
+            name = f"bench_{layout}_{size}"
+            try:
+                create_collection(client, name, layout, args.dim)
+                fill(client, name, size, args.users, args.dim, rng)
+                wait_indexed(client, name)
+                r = measure(client, name, args.users, args.dim, args.queries, rng)
+                print(f"{size:>10}{layout:>10}{r['p50']:>10.2f}{r['p95']:>10.2f}")
+            finally:
+                client.delete_collection(name)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""向量存储模式对比：召回率 / 延迟 / 内存
+
+用法（需要本地Qdrant，在项目根目录执行）:
+    python -m benchmarks.bench_quantization --points 50000 --dim 1024
+    python -m benchmarks.bench_quantization --points 50000 --dim 1536 --truncate 512,256
+
+对比的存储模式:
+- float32:          原始向量常驻内存（当前默认）
+- scalar:           int8标量量化 + 原始向量重打分
+- binary:           1bit二值量化 + 原始向量重打分（过采样）
+- binary_norescore: 只用二值向量，不重打分
+- dimN:             Matryoshka截断到前N维（模拟OpenAI text-embedding-3的dimensions参数）
+
+数据默认是按簇生成的归一化随机向量（比纯随机向量更接近真实embedding分布），
+召回率以numpy精确余弦相似度的top-k为基准。内存为常驻向量的理论占用。
+"""
+import argparse
+import statistics
+import time
+import uuid
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    BinaryQuantization, BinaryQuantizationConfig, Distance, PointStruct,
+    QuantizationSearchParams, ScalarQuantization, ScalarQuantizationConfig,
+    ScalarType, SearchParams, VectorParams
+)
+
+from config.settings import settings
+
+def make_dataset(points: int, queries: int, dim: int, clusters: int, rng):
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, points + queries)
+    data = centers[labels] + 0.6 * rng.standard_normal((points + queries, dim)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    return data[:points], data[points:]
+
+def truncate(vectors: np.ndarray, dim: int) -> np.ndarray:
+    cut = vectors[:, :dim].copy()
+    return cut / np.linalg.norm(cut, axis=1, keepdims=True)
+
+def ground_truth(data: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ data.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+def resident_bytes(mode: str, points: int, dim: int, on_disk: bool) -> int:
+    original = 0 if on_disk else points * dim * 4
+    if mode == "scalar":
+        return original + points * dim
+    if mode.startswith("binary"):
+        return original + points * dim // 8
+    return points * dim * 4
+
+def run_mode(client, name, mode, data, queries, truth, k, on_disk, oversampling):
+    dim = data.shape[1]
+    quantization = None
+    params = None
+    if mode == "scalar":
+        quantization = ScalarQuantization(scalar=ScalarQuantizationConfig(
+            type=ScalarType.INT8, quantile=0.99, always_ram=True
+        ))
+    elif mode.startswith("binary"):
+        quantization = BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    if quantization is not None:
+        params = SearchParams(quantization=QuantizationSearchParams(
+            rescore=mode != "binary_norescore", oversampling=oversampling
+        ))
+
+    client.create_collection(
+        collection_name=name,
+        vectors_config=VectorParams(
+            size=dim, distance=Distance.COSINE, on_disk=on_disk and quantization is not None
+        ),
+        quantization_config=quantization
+    )
+    ids = [str(uuid.uuid4()) for _ in range(len(data))]
+    for start in range(0, len(data), 1000):
+        client.upsert(
+            collection_name=name,
+            points=[
+                PointStruct(id=ids[i], vector=data[i].tolist())
+                for i in range(start, min(start + 1000, len(data)))
+            ],
+            wait=True
+        )
+    while client.get_collection(name).status != "green":
+        time.sleep(0.5)
+
+    index_of = {point_id: i for i, point_id in enumerate(ids)}
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        result = client.query_points(
+            collection_name=name, query=query.tolist(), limit=k, search_params=params
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+        found = {index_of[str(p.id)] for p in result.points}
+        hits += len(found & set(expected.tolist()))
+
+    latencies.sort()
+    return {
+        "recall": hits / (len(queries) * k),
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "ram_mb": resident_bytes(mode, len(data), dim, on_disk) / 1024 / 1024,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="向量存储模式对比")
+    parser.add_argument("--points", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--truncate", default="", help="Matryoshka截断维度，逗号分隔，如 512,256")
+    parser.add_argument("--on-disk", action="store_true", help="量化模式下原始向量存磁盘")
+    parser.add_argument("--oversampling", type=float, default=settings.vector_oversampling)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    data, queries = make_dataset(args.points, args.queries, args.dim, args.clusters, rng)
+    truth = ground_truth(data, queries, args.k)
+    client = QdrantClient(host=settings.qdrant_host, port=settings.qdrant_port)
+
+    runs = [(mode, data, queries) for mode in ("float32", "scalar", "binary", "binary_norescore")]
+    for dim in [int(x) for x in args.truncate.split(",") if x]:
+        runs.append((f"dim{dim}", truncate(data, dim), truncate(queries, dim)))
+
+    print(f"\n点数: {args.points}, 维度: {args.dim}, top-{args.k}, 原始向量存磁盘: {args.on_disk}\n")
+    print(f"{'模式':<18}{'recall':>8}{'p50(ms)':>10}{'p95(ms)':>10}{'常驻内存(MB)':>14}")
+    for mode, mode_data, mode_queries in runs:
+        name = f"bench_quant_{mode}"
+        try:
+            r = run_mode(client, name, mode, mode_data, mode_queries, truth,
+                         args.k, args.on_disk, args.oversampling)
+            print(f"{mode:<18}{r['recall']:>8.3f}{r['p50']:>10.2f}{r['p95']:>10.2f}{r['ram_mb']:>14.1f}")
+        finally:
+            client.delete_collection(name)
+
+if __name__ == "__main__":
+    main()
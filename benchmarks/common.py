@@ -0,0 +1,193 @@
+"""基准测试公共工具：后台服务线程、延迟统计、JSON基线与回归判定"""
+import json
+import math
+import platform
+import re
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import uvicorn
+
+BASELINE_DIR = Path(__file__).parent / "baselines"
+
+class ServerThread:
+    """在后台线程中运行一个ASGI应用（uvicorn），用于模拟服务和被测应用"""
+
+    def __init__(self, app, port: int, host: str = "127.0.0.1"):
+        self.host = host
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError(f"服务启动失败（端口 {self.port}）")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """最近秩法分位数（输入需已排序）"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize(values_ms: List[float]) -> Dict[str, float]:
+    """延迟样本（毫秒）的均值和 p50/p95/p99"""
+    values = sorted(values_ms)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 2),
+        "p50": round(percentile(values, 0.50), 2),
+        "p95": round(percentile(values, 0.95), 2),
+        "p99": round(percentile(values, 0.99), 2),
+    }
+
+# 判定回归时各指标的方向：越小越好 / 越大越好
+LOWER_IS_BETTER = ("mean", "p50", "p95", "p99", "ttft_p50", "ttft_p95", "us_per_op", "p99_us")
+HIGHER_IS_BETTER = ("throughput", "ops_per_sec")
+
+def baseline_path(name: str) -> Path:
+    path = Path(name)
+    if path.suffix == ".json" or path.parent != Path("."):
+        return path
+    return BASELINE_DIR / f"{name}.json"
+
+def save_baseline(name: str, results: Dict[str, Dict[str, float]], params: Optional[dict] = None) -> Path:
+    """保存结果为JSON基线（名称不带路径时存到 benchmarks/baselines/）"""
+    path = baseline_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "params": params or {},
+        "results": results,
+    }
+    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    return path
+
+def load_baseline(name: str) -> Dict[str, Dict[str, float]]:
+    return json.loads(baseline_path(name).read_text(encoding="utf-8"))["results"]
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float,
+    noise_floor: float = 0.0
+) -> List[Tuple[str, str, float, float, float]]:
+    """与基线对比，返回超出容差的回归 (场景, 指标, 基线值, 当前值, 变化比例)
+
+    绝对变化小于noise_floor的指标不判定回归（避免亚毫秒级阶段的抖动误报）。
+    """
+    regressions = []
+    for scenario, metrics in results.items():
+        base = baseline.get(scenario)
+        if not base:
+            continue
+        for metric, value in metrics.items():
+            old = base.get(metric)
+            if not isinstance(old, (int, float)) or not isinstance(value, (int, float)) or old <= 0:
+                continue
+            if abs(value - old) < noise_floor:
+                continue
+            change = (value - old) / old
+            if metric in LOWER_IS_BETTER and change > tolerance:
+                regressions.append((scenario, metric, old, value, change))
+            elif metric in HIGHER_IS_BETTER and -change > tolerance:
+                regressions.append((scenario, metric, old, value, change))
+    return regressions
+
+def report_regressions(regressions, tolerance: float) -> bool:
+    """打印回归列表，有回归时返回True"""
+    if not regressions:
+        print(f"\n与基线对比：未发现超过 {tolerance:.0%} 的回归")
+        return False
+    print(f"\n⚠️  与基线对比发现 {len(regressions)} 项回归（容差 {tolerance:.0%}）:")
+    for scenario, metric, old, new, change in regressions:
+        print(f"  REGRESSION {scenario} {metric}: {old:g} -> {new:g} ({change:+.1%})")
+    return True
+
+_SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)$')
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+def parse_metrics(text: str) -> Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float]:
+    """解析Prometheus文本格式：{(指标名, ((标签, 值), ...)): 数值}"""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = _SAMPLE.match(line)
+        if not match:
+            continue
+        name, labels, value = match.groups()
+        samples[(name, tuple(_LABEL.findall(labels or "")))] = float(value)
+    return samples
+
+def histogram_breakdown(
+    before: Dict, after: Dict, metric: str, label: str
+) -> Dict[str, Dict[str, float]]:
+    """根据两次 /metrics 抓取之间的差值，计算直方图各序列的次数、均值和估算p50/p95（毫秒）
+
+    分位数与Prometheus的histogram_quantile一样在桶内线性插值。
+    """
+    series: Dict[str, Dict] = {}
+    for (name, labels), value in after.items():
+        delta = value - before.get((name, labels), 0.0)
+        labels = dict(labels)
+        key = labels.get(label)
+        if key is None or not name.startswith(metric):
+            continue
+        entry = series.setdefault(key, {"buckets": []})
+        if name == f"{metric}_bucket":
+            bound = float("inf") if labels["le"] == "+Inf" else float(labels["le"])
+            entry["buckets"].append((bound, delta))
+        elif name == f"{metric}_sum":
+            entry["sum"] = delta
+        elif name == f"{metric}_count":
+            entry["count"] = delta
+
+    breakdown = {}
+    for key, entry in series.items():
+        count = entry.get("count", 0)
+        if count <= 0:
+            continue
+        buckets = sorted(entry["buckets"])
+        breakdown[key] = {
+            "count": int(count),
+            "mean": round(entry.get("sum", 0.0) / count * 1000, 2),
+            "p50": round(_bucket_quantile(buckets, 0.50) * 1000, 2),
+            "p95": round(_bucket_quantile(buckets, 0.95) * 1000, 2),
+        }
+    return breakdown
+
+def _bucket_quantile(buckets: List[Tuple[float, float]], q: float) -> float:
+    total = buckets[-1][1] if buckets else 0
+    if total <= 0:
+        return 0.0
+    rank = q * total
+    lower_bound, lower_count = 0.0, 0.0
+    for bound, cumulative in buckets:
+        if cumulative >= rank:
+            if bound == float("inf"):
+                return lower_bound
+            if cumulative == lower_count:
+                return bound
+            return lower_bound + (bound - lower_bound) * (rank - lower_count) / (cumulative - lower_count)
+        lower_bound, lower_count = bound, cumulative
+    return lower_bound
@@ -0,0 +1,249 @@
+"""压测用的本地替身：确定性Embedding、内存向量库、内存会话记忆、内存数据库、本地发布/订阅
+
+只在基准测试进程内使用，替换 core.registry 中的组件和 database.crud 的
+几个方法，不依赖Qdrant、Redis、PostgreSQL和Embedding模型。各替身的
+阶段名（span）与真实组件一致，压测报告的阶段耗时可以和真实环境直接对比。
+"""
+import asyncio
+import hashlib
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config.settings import settings
+from core.tracing import span
+from database import crud, models
+from memory.embedding_service import EmbeddingService
+
+class StubEmbeddings:
+    """确定性的Embedding替身（LangChain Embeddings接口）
+
+    字符二元组做特征哈希后归一化：相同文本得到相同向量，相似文本的余弦
+    相似度较高，语义缓存和RAG检索的行为接近真实模型。可以模拟模型推理耗时
+    （在调用线程中阻塞，和真实的本地模型一样占用Embedding工作线程）。
+    """
+
+    def __init__(self, dim: int = 1024, seconds_per_batch: float = 0.0, seconds_per_text: float = 0.0):
+        self.dim = dim
+        self.seconds_per_batch = seconds_per_batch
+        self.seconds_per_text = seconds_per_text
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        padded = f" {text.lower()} "
+        for i in range(len(padded) - 1):
+            digest = hashlib.blake2b(padded[i:i + 2].encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dim] += 1.0 if value >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        cost = self.seconds_per_batch + self.seconds_per_text * len(texts)
+        if cost:
+            time.sleep(cost)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+class InMemoryVectorStore:
+    """VectorStore的内存替身：按（语言, 用户）保存向量，numpy精确检索
+
+    latency 模拟每次检索/写入的网络往返（秒）。
+    """
+
+    def __init__(self, embeddings, embedding_dim: int, latency: float = 0.0):
+        self.embeddings = embeddings
+        self.embedding_dim = embedding_dim
+        self.embedding_service = EmbeddingService(embeddings)
+        self.latency = latency
+        self._vectors: Dict[Tuple[str, str], List[np.ndarray]] = {}
+        self._texts: Dict[Tuple[str, str], List[str]] = {}
+
+    async def ensure_collections(self):
+        pass
+
+    async def close(self):
+        await self.embedding_service.close()
+
+    async def embed_query(self, query: str) -> Optional[List[float]]:
+        with span("embedding.query"):
+            return await self.embedding_service.embed(query)
+
+    async def add_conversation(self, user_id: str, language: str, user_message: str,
+                               bot_response: str, conversation_id: str):
+        await self.add_conversations([{
+            "user_id": user_id,
+            "language": language,
+            "user_message": user_message,
+            "bot_response": bot_response,
+            "conversation_id": conversation_id,
+        }])
+
+    async def add_conversations(self, conversations: List[Dict]) -> int:
+        texts = [f"用户: {c['user_message']}\n助手: {c['bot_response']}" for c in conversations]
+        with span("embedding.batch"):
+            vectors = await self.embedding_service.embed_many(texts)
+        with span("qdrant.upsert"):
+            await asyncio.sleep(self.latency)
+            for conv, text, vector in zip(conversations, texts, vectors):
+                scope = (conv["language"], conv["user_id"])
+                self._vectors.setdefault(scope, []).append(np.asarray(vector, dtype=np.float32))
+                self._texts.setdefault(scope, []).append(text)
+        return len(conversations)
+
+    async def search_similar_conversations(self, user_id: str, language: str, query: str,
+                                           limit: int = 3, query_embedding=None) -> List[Dict]:
+        if query_embedding is None:
+            query_embedding = await self.embed_query(query)
+        with span("qdrant.search"):
+            await asyncio.sleep(self.latency)
+            vectors = self._vectors.get((language, user_id))
+            if not vectors:
+                return []
+            scores = np.stack(vectors) @ np.asarray(query_embedding, dtype=np.float32)
+            top = np.argsort(-scores)[:limit]
+            texts = self._texts[(language, user_id)]
+            return [{"text": texts[i], "score": float(scores[i])} for i in top]
+
+class InMemoryConversationMemory:
+    """ConversationMemory的内存替身（保留最近max_messages条，latency模拟Redis往返）"""
+
+    def __init__(self, latency: float = 0.0, max_messages: int = settings.history_max_messages):
+        self.latency = latency
+        self.max_messages = max_messages
+        self._messages: Dict[str, List[Dict]] = {}
+        self._summaries: Dict[str, str] = {}
+
+    async def _append(self, user_id: str, messages: List[Dict]):
+        await asyncio.sleep(self.latency)
+        history = self._messages.setdefault(user_id, [])
+        history.extend(messages)
+        del history[:-self.max_messages]
+
+    async def add_message(self, user_id: str, role: str, content: str):
+        await self._append(user_id, [{"role": role, "content": content}])
+
+    async def add_turn(self, user_id: str, user_message: str, bot_response: str):
+        with span("redis.add_turn"):
+            await self._append(user_id, [
+                {"role": "user", "content": user_message},
+                {"role": "assistant", "content": bot_response}
+            ])
+
+    async def get_messages(self, user_id: str) -> List[Dict]:
+        await asyncio.sleep(self.latency)
+        return list(self._messages.get(user_id, []))
+
+    async def get_history(self, user_id: str) -> Tuple[Optional[str], List[Dict]]:
+        with span("redis.get_history"):
+            await asyncio.sleep(self.latency)
+            return self._summaries.get(user_id), list(self._messages.get(user_id, []))
+
+    async def compact(self, user_id: str, messages: List[Dict], previous: Optional[str], summary: str) -> bool:
+        await asyncio.sleep(self.latency)
+        history = self._messages.get(user_id, [])
+        if self._summaries.get(user_id) != previous or history[:len(messages)] != messages:
+            return False
+        del history[:len(messages)]
+        self._summaries[user_id] = summary
+        return True
+
+    async def clear(self, user_id: str):
+        self._messages.pop(user_id, None)
+        self._summaries.pop(user_id, None)
+
+class LocalPubSubRedis:
+    """只实现发布/订阅的Redis替身（单进程，消息只发给本进程的订阅者）"""
+
+    def __init__(self):
+        self.queues: List[asyncio.Queue] = []
+
+    async def publish(self, channel: str, message: str) -> int:
+        for queue in self.queues:
+            queue.put_nowait({"type": "message", "channel": channel, "data": message})
+        return len(self.queues)
+
+    def pubsub(self):
+        return _LocalPubSub(self)
+
+class _LocalPubSub:
+    def __init__(self, redis: LocalPubSubRedis):
+        self.redis = redis
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def subscribe(self, channel: str):
+        self.redis.queues.append(self.queue)
+
+    async def get_message(self, ignore_subscribe_messages: bool = False, timeout: float = 0.0):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def reset(self):
+        if self.queue in self.redis.queues:
+            self.redis.queues.remove(self.queue)
+
+class InMemoryDatabase:
+    """替换 UserCRUD / ConversationCRUD 中请求路径用到的方法，latency模拟数据库往返
+
+    用法: `with InMemoryDatabase(latency=0.002):`，退出时恢复原方法。
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.users: Dict[str, models.User] = {}
+        self.conversations: List[Dict] = []
+        self._originals = []
+
+    async def _init_db(self):
+        pass
+
+    async def _get_user(self, db, user_id: str) -> Optional[models.User]:
+        with span("db.get_user"):
+            await asyncio.sleep(self.latency)
+            return self.users.get(user_id)
+
+    async def _get_user_with_profile(self, db, user_id: str) -> Optional[models.User]:
+        with span("db.get_user_with_profile"):
+            await asyncio.sleep(self.latency)
+            return self.users.get(user_id)
+
+    async def _get_or_create_default_user(self, db) -> models.User:
+        with span("db.get_or_create_default_user"):
+            await asyncio.sleep(self.latency)
+            if not self.users:
+                user = models.User(
+                    user_id=models.generate_uuid(), name="测试用户", age=70,
+                    gender="female", preferred_language="zh", created_at=datetime.utcnow()
+                )
+                self.users[user.user_id] = user
+            return next(iter(self.users.values()))
+
+    async def _save_conversations(self, db, rows: List[dict]) -> int:
+        with span("db.save_conversations"):
+            await asyncio.sleep(self.latency)
+            self.conversations.extend(rows)
+            return len(rows)
+
+    def _patch(self, owner, name: str, replacement):
+        self._originals.append((owner, name, owner.__dict__[name]))
+        setattr(owner, name, staticmethod(replacement) if isinstance(owner, type) else replacement)
+
+    def __enter__(self):
+        import core.registry
+        self._patch(crud.UserCRUD, "get_user", self._get_user)
+        self._patch(crud.UserCRUD, "get_user_with_profile", self._get_user_with_profile)
+        self._patch(crud.UserCRUD, "get_or_create_default_user", self._get_or_create_default_user)
+        self._patch(crud.ConversationCRUD, "save_conversations", self._save_conversations)
+        self._patch(core.registry, "init_db", self._init_db)
+        return self
+
+    def __exit__(self, *exc):
+        for owner, name, original in reversed(self._originals):
+            setattr(owner, name, original)
+        self._originals = []
@@ -0,0 +1,125 @@
+"""数据层并发负载测试：同步 psycopg2（旧） vs 异步 asyncpg（新）
+
+用法（需要可用的PostgreSQL，在项目根目录执行）:
+    python -m benchmarks.load_db --concurrency 1,8,32,64 --requests 500
+
+每个"请求"模拟一次对话轮次的数据库访问：查询用户、查询最近对话、
+插入一条对话（事务回滚，不留下测试数据）。
+
+- sync: 和改造前一样，在 async 协程里直接调用阻塞的同步Session，
+  整个事件循环被阻塞，并发数增加吞吐量不会提升。
+- async: AsyncSession + 连接池，等待数据库时事件循环可以处理其他请求。
+
+同时记录事件循环最大延迟（loop lag），它反映了其他用户被卡住的时间。
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from config.settings import settings
+from database import SessionLocal, engine as async_engine, init_db
+from database import models
+from database.crud import UserCRUD
+
+sync_engine = create_engine(settings.database_url)
+SyncSession = sessionmaker(bind=sync_engine)
+
+def sync_turn(user_id: str):
+    db = SyncSession()
+    try:
+        db.execute(select(models.User).where(models.User.user_id == user_id)).scalars().first()
+        db.execute(
+            select(models.Conversation)
+            .where(models.Conversation.user_id == user_id)
+            .order_by(models.Conversation.created_at.desc())
+            .limit(10)
+        ).scalars().all()
+        db.add(models.Conversation(
+            user_id=user_id, language="zh", user_message="压测", bot_response="压测"
+        ))
+        db.flush()
+        db.rollback()
+    finally:
+        db.close()
+
+async def async_turn(user_id: str):
+    async with SessionLocal() as db:
+        await db.execute(select(models.User).where(models.User.user_id == user_id))
+        await db.execute(
+            select(models.Conversation)
+            .where(models.Conversation.user_id == user_id)
+            .order_by(models.Conversation.created_at.desc())
+            .limit(10)
+        )
+        db.add(models.Conversation(
+            user_id=user_id, language="zh", user_message="压测", bot_response="压测"
+        ))
+        await db.flush()
+        await db.rollback()
+
+async def measure_loop_lag(stop: asyncio.Event, samples: list, interval: float = 0.005):
+    """周期性睡眠，实际醒来时间与预期的差值即事件循环延迟"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - expected))
+
+async def run(mode: str, user_id: str, concurrency: int, total: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            if mode == "sync":
+                sync_turn(user_id)  # 故意在事件循环中阻塞调用，复现旧行为
+            else:
+                await async_turn(user_id)
+            latencies.append(time.perf_counter() - start)
+
+    stop = asyncio.Event()
+    lag_samples = []
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lag_samples))
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(total)])
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await lag_task
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "max_lag_ms": max(lag_samples, default=0.0) * 1000,
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description="数据层并发负载测试")
+    parser.add_argument("--concurrency", default="1,8,32,64")
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    await init_db()
+    async with SessionLocal() as db:
+        user = await UserCRUD.get_or_create_default_user(db)
+
+    print(f"\n连接池: size={settings.db_pool_size}, overflow={settings.db_max_overflow}\n")
+    print(f"{'模式':<8}{'并发':>6}{'req/s':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'最大loop延迟(ms)':>18}")
+    for concurrency in [int(x) for x in args.concurrency.split(",")]:
+        for mode in ("sync", "async"):
+            r = await run(mode, user.user_id, concurrency, args.requests)
+            print(f"{mode:<8}{concurrency:>6}{r['rps']:>10.1f}{r['p50_ms']:>10.1f}"
+                  f"{r['p95_ms']:>10.1f}{r['max_lag_ms']:>18.1f}")
+
+    await async_engine.dispose()
+    sync_engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,163 @@
+"""兼容OpenAI协议的本地模拟LLM服务
+
+用法（在项目根目录执行）:
+    python -m benchmarks.mock_llm_server --port 9001 --latency 0.3 --slow-rate 0.05 --slow-latency 5
+
+然后在 .env 中设置 DEEPSEEK_API_BASE=http://127.0.0.1:9001/v1（或 OPENAI_API_BASE）
+即可在不调用真实服务商的情况下运行应用或压测。
+
+支持 POST /v1/chat/completions 的普通响应和流式（SSE）响应；usage 中同时带有
+OpenAI 的 prompt_tokens_details.cached_tokens 和 DeepSeek 的 prompt_cache_hit_tokens。
+GET /stats 返回收到的请求数、被取消的请求数和返回的错误数。
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.requests import ClientDisconnect
+
+from benchmarks.common import ServerThread
+
+def create_app(
+    latency: float = 0.3,
+    jitter: float = 0.1,
+    slow_rate: float = 0.0,
+    slow_latency: float = 5.0,
+    error_rate: float = 0.0,
+    token_delay: float = 0.01,
+    reply: str = "好的，我在听呢。今天过得怎么样？",
+    seed: int = 0
+) -> FastAPI:
+    app = FastAPI(title="mock-llm")
+    rng = random.Random(seed)
+    counters = {"requests": 0, "cancelled": 0, "errors": 0}
+
+    def delay() -> float:
+        if rng.random() < slow_rate:
+            return slow_latency
+        return max(0.0, latency + rng.uniform(-jitter, jitter))
+
+    def usage(messages) -> dict:
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 2
+        cached = prompt_tokens // 64 * 64
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(reply),
+            "total_tokens": prompt_tokens + len(reply),
+            "prompt_tokens_details": {"cached_tokens": cached},
+            "prompt_cache_hit_tokens": cached,
+            "prompt_cache_miss_tokens": prompt_tokens - cached,
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return counters
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        try:
+            body = await request.json()
+        except ClientDisconnect:
+            counters["cancelled"] += 1
+            return Response(status_code=499)
+        counters["requests"] += 1
+        model = body.get("model", "mock")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        if rng.random() < error_rate:
+            counters["errors"] += 1
+            return JSONResponse(status_code=503, content={"error": {"message": "mock overloaded", "type": "server_error"}})
+
+        wait = delay()
+        if not body.get("stream"):
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                counters["cancelled"] += 1
+                raise
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": reply},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage(body.get("messages", [])),
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage")
+
+        def chunk(delta: dict, finish_reason=None, **extra) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else [],
+                **extra,
+            }
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        async def events():
+            try:
+                await asyncio.sleep(wait)  # 首token延迟
+                yield chunk({"role": "assistant", "content": ""})
+                for char in reply:
+                    yield chunk({"content": char})
+                    await asyncio.sleep(token_delay)
+                yield chunk({}, finish_reason="stop")
+                if include_usage:
+                    yield chunk(None, usage=usage(body.get("messages", [])))
+                yield "data: [DONE]\n\n"
+            except asyncio.CancelledError:
+                counters["cancelled"] += 1
+                raise
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+class MockLLMServer(ServerThread):
+    """在后台线程中运行的模拟服务，供压测脚本在进程内使用"""
+
+    def __init__(self, port: int, **options):
+        super().__init__(create_app(**options), port)
+
+    @property
+    def base(self) -> str:
+        """作为 *_api_base 使用的地址"""
+        return f"{self.url}/v1"
+
+    def stats(self) -> dict:
+        return httpx.get(f"{self.url}/stats").json()
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="兼容OpenAI协议的模拟LLM服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--latency", type=float, default=0.3, help="首token/响应延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="慢请求比例（模拟长尾）")
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回503的比例")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="流式token间隔（秒）")
+    args = parser.parse_args()
+
+    app = create_app(args.latency, args.jitter, args.slow_rate, args.slow_latency,
+                     args.error_rate, args.token_delay)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
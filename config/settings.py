@@ -1,10 +1,12 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 
 class Settings(BaseSettings):
     # API Keys
     deepseek_api_key: str
-    openai_api_key: str = ""  # 可选，仅在使用荷兰语/英语时需要
+    openai_api_key: str = ""  # 可选，未配置时荷兰语/英语也由DeepSeek处理
+    deepseek_api_base: str = "https://api.deepseek.com/v1"
+    openai_api_base: str = ""  # 空表示OpenAI官方地址；可指向兼容OpenAI协议的代理或本地模拟服务
     
     # Database
     postgres_host: str = "localhost"
@@ -13,25 +15,156 @@ class Settings(BaseSettings):
     postgres_password: str
     postgres_db: str
     
+    # 数据库连接池
+    db_pool_size: int = 10  # 常驻连接数
+    db_max_overflow: int = 20  # 高峰期允许额外创建的连接数
+    db_pool_timeout: float = 30.0  # 等待空闲连接的最长时间（秒）
+    db_pool_recycle: int = 1800  # 连接最长存活时间（秒），避免被服务端断开
+    db_pool_pre_ping: bool = True  # 取出连接前先探测是否可用
+    
     # Redis
     redis_host: str = "localhost"
     redis_port: int = 6379
+    redis_max_connections: int = 50  # 进程内共享连接池上限
+    redis_socket_timeout: float = 2.0  # 单次命令超时（秒）
     
     # Qdrant
     qdrant_host: str = "localhost"
     qdrant_port: int = 6333
+    qdrant_grpc_port: int = 6334
+    qdrant_prefer_grpc: bool = True  # 使用gRPC传输（比REST更快），通道在进程内复用
+    qdrant_timeout: int = 5  # 请求超时（秒）
+    qdrant_upload_batch_size: int = 64  # 超过该数量的批量写入改用upload_points分批上传
+    qdrant_upload_parallel: int = 1  # upload_points并行进程数
+    # 多租户模式: "shared"（全局HNSW图 + user_id索引）
+    # 或 "tenant"（user_id作为租户键，每位用户单独建图，过滤检索不随用户数变慢）
+    qdrant_tenant_mode: str = "shared"
+    # 向量存储模式: "none"（float32）、"scalar"（int8，约1/4内存）、"binary"（1bit，约1/32内存，适合≥1024维）
+    vector_quantization: str = "none"
+    vector_on_disk: bool = False  # 原始向量存磁盘，内存中只保留量化向量
+    vector_rescore: bool = True  # 用原始向量对候选结果重打分
+    vector_oversampling: float = 2.0  # 量化粗排时多取的候选倍数
+    # 进程内近期对话索引（每位用户最近的对话向量，检索时不访问Qdrant）
+    hot_index_enabled: bool = True
+    hot_index_capacity: int = 256  # 每位用户（每种语言）保留的最近对话数
+    hot_index_max_mb: int = 128  # 总内存上限（向量和文本），超出按LRU淘汰用户
+    hot_index_dtype: str = "float16"  # "float16"（内存减半）或 "float32"（检索更快）
+    hot_index_min_score: float = 0.75  # 历史超出容量时，近期结果都不低于该相似度则不再查询Qdrant
+    hot_index_ttl: float = 60.0  # 加载后多久重新从Qdrant加载（多进程部署时其他进程写入的对话在此之后可见）；0为不过期，仅用于单进程部署
     
     # Application
     default_language: str = "zh"
     supported_languages: List[str] = ["zh", "nl", "en"]
+    language_min_confidence: float = 0.2  # 低于该置信度视为无法判断，沿用用户上次的语言
+    language_cache_size: int = 10000  # 缓存最近语言的用户数
     
     # Embedding配置
-    embedding_model: str = "bge-m3"  # 可选: "openai" 或 "bge-m3"（本地开源模型）
+    embedding_model: str = "bge-m3"  # 可选: "openai"、"bge-m3"（本地开源模型）或 "bge-m3-onnx"（ONNX Runtime，可int8量化）
+    embedding_dimensions: int = 0  # OpenAI模型的Matryoshka截断维度（如512），0表示完整1536维；修改后需重建集合
+    embedding_batch_size: int = 32  # 微批处理：每批最多合并的文本数
+    embedding_batch_wait: float = 0.005  # 微批处理：凑批最长等待时间（秒）
+    embedding_onnx_path: str = "models/bge-m3-onnx"  # python -m memory.export_onnx 导出的目录
+    embedding_onnx_quantized: bool = True  # 使用int8动态量化模型（约1/4体积，推理更快）
+    embedding_onnx_threads: int = 0  # ONNX Runtime单次推理的线程数，0表示按物理核数
+    embedding_max_length: int = 0  # 截断的最大token数，PyTorch和ONNX后端使用同一值；0表示模型自身的上限（BGE-M3为8192）
+    embedding_cache_enabled: bool = True  # 按文本内容缓存embedding结果（进程内LRU + Redis）
+    embedding_cache_size: int = 5000  # 进程内缓存条目数（float16，1024维约2KB/条）
+    embedding_cache_ttl: int = 604800  # Redis中的过期时间（秒），默认7天
+    embedding_cache_redis_timeout: float = 0.05  # 查询Redis缓存的超时（秒），超时按未命中处理
+    
+    # 语义回复缓存（相似的寒暄直接返回缓存回复，省去LLM调用）
+    semantic_cache_enabled: bool = True
+    semantic_cache_threshold: float = 0.95  # 余弦相似度阈值
+    semantic_cache_ttl: float = 600  # 缓存有效期（秒）
+    semantic_cache_max_users: int = 1000  # 最多缓存的（语言, 用户）范围数，超出按LRU淘汰
+    semantic_cache_max_entries_per_user: int = 20
+    semantic_cache_disabled_personas: List[str] = []  # 关闭缓存的人设（语言代码，如 ["nl"]）
+    
+    # 用户上下文缓存（用户信息 + 画像，多进程之间通过Redis发布/订阅失效）
+    user_context_cache_enabled: bool = True
+    user_context_cache_size: int = 10000  # 进程内缓存的用户数，超出按LRU淘汰
+    user_context_cache_ttl: float = 300  # 缓存有效期（秒），错过失效消息时的兜底
+    user_context_channel: str = "user_context:invalidate"  # 失效消息的Redis频道
+    
+    # LLM调用（共享连接池、超时、并发、对冲请求、熔断）
+    llm_max_connections: int = 100  # 共享HTTP连接池的最大连接数
+    llm_max_keepalive: int = 20  # 保持的空闲keep-alive连接数
+    llm_keepalive_expiry: float = 60.0  # 空闲连接保留时间（秒）
+    llm_connect_timeout: float = 5.0  # 建立连接超时（秒）
+    llm_timeout_deepseek: float = 30.0  # 单次请求超时（秒）；流式为两个chunk之间的最长间隔
+    llm_timeout_openai: float = 30.0
+    llm_concurrency_deepseek: int = 32  # 每个服务商同时进行的最大请求数
+    llm_concurrency_openai: int = 32
+    llm_max_retries: int = 1  # SDK内置重试次数（之后由备用服务商兜底）
+    llm_hedge_enabled: bool = True  # 首选服务商过慢时向备用服务商发对冲请求
+    llm_hedge_quantile: float = 0.95  # 超过该分位延迟仍未响应时触发对冲
+    llm_hedge_min_delay: float = 2.0  # 对冲最短等待时间（秒），延迟样本不足时使用
+    llm_breaker_failures: int = 5  # 连续失败次数达到后熔断
+    llm_breaker_reset: float = 30.0  # 熔断后多久放行试探请求（秒）
+    
+    # 提示词token预算（本地tokenizer计数，按模型名配置）
+    prompt_token_budgets: Dict[str, int] = {"deepseek-chat": 3000, "gpt-4o-mini": 3000}
+    prompt_token_budget_default: int = 3000  # 未单独配置的模型使用的预算
+    prompt_rag_max_tokens: int = 600  # RAG片段最多占用的token
+    prompt_summary_max_tokens: int = 300  # 历史摘要最多占用的token
+    
+    # 会话历史压缩（较早的消息折叠为滚动摘要，异步生成并缓存在Redis）
+    history_summary_trigger: int = 8  # 会话记忆达到该条数时触发摘要
+    history_keep_recent: int = 4  # 摘要后保留的最近消息条数
+    history_max_messages: int = 24  # 会话记忆最多保留的消息数；需大于触发条数加上一次摘要期间可能新增的消息，否则未摘要的消息会被截掉
+    history_summary_ttl: int = 86400  # 摘要在Redis中的过期时间（秒）
+    
+    # 可观测性
+    tracing_enabled: bool = True  # 请求级追踪和阶段耗时直方图；关闭后span为空操作
+    log_level: str = "INFO"
+    log_format: str = "json"  # "json"（结构化日志，一行一条）或 "text"（本地开发）
+    
+    # 健康检查（探测数据库、Redis、Qdrant和Embedding模型）
+    health_probe_timeout: float = 1.0  # 单个依赖探测超时（秒）
+    health_cache_ttl: float = 5.0  # 探测结果缓存时间（秒），期间的健康检查不访问后端
+    
+    # 对话历史查询与导出
+    history_page_size: int = 50  # 每页默认条数
+    history_page_max: int = 200  # 每页最多条数
+    history_export_batch_size: int = 500  # 导出时每次从数据库读取的条数（服务端游标）
+    
+    # 后台健康信息提取（从已保存的对话中提取健康记录和情绪分，不在请求路径上）
+    health_extraction_enabled: bool = True
+    health_extractor: str = "llm"  # "llm"（一次调用处理一批对话）或 "keywords"（本地关键词分类，无LLM成本）
+    health_extraction_batch_size: int = 20  # 每次LLM调用处理的对话轮数
+    health_extraction_concurrency: int = 2  # 每轮并发的LLM调用数（与对话请求共用LLM客户端，最多占用这么多并发额度）
+    health_extraction_interval: float = 30.0  # 没有积压时的轮询间隔（秒）
+    health_extraction_delay: float = 60.0  # 只处理该秒数之前的对话（created_at为写入数据库的时间），避免水位线跳过尚未提交的对话
+    health_extraction_language: str = "zh"  # 提取调用使用的模型路由语言
+    health_extraction_lease: float = 300.0  # 一轮的租约时长（秒），应大于一轮分类的最长耗时；进程中途退出时租约到期后由其他进程接手
+    
+    # 对话检索阶段超时（秒），超时则降级为无上下文
+    stage_timeout_user: float = 0.5
+    stage_timeout_rag: float = 1.5
+    stage_timeout_memory: float = 0.3
+    
+    # 对话异步写入（write-behind）
+    write_queue_maxsize: int = 1000  # 队列上限，满时请求会等待（背压）
+    write_batch_size: int = 32  # 每批最多写入的对话数
+    write_flush_interval: float = 0.5  # 凑批最长等待时间（秒）
+    write_workers: int = 2  # 后台写入协程数量
+    write_max_retries: int = 3  # 每个阶段的最大重试次数
+    write_retry_backoff: float = 0.5  # 重试退避基数（秒），按指数增长
+    write_enqueue_timeout: float = 2.0  # 入队最长等待时间，超时则直接同步写入
+    write_drain_timeout: float = 10.0  # 关闭时等待队列清空的最长时间
+    write_dead_letter_key: str = "writer:dead_letter"  # 逐条重试后仍无法写入数据库的对话（Redis列表，JSON）
+    write_vector_pending_key: str = "writer:vector_pending"  # 已入库但未写入向量库的conversation_id（Redis集合）
+    write_repair_interval: float = 60.0  # 补写向量的间隔（秒）
+    write_repair_batch_size: int = 200  # 每次补写的最多条数
     
     @property
     def database_url(self) -> str:
         return f"postgresql://{self.postgres_user}:{self.postgres_password}@{self.postgres_host}:{self.postgres_port}/{self.postgres_db}"
     
+    @property
+    def async_database_url(self) -> str:
+        return f"postgresql+asyncpg://{self.postgres_user}:{self.postgres_password}@{self.postgres_host}:{self.postgres_port}/{self.postgres_db}"
+    
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8-sig"
@@ -0,0 +1,243 @@
+import asyncio
+import json
+import logging
+from dataclasses import dataclass, asdict, field
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional
+
+from config.settings import settings
+from core.tracing import traced
+from database import SessionLocal
+from database.crud import ConversationCRUD
+from database.models import generate_uuid
+from memory.redis_client import get_redis
+from memory.vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class PendingConversation:
+    conversation_id: str
+    user_id: str
+    language: str
+    user_message: str
+    bot_response: str
+    emotion_score: Optional[float] = None
+    # 入队时间；写入数据库时改为提交时间（见 save_conversations），向量payload使用同一时间
+    created_at: datetime = field(default_factory=datetime.utcnow)
+
+class ConversationWriter:
+    """对话异步写入管道（write-behind）
+
+    请求只负责把对话放入有界队列，后台协程按批写入PostgreSQL，
+    再批量生成embedding写入Qdrant。队列满时入队会等待（背压），
+    等待超时则退化为直接写入，保证对话不丢失。
+
+    整批写入数据库失败时逐条重试，只丢弃写不进去的行，并把它们放入Redis死信列表；
+    已入库但写入向量库失败的conversation_id记在Redis集合中，由后台定期补写。
+    """
+
+    def __init__(self, vector_store: VectorStore, redis_client=None):
+        self.vector_store = vector_store
+        self.redis = redis_client or get_redis()
+        self.queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self):
+        """启动后台写入协程"""
+        if self.running:
+            return
+        self.queue = asyncio.Queue(maxsize=settings.write_queue_maxsize)
+        self._workers = [
+            asyncio.create_task(self._worker())
+            for _ in range(settings.write_workers)
+        ]
+        self._workers.append(asyncio.create_task(self._repair_worker()))
+        logger.info("对话写入管道已启动", extra={"workers": settings.write_workers})
+
+    async def submit(
+        self,
+        user_id: str,
+        language: str,
+        user_message: str,
+        bot_response: str
+    ) -> str:
+        """提交一条对话，返回预先生成的conversation_id"""
+        item = PendingConversation(
+            conversation_id=generate_uuid(),
+            user_id=user_id,
+            language=language,
+            user_message=user_message,
+            bot_response=bot_response
+        )
+
+        if not self.running:
+            await self._write_batch([item])
+            return item.conversation_id
+
+        try:
+            await asyncio.wait_for(
+                self.queue.put(item),
+                timeout=settings.write_enqueue_timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning("对话写入队列已满，直接写入")
+            await self._write_batch([item])
+        return item.conversation_id
+
+    async def stop(self):
+        """等待队列清空后停止后台协程"""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(
+                self.queue.join(),
+                timeout=settings.write_drain_timeout
+            )
+            logger.info("对话写入队列已清空")
+        except asyncio.TimeoutError:
+            logger.error("关闭超时，部分对话未写入", extra={"pending": self.queue.qsize()})
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _collect_batch(self) -> List[PendingConversation]:
+        """阻塞等待第一条，然后在flush间隔内凑满一批"""
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + settings.write_flush_interval
+
+        while len(batch) < settings.write_batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _worker(self):
+        while True:
+            batch = await self._collect_batch()
+            try:
+                await self._write_batch(batch)
+            except Exception:
+                # 写入过程中的意外错误不能结束协程，否则队列不再被消费
+                logger.exception("对话批量写入出错，整批放入死信列表", extra={"size": len(batch)})
+                await self._dead_letter([asdict(item) for item in batch])
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    @traced("writer.batch")
+    async def _write_batch(self, batch: List[PendingConversation]):
+        rows = [asdict(item) for item in batch]
+
+        # 先写数据库，再写向量库；两个阶段分别重试，
+        # 向量写入失败不会导致数据库重复插入
+        saved = await self._with_retry("数据库", lambda: self._save_rows(rows))
+        if not saved:
+            rows = await self._save_one_by_one(rows)
+            if not rows:
+                return
+        indexed = await self._with_retry(
+            "向量数据库", lambda: self.vector_store.add_conversations(rows)
+        )
+        if not indexed:
+            await self._mark_vector_pending([row["conversation_id"] for row in rows])
+
+    async def _save_one_by_one(self, rows: List[dict]) -> List[dict]:
+        """整批失败后逐条写入，返回写入成功的行；失败的行放入死信列表"""
+        saved, failed = [], []
+        for row in rows:
+            try:
+                await self._save_rows([row])
+                saved.append(row)
+            except Exception as e:
+                failed.append(row)
+                logger.error("对话写入数据库失败，已放入死信列表", extra={
+                    "conversation_id": row["conversation_id"], "user_id": row["user_id"], "error": repr(e)
+                })
+        if failed:
+            await self._dead_letter(failed)
+        return saved
+
+    async def _dead_letter(self, rows: List[dict]):
+        """把写不进数据库的行放入Redis死信列表，供人工排查后重新导入"""
+        try:
+            await self.redis.rpush(
+                settings.write_dead_letter_key,
+                *[json.dumps(row, ensure_ascii=False, default=str) for row in rows]
+            )
+        except Exception as e:
+            logger.error("写入死信列表失败", extra={
+                "conversation_ids": [row["conversation_id"] for row in rows], "error": repr(e)
+            })
+
+    async def _mark_vector_pending(self, conversation_ids: List[str]):
+        """记录已入库但未写入向量库的对话，由 _repair_worker 补写"""
+        try:
+            await self.redis.sadd(settings.write_vector_pending_key, *conversation_ids)
+        except Exception as e:
+            logger.error("记录待补写向量失败", extra={"conversation_ids": conversation_ids, "error": repr(e)})
+
+    async def _repair_worker(self):
+        while True:
+            await asyncio.sleep(settings.write_repair_interval)
+            try:
+                await self.repair_vectors()
+            except Exception as e:
+                logger.warning("补写向量失败", extra={"error": repr(e)})
+
+    async def repair_vectors(self) -> int:
+        """从数据库读取待补写的对话重新写入向量库（按point ID覆盖，重复写入无副作用）"""
+        ids = await self.redis.spop(settings.write_vector_pending_key, settings.write_repair_batch_size)
+        if not ids:
+            return 0
+        async with SessionLocal() as db:
+            conversations = await ConversationCRUD.get_conversations_by_ids(db, ids)
+        rows = [{
+            "conversation_id": c.conversation_id,
+            "user_id": c.user_id,
+            "language": c.language,
+            "user_message": c.user_message,
+            "bot_response": c.bot_response,
+            "created_at": c.created_at,
+        } for c in conversations]
+        try:
+            await self.vector_store.add_conversations(rows)
+        except Exception:
+            await self._mark_vector_pending(ids)
+            raise
+        logger.info("已补写向量", extra={"count": len(rows)})
+        return len(rows)
+
+    @staticmethod
+    async def _save_rows(rows: List[dict]) -> int:
+        async with SessionLocal() as db:
+            return await ConversationCRUD.save_conversations(db, rows)
+
+    @staticmethod
+    async def _with_retry(stage: str, operation: Callable[[], Awaitable]) -> bool:
+        """执行操作，失败时指数退避重试，全部失败返回False"""
+        for attempt in range(1, settings.write_max_retries + 1):
+            try:
+                await operation()
+                return True
+            except Exception as e:
+                if attempt == settings.write_max_retries:
+                    logger.error("写入失败，已放弃", extra={"stage": stage, "error": repr(e)})
+                    return False
+                delay = settings.write_retry_backoff * (2 ** (attempt - 1))
+                logger.warning("写入失败，稍后重试", extra={
+                    "stage": stage, "attempt": attempt, "delay": delay, "error": repr(e)
+                })
+                await asyncio.sleep(delay)
+        return False
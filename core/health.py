@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import time
+from dataclasses import asdict, dataclass
+from typing import Awaitable, Callable, Dict, Optional
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+Probe = Callable[[], Awaitable[object]]
+
+@dataclass
+class ProbeResult:
+    status: str  # "ok"、"fail" 或 "timeout"
+    latency_ms: float
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+class HealthChecker:
+    """依赖探测
+
+    所有探测并发执行，各自有超时，结果缓存 health_cache_ttl 秒。
+    缓存过期后并发到达的检查共用同一轮探测，Docker、nginx和编排系统
+    频繁的健康检查不会把请求放大到数据库、Redis和Qdrant。
+    """
+
+    def __init__(self, probes: Dict[str, Probe], timeout: Optional[float] = None, ttl: Optional[float] = None):
+        self.probes = probes
+        self.timeout = timeout if timeout is not None else settings.health_probe_timeout
+        self.ttl = ttl if ttl is not None else settings.health_cache_ttl
+        self._results: Dict[str, ProbeResult] = {}
+        self._checked_at = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+
+    async def check(self) -> Dict[str, ProbeResult]:
+        """返回各依赖的探测结果（缓存未过期时直接返回）"""
+        if self._results and time.monotonic() - self._checked_at < self.ttl:
+            return self._results
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.create_task(self._run())
+        # shield: 某个检查请求被取消时不影响其他等待同一轮探测的请求
+        return await asyncio.shield(self._inflight)
+
+    async def healthy(self) -> bool:
+        return all(r.ok for r in (await self.check()).values())
+
+    def snapshot(self) -> Dict[str, dict]:
+        """最近一次探测结果（不触发探测）"""
+        return {name: asdict(r) for name, r in self._results.items()}
+
+    async def _run(self) -> Dict[str, ProbeResult]:
+        names = list(self.probes)
+        results = await asyncio.gather(*[self._probe(self.probes[n]) for n in names])
+        previous = self._results
+        self._results = dict(zip(names, results))
+        self._checked_at = time.monotonic()
+        for name, result in self._results.items():
+            if name in previous and previous[name].ok != result.ok:
+                logger.log(
+                    logging.INFO if result.ok else logging.WARNING,
+                    "依赖状态变化", extra={"dependency": name, **asdict(result)}
+                )
+        return self._results
+
+    async def _probe(self, probe: Probe) -> ProbeResult:
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(probe(), timeout=self.timeout)
+            status, error = "ok", None
+        except asyncio.TimeoutError:
+            status, error = "timeout", f"超过{self.timeout}秒未响应"
+        except Exception as e:
+            status, error = "fail", repr(e)
+        return ProbeResult(status, round((time.perf_counter() - start) * 1000, 1), error)
@@ -0,0 +1,393 @@
+"""后台健康信息提取：从已保存的对话中批量提取健康记录和情绪分
+
+用法（在项目根目录执行，服务运行时也可以单独启动多个进程，水位线加锁保证不重复处理）:
+    python -m core.health_extractor --once
+    python -m core.health_extractor --extractor keywords
+
+按 (created_at, conversation_id) 顺序读取水位线之后的对话，每批若干轮合并为一次
+LLM调用（或使用本地关键词分类），把结果批量写入health_records并更新对话的
+emotion_score，最后在同一事务中推进水位线。整个流程不在对话请求路径上。
+"""
+import argparse
+import asyncio
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import settings
+from core.llm_manager import LLMManager
+from core.prompts import HEALTH_EXTRACTION_PROMPT
+from core.tracing import metrics, traced
+from database import SessionLocal, models
+from database.crud import ConversationCRUD, HealthRecordCRUD, WatermarkCRUD
+from database.models import generate_uuid
+
+logger = logging.getLogger(__name__)
+
+WATERMARK = "health_extraction"
+RECORD_TYPES = ("sleep", "pain", "appetite", "mood", "medication", "fall", "other_symptom")
+SEVERITIES = ("mild", "moderate", "severe")
+
+EXTRACTED = metrics.counter(
+    "nuanyangyang_health_extracted_total", "后台健康信息提取处理的对话数", ["extractor"]
+)
+
+@dataclass
+class Extraction:
+    emotion: Optional[float] = None  # None表示未得到结果，不更新emotion_score
+    signals: List[Dict] = field(default_factory=list)  # [{"type", "severity", "detail"}]
+
+# 本地关键词分类使用的词表（按语言）。中文按子串匹配，只收录不易误判的词；
+# 荷兰语和英语按整词匹配（\b），避免 "Spain"、"teacher"、"moeder" 之类的误判
+KEYWORDS: Dict[str, Dict[str, tuple]] = {
+    "zh": {
+        "sleep": ("睡不着", "失眠", "没睡好", "睡不好", "睡得不好", "半夜醒"),
+        "pain": ("头疼", "头痛", "腰疼", "腰痛", "腿疼", "膝盖疼", "肚子疼", "胃疼", "牙疼", "关节疼", "疼得", "痛得", "疼痛", "酸痛"),
+        "appetite": ("没胃口", "吃不下", "不想吃饭", "吃不多"),
+        "mood": ("孤单", "孤独", "寂寞", "难过", "伤心", "害怕", "焦虑", "心烦"),
+        "medication": ("吃药", "药片", "降压药", "忘了吃药"),
+        "fall": ("摔倒", "摔了一跤", "跌倒", "跌了一跤"),
+        "other_symptom": ("头晕", "咳嗽", "发烧", "没力气", "喘不过气"),
+    },
+    "nl": {
+        "sleep": ("slecht geslapen", "slaap slecht", "niet slapen", "kan niet slapen"),
+        "pain": ("pijn", "pijnlijk", "doet zeer", "hoofdpijn", "rugpijn", "buikpijn"),
+        "appetite": ("geen trek", "geen eetlust", "eet slecht"),
+        "mood": ("eenzaam", "verdrietig", "bang", "somber", "angstig"),
+        "medication": ("medicijn", "medicijnen", "pillen", "tabletten"),
+        "fall": ("gevallen", "ben gevallen", "struikelde"),
+        "other_symptom": ("duizelig", "hoesten", "koorts", "benauwd"),
+    },
+    "en": {
+        "sleep": ("can't sleep", "couldn't sleep", "slept badly", "insomnia"),
+        "pain": ("pain", "painful", "hurts", "headache", "backache", "aches", "sore"),
+        "appetite": ("no appetite", "not hungry", "can't eat"),
+        "mood": ("lonely", "sad", "anxious", "worried", "depressed"),
+        "medication": ("medication", "medicine", "pills", "tablets"),
+        "fall": ("fell down", "fell over", "had a fall", "tripped"),
+        "other_symptom": ("dizzy", "cough", "coughing", "fever", "short of breath"),
+    },
+}
+SENTIMENT_WORDS: Dict[str, Dict[str, tuple]] = {
+    "zh": {
+        "positive": ("开心", "高兴", "不错", "挺好", "很好", "舒服", "谢谢", "期待"),
+        "negative": KEYWORDS["zh"]["mood"] + ("不舒服", "难受", "很累", "好累", "太累", "累坏了"),
+    },
+    "nl": {
+        "positive": ("blij", "fijn", "leuk", "gezellig"),
+        "negative": KEYWORDS["nl"]["mood"] + ("moe", "voel me naar"),
+    },
+    "en": {
+        "positive": ("happy", "glad", "great", "lovely"),
+        "negative": KEYWORDS["en"]["mood"] + ("tired", "upset"),
+    },
+}
+
+# 否定词：关键词前面同一分句内的几个词（中文为几个字）中出现否定词时，不计入这次匹配，
+# 避免 "I am not sad"、"geen pijn"、"没有头疼" 被当作健康信号
+NEGATIONS: Dict[str, tuple] = {
+    "zh": ("不", "没", "别"),
+    "nl": ("niet", "geen", "nooit", "zonder"),
+    "en": ("not", "no", "never", "without"),
+}
+NEGATION_WINDOW = 3
+CLAUSE_BREAK = re.compile(r"[,.;:!?，。；：！？、]")
+TOKEN = re.compile(r"[\w'’]+")
+
+def _negated(text: str, start: int, language: str) -> bool:
+    clause = CLAUSE_BREAK.split(text[:start])[-1]
+    if language == "zh":
+        return any(word in clause[-NEGATION_WINDOW:] for word in NEGATIONS["zh"])
+    tokens = TOKEN.findall(clause)[-NEGATION_WINDOW:]
+    return any(token in NEGATIONS[language] or token.endswith(("n't", "n’t")) for token in tokens)
+
+def _count(pattern: "re.Pattern", text: str, language: str) -> Tuple[int, int]:
+    """统计匹配次数，返回 (未被否定的次数, 被否定的次数)"""
+    negated = [_negated(text, match.start(), language) for match in pattern.finditer(text)]
+    return len(negated) - sum(negated), sum(negated)
+
+def _compile(language: str, words: tuple) -> "re.Pattern":
+    alternatives = "|".join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+    return re.compile(alternatives if language == "zh" else rf"\b(?:{alternatives})\b")
+
+KEYWORD_PATTERNS = {
+    language: {record_type: _compile(language, words) for record_type, words in types.items()}
+    for language, types in KEYWORDS.items()
+}
+SENTIMENT_PATTERNS = {
+    language: {polarity: _compile(language, words) for polarity, words in polarities.items()}
+    for language, polarities in SENTIMENT_WORDS.items()
+}
+
+class KeywordExtractor:
+    """本地关键词分类（不调用LLM，几乎没有成本，召回率和精度低于LLM）
+
+    LLM调用失败时作为兜底，也可以通过 health_extractor="keywords" 单独使用。
+    按对话的语言选择词表，未知语言时使用全部词表。被否定的关键词不产生健康信号；
+    被否定的正面情绪词按负面计，被否定的负面情绪词不计。
+    """
+
+    name = "keywords"
+
+    async def extract(self, conversations: List[models.Conversation]) -> List[Extraction]:
+        return [self.classify(c.user_message or "", c.language) for c in conversations]
+
+    @staticmethod
+    def classify(text: str, language: Optional[str] = None) -> Extraction:
+        lowered = text.lower()
+        languages = [language] if language in KEYWORD_PATTERNS else list(KEYWORD_PATTERNS)
+        types = [
+            record_type for record_type in RECORD_TYPES
+            if any(_count(KEYWORD_PATTERNS[lang][record_type], lowered, lang)[0] for lang in languages)
+        ]
+        signals = [{"type": record_type, "severity": "mild", "detail": text[:100]} for record_type in types]
+        positive = negative = 0
+        for lang in languages:
+            kept, flipped = _count(SENTIMENT_PATTERNS[lang]["positive"], lowered, lang)
+            positive += kept
+            negative += flipped + _count(SENTIMENT_PATTERNS[lang]["negative"], lowered, lang)[0]
+        emotion = (positive - negative) / (positive + negative) if positive + negative else 0.0
+        return Extraction(emotion=round(emotion, 2), signals=signals)
+
+class LLMExtractor:
+    """一次LLM调用处理一批对话，返回每轮的情绪分和健康信息
+
+    服务中与对话请求共用同一个LLMManager；并发调用数由自己的信号量限制在
+    health_extraction_concurrency 以内，最多只占用这么多provider并发额度。
+    """
+
+    name = "llm"
+
+    def __init__(self, llm_manager: LLMManager):
+        self.llm_manager = llm_manager
+        self.semaphore = asyncio.Semaphore(settings.health_extraction_concurrency)
+
+    @staticmethod
+    def render(conversations: List[models.Conversation]) -> str:
+        # 助手回复只用于理解上下文，截断以节省token
+        return "\n\n".join(
+            f"[{i}] 老人: {c.user_message or ''}\n助手: {(c.bot_response or '')[:200]}"
+            for i, c in enumerate(conversations, 1)
+        )
+
+    @staticmethod
+    def parse(reply: str, count: int) -> List[Extraction]:
+        """解析模型输出的JSON数组，格式错误时抛出ValueError；缺失的轮次结果为空"""
+        match = re.search(r"\[.*\]", reply, re.S)
+        if match is None:
+            raise ValueError(f"未找到JSON数组: {reply[:200]}")
+        items = json.loads(match.group(0))
+        if not isinstance(items, list):
+            raise ValueError("输出不是JSON数组")
+
+        results = [Extraction() for _ in range(count)]
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            try:
+                index = int(item.get("id")) - 1
+            except (TypeError, ValueError):
+                continue
+            if not 0 <= index < count:
+                continue
+            try:
+                results[index].emotion = round(max(-1.0, min(1.0, float(item.get("emotion")))), 2)
+            except (TypeError, ValueError):
+                pass
+            for signal in item.get("signals") or []:
+                if isinstance(signal, dict) and signal.get("type") in RECORD_TYPES:
+                    severity = signal.get("severity")
+                    results[index].signals.append({
+                        "type": signal["type"],
+                        "severity": severity if severity in SEVERITIES else "mild",
+                        "detail": str(signal.get("detail") or "")[:200],
+                    })
+        return results
+
+    async def extract(self, conversations: List[models.Conversation]) -> List[Extraction]:
+        async with self.semaphore:
+            reply = await self.llm_manager.chat(
+                language=settings.health_extraction_language,
+                system_prompt=HEALTH_EXTRACTION_PROMPT,
+                user_message=self.render(conversations)
+            )
+        return self.parse(reply, len(conversations))
+
+class HealthExtractor:
+    """后台健康信息提取任务
+
+    每一轮分三步，分类期间不持有行锁和数据库连接：
+    1. 短事务中锁定水位线（SELECT ... FOR UPDATE SKIP LOCKED），读取水位线之后的一批
+       对话，写入本进程的租约后提交；租约未到期时其他进程跳过这一轮；
+    2. 分成若干子批并发分类（LLM或关键词）；
+    3. 再次锁定水位线，确认水位线未变且租约仍属于本进程，然后批量插入健康记录、
+       更新情绪分、推进水位线并释放租约，一起提交。确认失败（租约已过期被其他进程
+       接手）时丢弃结果，因此每轮对话只会被写入一次。
+    对话的created_at是写入数据库时的时间（不是入队时间），只处理 health_extraction_delay
+    秒之前的对话，保证正在提交的事务中的对话不会落在水位线之后被跳过。
+    """
+
+    def __init__(self, llm_manager: Optional[LLMManager] = None):
+        self.llm_manager = llm_manager
+        self.fallback = KeywordExtractor()
+        self.extractor = LLMExtractor(llm_manager) if llm_manager is not None else self.fallback
+        self.owner = generate_uuid()  # 租约持有者标识
+        self._task: Optional[asyncio.Task] = None
+        self.processed = 0
+        self.records = 0
+        self.fallbacks = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self):
+        """启动后台提取协程"""
+        if self.running:
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info("健康信息提取已启动", extra={
+            "extractor": self.extractor.name,
+            "batch_size": settings.health_extraction_batch_size,
+            "concurrency": settings.health_extraction_concurrency,
+        })
+
+    async def stop(self):
+        """停止后台协程；未提交的一轮会在下次启动时重新处理"""
+        if not self.running:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def close(self):
+        """停止后台协程并关闭LLM客户端（只用于独立运行的命令行，服务中的LLMManager由registry关闭）"""
+        await self.stop()
+        if self.llm_manager is not None:
+            await self.llm_manager.close()
+
+    async def _run(self):
+        full = settings.health_extraction_batch_size * settings.health_extraction_concurrency
+        while True:
+            try:
+                count = await self.run_once()
+            except Exception as e:
+                logger.error("健康信息提取失败", extra={"error": repr(e)})
+                count = 0
+            # 积压时连续处理，追上后按间隔轮询
+            if count < full:
+                await asyncio.sleep(settings.health_extraction_interval)
+
+    async def _extract(self, batch: List[models.Conversation]) -> List[Extraction]:
+        try:
+            return await self.extractor.extract(batch)
+        except Exception as e:
+            if self.extractor is self.fallback:
+                raise
+            self.fallbacks += 1
+            logger.warning("LLM提取失败，使用关键词分类", extra={"size": len(batch), "error": repr(e)})
+            return await self.fallback.extract(batch)
+
+    @traced("health.extract")
+    async def run_once(self) -> int:
+        """处理一轮（最多 batch_size * concurrency 条对话），返回处理的对话数
+
+        其他进程正持有水位线时返回0。
+        """
+        batch_size = settings.health_extraction_batch_size
+        limit = batch_size * settings.health_extraction_concurrency
+        async with SessionLocal() as db:
+            watermark = await WatermarkCRUD.lock(db, WATERMARK)
+            now = datetime.utcnow()
+            if watermark is None or (
+                watermark.leased_until is not None and watermark.leased_until > now
+                and watermark.lease_owner != self.owner
+            ):
+                await db.rollback()
+                return 0
+            after = None
+            if watermark.last_created_at is not None:
+                after = (watermark.last_created_at, watermark.last_conversation_id)
+            before = now - timedelta(seconds=settings.health_extraction_delay)
+            conversations = await ConversationCRUD.get_conversations_after(db, after, before, limit)
+            if not conversations:
+                await db.commit()
+                return 0
+            watermark.lease_owner = self.owner
+            watermark.leased_until = now + timedelta(seconds=settings.health_extraction_lease)
+            await db.commit()
+
+        batches = [conversations[i:i + batch_size] for i in range(0, len(conversations), batch_size)]
+        results = await asyncio.gather(*[self._extract(batch) for batch in batches])
+
+        records, scores = [], {}
+        for batch, extractions in zip(batches, results):
+            for conversation, extraction in zip(batch, extractions):
+                if extraction.emotion is not None:
+                    scores[conversation.conversation_id] = extraction.emotion
+                records.extend({
+                    "user_id": conversation.user_id,
+                    "record_type": signal["type"],
+                    "value": {"severity": signal["severity"], "detail": signal["detail"]},
+                    "extracted_from_conversation_id": conversation.conversation_id,
+                    "created_at": conversation.created_at,
+                } for signal in extraction.signals)
+
+        async with SessionLocal() as db:
+            watermark = await WatermarkCRUD.lock(db, WATERMARK, skip_locked=False)
+            current = (watermark.last_created_at, watermark.last_conversation_id) if watermark.last_created_at else None
+            if current != after or watermark.lease_owner != self.owner:
+                await db.rollback()
+                logger.warning("租约已失效，丢弃本轮结果", extra={"conversations": len(conversations)})
+                return 0
+            await HealthRecordCRUD.create_records(db, records)
+            await ConversationCRUD.set_emotion_scores(db, scores)
+            last = conversations[-1]
+            watermark.last_created_at = last.created_at
+            watermark.last_conversation_id = last.conversation_id
+            watermark.processed = (watermark.processed or 0) + len(conversations)
+            watermark.lease_owner = None
+            watermark.leased_until = None
+            await db.commit()
+
+        self.processed += len(conversations)
+        self.records += len(records)
+        EXTRACTED.inc(len(conversations), extractor=self.extractor.name)
+        logger.info("健康信息提取完成一轮", extra={
+            "conversations": len(conversations),
+            "records": len(records),
+            "batches": len(batches),
+        })
+        return len(conversations)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "extractor": self.extractor.name,
+            "processed": self.processed,
+            "records": self.records,
+            "fallbacks": self.fallbacks,
+        }
+
+async def main():
+    parser = argparse.ArgumentParser(description="后台健康信息提取")
+    parser.add_argument("--once", action="store_true", help="处理完当前积压后退出")
+    parser.add_argument("--extractor", choices=["llm", "keywords"], default=settings.health_extractor)
+    args = parser.parse_args()
+
+    extractor = HealthExtractor(LLMManager() if args.extractor == "llm" else None)
+    try:
+        if args.once:
+            while await extractor.run_once():
+                pass
+            print(extractor.stats())
+        else:
+            await extractor.start()
+            await asyncio.Event().wait()
+    finally:
+        await extractor.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+from typing import Dict
+
+from config.settings import settings
+from core.llm_manager import LLMManager
+from core.prompts import SUMMARY_PROMPTS
+from memory.conversation_memory import ConversationMemory
+
+logger = logging.getLogger(__name__)
+
+ROLE_LABELS = {
+    "zh": {"user": "老人", "assistant": "助手"},
+    "nl": {"user": "Oudere", "assistant": "Assistent"},
+    "en": {"user": "Elder", "assistant": "Assistant"},
+}
+
+PREVIOUS_SUMMARY_LABELS = {
+    "zh": ("之前的摘要", "新的对话"),
+    "nl": ("Eerdere samenvatting", "Nieuw gesprek"),
+    "en": ("Previous summary", "New conversation"),
+}
+
+class HistorySummarizer:
+    """会话历史的滚动摘要
+
+    会话记忆达到 history_summary_trigger 条时，在后台把除最近
+    history_keep_recent 条以外的消息连同旧摘要一起交给LLM生成新摘要，
+    写回Redis并删除已折叠的消息。不在请求路径上执行，失败时保留原始消息。
+    每个进程中每个用户同时最多运行一个摘要任务；跨进程的重复摘要由
+    ConversationMemory.compact 的条件检查丢弃。
+    """
+
+    def __init__(self, llm_manager: LLMManager, conversation_memory: ConversationMemory):
+        self.llm_manager = llm_manager
+        self.conversation_memory = conversation_memory
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def needs_summary(message_count: int) -> bool:
+        return message_count >= settings.history_summary_trigger
+
+    def schedule(self, user_id: str, language: str):
+        """后台为用户生成摘要（已有任务在运行时忽略）"""
+        if user_id in self._tasks:
+            return
+        task = asyncio.create_task(self._summarize(user_id, language))
+        self._tasks[user_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(user_id, None))
+
+    def _render(self, language: str, summary, messages) -> str:
+        labels = ROLE_LABELS.get(language, ROLE_LABELS["en"])
+        transcript = "\n".join(f"{labels.get(m['role'], m['role'])}: {m['content']}" for m in messages)
+        if not summary:
+            return transcript
+        previous, new = PREVIOUS_SUMMARY_LABELS.get(language, PREVIOUS_SUMMARY_LABELS["en"])
+        return f"{previous}:\n{summary}\n\n{new}:\n{transcript}"
+
+    async def _summarize(self, user_id: str, language: str):
+        try:
+            summary, messages = await self.conversation_memory.get_history(user_id)
+            if not self.needs_summary(len(messages)):
+                return
+            older = messages[:-settings.history_keep_recent]
+            new_summary = await self.llm_manager.chat(
+                language=language,
+                system_prompt=SUMMARY_PROMPTS.get(language, SUMMARY_PROMPTS["en"]),
+                user_message=self._render(language, summary, older)
+            )
+            if await self.conversation_memory.compact(user_id, older, summary, new_summary.strip()):
+                logger.info("历史消息已折叠为摘要", extra={"messages": len(older)})
+            else:
+                # 摘要期间消息列表已变化（被截断或已被其他进程折叠），下一轮对话会重新触发
+                logger.info("历史消息已变化，放弃本次摘要", extra={"messages": len(older)})
+        except Exception as e:
+            logger.warning("生成历史摘要失败", extra={"error": repr(e)})
+
+    async def close(self):
+        """等待进行中的摘要任务结束"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
@@ -1,21 +1,117 @@
-from langdetect import detect, LangDetectException
+import re
+from collections import OrderedDict
+from typing import List, Optional, Tuple
 
-class LanguageRouter:
-    LANGUAGE_MAP = {
-        'zh-cn': 'zh',
-        'nl': 'nl',
-        'en': 'en'
+from config.settings import settings
+
+# 检测结果: (语言代码, 置信度 0~1)；无法判断时返回None
+Detection = Optional[Tuple[str, float]]
+
+class ScriptDetector:
+    """按文字系统判断：CJK汉字占比足够高直接判为中文，无需任何模型"""
+
+    CJK = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+    LATIN = re.compile(r"[A-Za-z\u00c0-\u024f]")
+
+    def __init__(self, cjk_ratio: float = 0.3):
+        self.cjk_ratio = cjk_ratio
+
+    def detect(self, text: str) -> Detection:
+        cjk = len(self.CJK.findall(text))
+        latin = len(self.LATIN.findall(text))
+        if cjk + latin == 0:
+            return None
+        if cjk / (cjk + latin) >= self.cjk_ratio:
+            return "zh", 1.0
+        return None
+
+class NGramDetector:
+    """紧凑的荷兰语/英语判别模型
+
+    只处理拉丁字母文本中 nl/en 的歧义：常用词命中 + 区分度高的字母组合打分。
+    模型内置在代码里，无需加载语料，结果完全确定。
+    """
+
+    WORDS = {
+        "en": set("""
+            the and you it to a of my was have what how are do not that this with good
+            morning today feel thank thanks yes please she he we they very much been had
+            can will would your am about for on at so just like did go went day night
+            sleep slept pain hurts hurt little bit again hello hi weather afternoon evening
+            grandson granddaughter daughter son doctor tired back knee i'm it's don't
+            there their our us some all when where who why lovely nice dear well
+        """.split()),
+        "nl": set("""
+            de het een en ik je jij niet dat van mijn wat hoe gaat goed goedemorgen
+            goedemiddag goedenavond vandaag gisteren ja nee dank bedankt alsjeblieft graag
+            heb hebt heeft ben bent waren zijn er op te voor ook nog maar wel al naar bij
+            uit om zo heel erg beetje slecht geslapen slaap pijn moe dokter kleinzoon
+            kleindochter dochter zoon weer lekker koffie thee fijn hallo hoi doei tot ziens
+            kan wil zou mag moet hier daar nu straks morgen avond nacht rug knie met hoor
+            even toch gewoon dankjewel dankuwel mij jullie wij zij hem haar ons waar wie
+        """.split()),
     }
-    
-    @staticmethod
-    def detect_language(text: str, default: str = "zh") -> str:
+
+    GRAMS = {
+        "en": ("th", "wh", "sh", "ing", "ght", "ly ", "tion", "ou", "ea", "w ", "y "),
+        "nl": ("ij", "oe", "ui", "aa", "ee", "oo", "sch", "cht", "eid", "uw", "ie ", "en "),
+    }
+
+    WORD = re.compile(r"[a-z\u00c0-\u024f']+")
+
+    def __init__(self):
+        # 两种语言都有的词不参与打分
+        shared = self.WORDS["en"] & self.WORDS["nl"]
+        self.words = {lang: words - shared for lang, words in self.WORDS.items()}
+
+    def detect(self, text: str) -> Detection:
+        lowered = f" {text.lower()} "
+        scores = {}
+        for lang in ("en", "nl"):
+            word_hits = sum(2 for w in self.WORD.findall(lowered) if w in self.words[lang])
+            gram_hits = sum(lowered.count(g) for g in self.GRAMS[lang])
+            scores[lang] = word_hits + gram_hits
+
+        total = scores["en"] + scores["nl"]
+        if total == 0 or scores["en"] == scores["nl"]:
+            return None
+        best = max(scores, key=scores.get)
+        return best, abs(scores["en"] - scores["nl"]) / total
+
+class LanguageRouter:
+    """语言检测
+
+    依次尝试各检测器，取第一个置信度达标的结果：
+    文字系统（CJK直接判为中文）-> nl/en n-gram模型。
+    "ok"、"ja" 这类无法判断的短句沿用该用户上一次的语言（进程内LRU缓存）。
+    """
+
+    def __init__(self, detectors: Optional[List] = None, min_confidence: Optional[float] = None):
+        self.detectors = detectors if detectors is not None else [ScriptDetector(), NGramDetector()]
+        self.min_confidence = min_confidence or settings.language_min_confidence
+        self._user_languages: "OrderedDict[str, str]" = OrderedDict()
+
+    def detect_language(self, text: str, default: str = "zh", user_id: Optional[str] = None) -> str:
         """检测文本语言"""
-        try:
-            detected = detect(text)
-            return LanguageRouter.LANGUAGE_MAP.get(detected, default)
-        except LangDetectException:
-            return default
-    
+        for detector in self.detectors:
+            result = detector.detect(text)
+            if result and result[1] >= self.min_confidence:
+                language = result[0]
+                if user_id:
+                    self._remember(user_id, language)
+                return language
+
+        if user_id and user_id in self._user_languages:
+            self._user_languages.move_to_end(user_id)
+            return self._user_languages[user_id]
+        return default
+
+    def _remember(self, user_id: str, language: str):
+        self._user_languages[user_id] = language
+        self._user_languages.move_to_end(user_id)
+        while len(self._user_languages) > settings.language_cache_size:
+            self._user_languages.popitem(last=False)
+
     @staticmethod
     def get_language_code(language: str) -> str:
         """获取语言代码（用于ASR/TTS）"""
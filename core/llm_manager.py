@@ -1,50 +1,166 @@
+import asyncio
+import logging
+import time
+import httpx
 from langchain_openai import ChatOpenAI
 from langchain.schema import HumanMessage, SystemMessage, AIMessage
 from config.settings import settings
-from typing import List, Dict
+from core.llm_routing import CircuitBreaker, CircuitOpenError, Provider
+from core.tracing import LLM_TOKENS, record
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEEPSEEK_MODEL = "deepseek-chat"
+GPT_MODEL = "gpt-4o-mini"
+
+def extract_usage(message) -> Dict[str, int]:
+    """解析响应中的token用量，包括服务商前缀缓存命中的token数
+
+    - OpenAI: usage.prompt_tokens_details.cached_tokens
+    - DeepSeek: usage.prompt_cache_hit_tokens
+    LangChain把两者中能识别的部分放进 usage_metadata.input_token_details.cache_read，
+    原始usage在 response_metadata["token_usage"] 中（流式响应只有usage_metadata）。
+    """
+    usage: Dict[str, int] = {}
+    metadata = getattr(message, "usage_metadata", None) or {}
+    if metadata:
+        usage["prompt_tokens"] = metadata.get("input_tokens", 0)
+        usage["completion_tokens"] = metadata.get("output_tokens", 0)
+        usage["cached_tokens"] = (metadata.get("input_token_details") or {}).get("cache_read") or 0
+    raw = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+    if raw:
+        usage.setdefault("prompt_tokens", raw.get("prompt_tokens", 0))
+        usage.setdefault("completion_tokens", raw.get("completion_tokens", 0))
+        cached = (raw.get("prompt_tokens_details") or {}).get("cached_tokens") or raw.get("prompt_cache_hit_tokens")
+        if cached:
+            usage["cached_tokens"] = cached
+        usage.setdefault("cached_tokens", 0)
+    return usage
+
+class UsageStats:
+    """按模型累计token用量，用于观察前缀缓存命中率"""
+
+    FIELDS = ("prompt_tokens", "cached_tokens", "completion_tokens")
+
+    def __init__(self):
+        self._models: Dict[str, Dict[str, int]] = {}
+
+    def record(self, model: str, usage: Dict[str, int]):
+        if not usage:
+            return
+        totals = self._models.setdefault(model, {"requests": 0, **{f: 0 for f in self.FIELDS}})
+        totals["requests"] += 1
+        for f in self.FIELDS:
+            totals[f] += usage.get(f, 0)
+            LLM_TOKENS.inc(usage.get(f, 0), model=model, kind=f.replace("_tokens", ""))
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        return {
+            model: {
+                **totals,
+                "cache_hit_rate": totals["cached_tokens"] / totals["prompt_tokens"] if totals["prompt_tokens"] else 0.0,
+            }
+            for model, totals in self._models.items()
+        }
 
 class LLMManager:
+    """LLM路由层
+
+    - 所有服务商共享一个httpx连接池（keep-alive复用TLS连接，限制总连接数）
+    - 每个服务商独立的超时和并发上限
+    - 对冲请求：首选服务商超过其p95延迟（流式为首token的p95）仍未返回时，
+      向备用服务商再发一次请求，取先返回的结果，另一个请求被取消
+    - 熔断：连续失败的服务商暂时跳过，请求直接走备用服务商；首选失败时回退到备用
+    中文首选DeepSeek，荷兰语/英语首选GPT-4o-mini；未配置OpenAI密钥时全部由DeepSeek处理。
+    """
+
     def __init__(self):
-        # 中文模型：DeepSeek
-        self.deepseek = ChatOpenAI(
-            model="deepseek-chat",
-            openai_api_key=settings.deepseek_api_key,
-            openai_api_base="https://api.deepseek.com/v1",
-            temperature=0.7
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.llm_max_connections,
+                max_keepalive_connections=settings.llm_max_keepalive,
+                keepalive_expiry=settings.llm_keepalive_expiry
+            ),
+            timeout=httpx.Timeout(60.0, connect=settings.llm_connect_timeout)
         )
         
+        # 中文模型：DeepSeek
+        self.providers: Dict[str, Provider] = {
+            "deepseek": self._create_provider(
+                "deepseek", DEEPSEEK_MODEL, settings.deepseek_api_key, settings.deepseek_api_base,
+                settings.llm_timeout_deepseek, settings.llm_concurrency_deepseek
+            )
+        }
+        
         # 荷兰语/英语模型：GPT-4o-mini（仅在配置了OpenAI密钥时初始化）
-        self.gpt4o_mini = None
         if settings.openai_api_key:
-            self.gpt4o_mini = ChatOpenAI(
-                model="gpt-4o-mini",
-                openai_api_key=settings.openai_api_key,
-                temperature=0.7
+            self.providers["openai"] = self._create_provider(
+                "openai", GPT_MODEL, settings.openai_api_key, settings.openai_api_base,
+                settings.llm_timeout_openai, settings.llm_concurrency_openai
             )
+        
+        self.usage_stats = UsageStats()
     
-    def get_model(self, language: str):
-        """根据语言选择模型"""
-        if language == "zh":
-            return self.deepseek
-        else:
-            if not self.gpt4o_mini:
-                raise ValueError(
-                    f"OpenAI API密钥未配置，无法使用{language}语言。"
-                    "请在.env文件中添加OPENAI_API_KEY，或只使用中文对话。"
-                )
-            return self.gpt4o_mini
+    def _create_provider(
+        self,
+        name: str,
+        model_name: str,
+        api_key: str,
+        api_base: str,
+        timeout: float,
+        concurrency: int
+    ) -> Provider:
+        client = ChatOpenAI(
+            model=model_name,
+            openai_api_key=api_key,
+            openai_api_base=api_base or None,
+            temperature=0.7,
+            timeout=httpx.Timeout(timeout, connect=settings.llm_connect_timeout),
+            max_retries=settings.llm_max_retries,
+            stream_usage=True,  # 流式响应的最后一个chunk带上token用量
+            http_async_client=self.http_client
+        )
+        return Provider(
+            name=name,
+            model_name=model_name,
+            client=client,
+            timeout=timeout,
+            semaphore=asyncio.Semaphore(concurrency),
+            breaker=CircuitBreaker(settings.llm_breaker_failures, settings.llm_breaker_reset)
+        )
     
-    async def chat(
+    def _route(self, language: str) -> List[Provider]:
+        """按语言给出候选服务商：首选在前，熔断中的排到最后"""
+        preferred = "deepseek" if language == "zh" else "openai"
+        ordered = sorted(self.providers.values(), key=lambda p: p.name != preferred)
+        return sorted(ordered, key=lambda p: p.breaker.state == "open")
+    
+    def model_name(self, language: str) -> str:
+        """当前处理该语言的模型名（用于token计数和预算）"""
+        return self._route(language)[0].model_name
+    
+    def stats(self) -> Dict[str, Dict]:
+        return {name: provider.stats() for name, provider in self.providers.items()}
+    
+    async def close(self):
+        await self.http_client.aclose()
+    
+    def _build_messages(
         self,
-        language: str,
         system_prompt: str,
         user_message: str,
-        history: List[Dict] = None
-    ) -> str:
-        """执行对话"""
-        model = self.get_model(language)
-        
+        history: List[Dict] = None,
+        context: str = ""
+    ) -> List:
+        """构建LangChain消息列表
+
+        顺序：静态人设 -> 用户上下文 -> 历史 -> 当前消息。
+        静态人设逐字节固定，保证请求前缀能命中服务商的自动前缀缓存。
+        """
         messages = [SystemMessage(content=system_prompt)]
+        if context:
+            messages.append(SystemMessage(content=context))
         
         # 添加历史对话
         if history:
@@ -56,7 +172,184 @@ class LLMManager:
         
         # 添加当前用户消息
         messages.append(HumanMessage(content=user_message))
+        return messages
+    
+    @staticmethod
+    def _hedge_delay(samples) -> float:
+        """对冲触发时间：延迟分布的p95，不低于 llm_hedge_min_delay"""
+        quantile = samples.quantile(settings.llm_hedge_quantile)
+        return max(settings.llm_hedge_min_delay, quantile or 0.0)
+    
+    async def _hedged(
+        self,
+        candidates: List[Provider],
+        attempt: Callable[[Provider], Awaitable],
+        delay: float,
+        discard: Optional[Callable[[Any], Awaitable]] = None
+    ) -> Tuple[Provider, Any]:
+        """向首选服务商发请求，超过delay未完成时对冲到备用服务商，首选失败时回退到备用
+
+        返回最先成功的 (服务商, 结果)，其余请求被取消；全部失败时抛出最后一个错误。
+        """
+        primary = candidates[0]
+        alternate = candidates[1] if len(candidates) > 1 else None
+        tasks: Dict[asyncio.Task, Provider] = {asyncio.create_task(attempt(primary)): primary}
+        winner: Optional[asyncio.Task] = None
+        errors: List[BaseException] = []
+        try:
+            if settings.llm_hedge_enabled and alternate is not None and alternate.breaker.state != "open":
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    logger.info("首选服务商未在对冲阈值内响应，发出对冲请求", extra={
+                        "provider": primary.name, "alternate": alternate.name, "delay": round(delay, 2)
+                    })
+                    tasks[asyncio.create_task(attempt(alternate))] = alternate
+            
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        return tasks[task], task.result()
+                    errors.append(task.exception())
+                    logger.warning("LLM调用失败", extra={"provider": tasks[task].name, "error": repr(task.exception())})
+                if not pending and alternate is not None and alternate not in tasks.values():
+                    logger.info("回退到备用服务商", extra={"provider": alternate.name})
+                    task = asyncio.create_task(attempt(alternate))
+                    tasks[task] = alternate
+                    pending = {task}
+            raise errors[-1]
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif task is not winner and discard is not None and not task.cancelled() and task.exception() is None:
+                    await discard(task.result())
+    
+    async def _invoke(self, provider: Provider, messages: List):
+        """单个服务商的非流式调用"""
+        if not provider.breaker.allow():
+            raise CircuitOpenError(f"{provider.name} 熔断中")
+        start = time.perf_counter()
+        try:
+            async with provider.semaphore:
+                response = await asyncio.wait_for(provider.client.ainvoke(messages), provider.timeout)
+        except asyncio.CancelledError:
+            provider.breaker.release()
+            raise
+        except Exception:
+            provider.breaker.record_failure()
+            raise
+        provider.breaker.record_success()
+        elapsed = time.perf_counter() - start
+        provider.latency.record(elapsed)
+        record(f"llm.{provider.name}", elapsed)
+        return response
+    
+    async def _stream(self, provider: Provider, messages: List) -> AsyncIterator:
+        """单个服务商的流式调用，流结束前一直占用该服务商的并发名额"""
+        if not provider.breaker.allow():
+            raise CircuitOpenError(f"{provider.name} 熔断中")
+        start = time.perf_counter()
+        first = True
+        try:
+            async with provider.semaphore:
+                async for chunk in provider.client.astream(messages):
+                    if first and chunk.content:
+                        elapsed = time.perf_counter() - start
+                        provider.first_token.record(elapsed)
+                        record(f"llm.{provider.name}.first_token", elapsed)
+                        first = False
+                    yield chunk
+        except (asyncio.CancelledError, GeneratorExit):
+            provider.breaker.release()
+            raise
+        except Exception:
+            provider.breaker.record_failure()
+            raise
+        provider.breaker.record_success()
+        elapsed = time.perf_counter() - start
+        provider.latency.record(elapsed)
+        record(f"llm.{provider.name}", elapsed)
+    
+    async def chat(
+        self,
+        language: str,
+        system_prompt: str,
+        user_message: str,
+        history: List[Dict] = None,
+        context: str = "",
+        usage: Optional[Dict[str, int]] = None
+    ) -> str:
+        """执行对话（传入usage字典时写入本次token用量）"""
+        messages = self._build_messages(system_prompt, user_message, history, context)
+        candidates = self._route(language)
         
-        # 调用模型
-        response = await model.ainvoke(messages)
+        # 调用模型（必要时对冲/回退到备用服务商）
+        provider, response = await self._hedged(
+            candidates,
+            lambda p: self._invoke(p, messages),
+            self._hedge_delay(candidates[0].latency)
+        )
+        self._record_usage(provider, response, usage)
         return response.content
+    
+    async def stream_chat(
+        self,
+        language: str,
+        system_prompt: str,
+        user_message: str,
+        history: List[Dict] = None,
+        context: str = "",
+        usage: Optional[Dict[str, int]] = None
+    ) -> AsyncIterator[str]:
+        """流式执行对话，逐个产出token（传入usage字典时写入本次token用量）
+
+        对冲和回退只发生在首个token之前；开始输出后不再切换服务商。
+        """
+        messages = self._build_messages(system_prompt, user_message, history, context)
+        candidates = self._route(language)
+        
+        async def open_stream(provider: Provider):
+            """读到第一个有内容的chunk为止，返回 (流, 已读取的chunk)"""
+            stream = self._stream(provider, messages)
+            buffered = []
+            try:
+                async for chunk in stream:
+                    buffered.append(chunk)
+                    if chunk.content:
+                        break
+            except BaseException:
+                await stream.aclose()
+                raise
+            return stream, buffered
+        
+        async def close_stream(opened):
+            await opened[0].aclose()
+        
+        provider, (stream, buffered) = await self._hedged(
+            candidates,
+            open_stream,
+            self._hedge_delay(candidates[0].first_token),
+            discard=close_stream
+        )
+        try:
+            for chunk in buffered:
+                if chunk.usage_metadata:
+                    self._record_usage(provider, chunk, usage)
+                if chunk.content:
+                    yield chunk.content
+            async for chunk in stream:
+                if chunk.usage_metadata:
+                    self._record_usage(provider, chunk, usage)
+                if chunk.content:
+                    yield chunk.content
+        finally:
+            await stream.aclose()
+    
+    def _record_usage(self, provider: Provider, message, usage: Optional[Dict[str, int]]):
+        parsed = extract_usage(message)
+        self.usage_stats.record(provider.model_name, parsed)
+        if usage is not None:
+            usage.update(parsed)
@@ -0,0 +1,93 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+class CircuitOpenError(RuntimeError):
+    """服务商处于熔断状态，请求未发出"""
+
+class CircuitBreaker:
+    """熔断器
+
+    连续失败 failure_threshold 次后熔断（open），reset_timeout 秒后进入半开状态，
+    只放行一个试探请求：成功则恢复（closed），失败则重新熔断。
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """请求被取消（如对冲落败），既不算成功也不算失败"""
+        self._probing = False
+
+class LatencyTracker:
+    """最近N次请求的延迟分布，用于计算对冲请求的触发时间"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """样本不足时返回None"""
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+@dataclass
+class Provider:
+    """一个LLM服务商：客户端、超时、并发上限、熔断器和延迟统计"""
+    name: str
+    model_name: str
+    client: object  # ChatOpenAI
+    timeout: float
+    semaphore: asyncio.Semaphore
+    breaker: CircuitBreaker
+    latency: LatencyTracker = field(default_factory=LatencyTracker)  # 完整响应
+    first_token: LatencyTracker = field(default_factory=LatencyTracker)  # 流式首token
+
+    def stats(self) -> dict:
+        p95 = self.latency.quantile(0.95)
+        first_p95 = self.first_token.quantile(0.95)
+        return {
+            "model": self.model_name,
+            "circuit": self.breaker.state,
+            "p95_ms": round(p95 * 1000) if p95 is not None else None,
+            "first_token_p95_ms": round(first_p95 * 1000) if first_p95 is not None else None,
+        }
@@ -0,0 +1,55 @@
+import json
+import logging
+import sys
+
+from config.settings import settings
+from core.tracing import current_trace_id
+
+# LogRecord自带的属性，其余属性来自 extra={...}，作为结构化字段输出
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+def _fields(record: logging.LogRecord) -> dict:
+    fields = {k: v for k, v in record.__dict__.items() if k not in _RESERVED}
+    trace_id = current_trace_id()
+    if trace_id:
+        fields["trace_id"] = trace_id
+    return fields
+
+class JsonFormatter(logging.Formatter):
+    """每条日志一行JSON：时间、级别、模块、消息、trace_id 和 extra 字段"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+class TextFormatter(logging.Formatter):
+    """本地开发用的可读格式，extra 字段以 key=value 附在消息后"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s", "%H:%M:%S")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = _fields(record)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+def setup_logging():
+    """配置根日志（重复调用无副作用）"""
+    root = logging.getLogger()
+    if any(getattr(h, "_nuanyangyang", False) for h in root.handlers):
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if settings.log_format == "json" else TextFormatter())
+    handler._nuanyangyang = True
+    root.addHandler(handler)
+    root.setLevel(settings.log_level.upper())
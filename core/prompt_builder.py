@@ -0,0 +1,179 @@
+import functools
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# 每条消息的格式开销（角色标记等）和回复起始标记，按OpenAI的计数方式估算
+MESSAGE_OVERHEAD = 4
+REPLY_PRIMING = 3
+
+RAG_INSTRUCTIONS = {
+    "zh": "请根据上述相关上下文（如果有用的话）回答用户的问题：",
+    "nl": "Beantwoord de vraag van de gebruiker op basis van de bovenstaande context (indien relevant):",
+    "en": "Answer the user's question based on the relevant context above (if applicable):",
+}
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model: str):
+    """按模型加载tiktoken编码（进程内缓存），不可用时返回None"""
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning("tiktoken不可用，按字符数估算token", extra={"error": repr(e)})
+        return None
+
+class TokenCounter:
+    """本地token计数（tiktoken）
+
+    DeepSeek等非OpenAI模型没有公开的tiktoken编码，用cl100k_base近似。
+    tiktoken不可用（未安装或首次下载编码文件失败）时按字符数估算：
+    CJK字符每个约1 token，其他文本约4个字符1 token。
+    """
+
+    CJK = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+
+    def __init__(self, model: str):
+        self.model = model
+        self.encoding = get_encoding(model)
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        cjk = len(self.CJK.findall(text))
+        return cjk + (len(text) - cjk + 3) // 4
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """截断到最多max_tokens个token"""
+        if self.count(text) <= max_tokens:
+            return text
+        if self.encoding is not None:
+            return self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:max_tokens])
+        while text and self.count(text) > max_tokens:
+            text = text[:int(len(text) * 0.9)]
+        return text
+
+@dataclass
+class BuiltPrompt:
+    system_prompt: str  # 静态人设（每种语言逐字节固定）
+    context: str  # 用户信息 + 历史摘要（第二条系统消息）
+    user_message: str  # 包含RAG上下文的完整用户消息
+    history: List[Dict]
+    tokens: Dict[str, int] = field(default_factory=dict)  # 各部分token数和总数
+    budget: int = 0
+    dropped_snippets: int = 0
+    dropped_messages: int = 0
+
+def wrap_context(language: str, snippets: List[str], user_message: str) -> str:
+    """用XML标签包裹RAG上下文并附加到用户消息中（而不是系统提示词），防止提示词注入"""
+    if not snippets:
+        return user_message
+    context_text = "\n".join(f"<conversation>\n{text}\n</conversation>" for text in snippets)
+    instruction = RAG_INSTRUCTIONS.get(language, RAG_INSTRUCTIONS["en"])
+    return f"""<relevant_context>
+{context_text}
+</relevant_context>
+
+{instruction}
+{user_message}"""
+
+class PromptBuilder:
+    """按模型的token预算组装提示词
+
+    消息顺序为 静态人设 -> 用户上下文（用户信息、摘要）-> 历史 -> RAG + 当前消息，
+    越稳定的内容越靠前，便于LLM服务商的前缀缓存命中。
+    系统提示词和当前用户消息必须保留；历史摘要截断到 prompt_summary_max_tokens；
+    RAG片段按相似度从高到低放入，最多占用 prompt_rag_max_tokens；
+    剩余预算从最新的历史消息开始往前填充，放不下的较早消息被丢弃
+    （它们通常已经被 HistorySummarizer 折叠进摘要）。
+    """
+
+    def __init__(self, model: str, budget: Optional[int] = None):
+        self.model = model
+        self.budget = budget or settings.prompt_token_budgets.get(model, settings.prompt_token_budget_default)
+        self.counter = TokenCounter(model)
+
+    def _message_tokens(self, content: str) -> int:
+        return self.counter.count(content) + MESSAGE_OVERHEAD
+
+    def build(
+        self,
+        language: str,
+        system_prompt: str,
+        user_message: str,
+        context: str = "",
+        history: Optional[List[Dict]] = None,
+        summary: Optional[str] = None,
+        snippets: Optional[List[Dict]] = None
+    ) -> BuiltPrompt:
+        history = history or []
+        snippets = snippets or []
+
+        # 1. 必须保留的部分：静态人设、用户上下文（含摘要）和当前用户消息
+        summary_tokens = 0
+        if summary:
+            summary = self.counter.truncate(summary, settings.prompt_summary_max_tokens)
+            summary_tokens = self.counter.count(summary)
+            context = f"{context}\n<conversation_summary>\n{summary}\n</conversation_summary>\n"
+        system_tokens = self._message_tokens(system_prompt)
+        context_tokens = self._message_tokens(context) if context else 0
+        user_tokens = self._message_tokens(user_message)
+        remaining = self.budget - system_tokens - context_tokens - user_tokens - REPLY_PRIMING
+
+        # 2. RAG片段：按相似度从高到低，放得下就放
+        selected: List[str] = []
+        wrapper_tokens = self.counter.count(wrap_context(language, [""], user_message)) - self.counter.count(user_message)
+        rag_budget = min(settings.prompt_rag_max_tokens, remaining) - wrapper_tokens
+        used = 0
+        for snippet in sorted(snippets, key=lambda s: s.get("score", 0.0), reverse=True):
+            cost = self.counter.count(snippet["text"]) + 6  # <conversation> 标签
+            if used + cost <= rag_budget:
+                selected.append(snippet["text"])
+                used += cost
+        full_user_message = wrap_context(language, selected, user_message)
+        rag_tokens = self._message_tokens(full_user_message) - user_tokens if selected else 0
+        remaining -= rag_tokens
+
+        # 3. 历史消息：从最新往前填充剩余预算
+        kept: List[Dict] = []
+        history_tokens = 0
+        for message in reversed(history):
+            cost = self._message_tokens(message["content"])
+            if history_tokens + cost > remaining:
+                break
+            kept.append(message)
+            history_tokens += cost
+        kept.reverse()
+        # 不以孤立的助手回复开头
+        if kept and kept[0]["role"] == "assistant":
+            history_tokens -= self._message_tokens(kept.pop(0)["content"])
+
+        tokens = {
+            "system": system_tokens,
+            "context": context_tokens,
+            "summary": summary_tokens,  # 已包含在context中
+            "rag": rag_tokens,
+            "history": history_tokens,
+            "user": user_tokens,
+            "total": system_tokens + context_tokens + rag_tokens + history_tokens + user_tokens + REPLY_PRIMING,
+        }
+        return BuiltPrompt(
+            system_prompt=system_prompt,
+            context=context,
+            user_message=full_user_message,
+            history=kept,
+            tokens=tokens,
+            budget=self.budget,
+            dropped_snippets=len(snippets) - len(selected),
+            dropped_messages=len(history) - len(kept),
+        )
@@ -1,3 +1,6 @@
+# 静态人设提示词：不包含任何用户数据，每种语言逐字节固定，
+# 作为请求的第一条消息，使DeepSeek/OpenAI的自动前缀缓存可以命中。
+# 用户信息、历史摘要等易变内容放在 USER_CONTEXT_TEMPLATES 中，排在后面。
 SYSTEM_PROMPTS = {
     "zh": """你是暖洋洋，一个专门陪伴老年人的智能助手。
 
@@ -17,10 +20,6 @@ SYSTEM_PROMPTS = {
 - 不提供医疗诊断或治疗建议
 - 不推荐具体药物
 - 不对严重症状轻描淡写
-
-
-## 用户信息
-{user_info}
 """,
 
     "nl": """Je bent Nuanyangyang, een slimme assistent die speciaal is ontworpen om ouderen gezelschap te houden.
@@ -41,10 +40,6 @@ SYSTEM_PROMPTS = {
 - Geef geen medische diagnoses of behandeladvies
 - Raad geen specifieke medicijnen aan
 - Bagatelliseer geen ernstige symptomen
-
-
-## Gebruikersinformatie
-{user_info}
 """,
 
     "en": """You are Nuanyangyang, a smart assistant specially designed to keep elderly people company.
@@ -65,9 +60,50 @@ SYSTEM_PROMPTS = {
 - Do not provide medical diagnoses or treatment advice
 - Do not recommend specific medications
 - Do not downplay serious symptoms
+"""
+}
+
+# 用户上下文（每个用户不同，作为第二条系统消息放在静态人设之后）
+USER_CONTEXT_TEMPLATES = {
+    "zh": """## 用户信息
+{user_info}
+""",
 
+    "nl": """## Gebruikersinformatie
+{user_info}
+""",
 
-## User information
+    "en": """## User information
 {user_info}
 """
 }
+
+# 会话历史摘要（把较早的对话折叠为滚动摘要）
+SUMMARY_PROMPTS = {
+    "zh": """请把下面这段老人与助手的对话总结成一段简短的摘要（不超过150字）。
+保留：老人提到的人名、身体状况、情绪、近期安排和喜好。
+如果提供了之前的摘要，请把新内容合并进去，输出一段完整的新摘要。
+只输出摘要本身。""",
+
+    "nl": """Vat het onderstaande gesprek tussen een oudere en de assistent samen in een korte samenvatting (maximaal 100 woorden).
+Behoud: genoemde namen, gezondheid, gevoelens, komende plannen en voorkeuren.
+Als er een eerdere samenvatting is gegeven, voeg de nieuwe informatie daarin samen tot één volledige samenvatting.
+Geef alleen de samenvatting.""",
+
+    "en": """Summarize the conversation below between an elderly person and the assistant in a short summary (at most 100 words).
+Keep: names mentioned, health, feelings, upcoming plans and preferences.
+If a previous summary is given, merge the new information into it and output one complete summary.
+Output only the summary."""
+}
+
+# 后台健康信息提取（一次调用处理多轮对话，输入可能是中文、荷兰语或英语）
+HEALTH_EXTRACTION_PROMPT = """你是老年照护记录员。下面是多轮老人与助手的对话，每轮以 [编号] 开头，可能是中文、荷兰语或英语。
+请逐轮判断老人自己提到的健康信息和情绪，只根据老人的话，不要推测。
+
+健康信息类型（type）只能是: sleep（睡眠）、pain（疼痛）、appetite（食欲/饮食）、mood（情绪低落/焦虑/孤独）、medication（用药）、fall（跌倒）、other_symptom（其他身体不适）。
+情绪分（emotion）为 -1 到 1 的数字：-1 非常消极，0 平静/中性，1 非常积极。
+
+只输出一个JSON数组，每轮一个对象，不要输出其他内容，例如:
+[{"id": 1, "emotion": -0.4, "signals": [{"type": "pain", "severity": "mild", "detail": "腰疼，从昨天开始"}]},
+ {"id": 2, "emotion": 0.6, "signals": []}]
+severity 为 mild、moderate 或 severe；detail 用老人的语言简要记录原话要点。"""
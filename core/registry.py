@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import text
+
+from config.settings import settings
+from agents.chat_agent import ChatAgent
+from core.conversation_writer import ConversationWriter
+from core.health import HealthChecker
+from core.health_extractor import HealthExtractor
+from core.history_summarizer import HistorySummarizer
+from core.llm_manager import DEEPSEEK_MODEL, GPT_MODEL, LLMManager
+from core.prompt_builder import get_encoding
+from database import engine, init_db
+from memory.conversation_memory import ConversationMemory
+from memory.embeddings import create_embeddings
+from memory.redis_client import get_redis
+from memory.semantic_cache import SemanticCache
+from memory.user_context import UserContextCache
+from memory.vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+class ComponentRegistry:
+    """进程级组件注册表
+
+    每个进程只创建一份 VectorStore、Embedding模型、LLMManager 和
+    ConversationMemory。组件在首次访问时创建（线程安全），FastAPI启动时
+    在后台线程中并行预热，预热完成前进程已可响应存活检查。
+    """
+
+    def __init__(self):
+        self._components: Dict[str, object] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._warmup_task: Optional[asyncio.Task] = None
+        self.status: Dict[str, str] = {}
+        self.health = HealthChecker({
+            "database": self._probe_database,
+            "redis": self._probe_redis,
+            "qdrant": self._probe_qdrant,
+            "embeddings": self._probe_embeddings,
+        })
+
+    def _get(self, name: str, factory: Callable[[], object]):
+        """按名称获取组件，不存在时创建；每个组件单独加锁，互不阻塞"""
+        if name in self._components:
+            return self._components[name]
+        with self._locks_guard:
+            lock = self._locks.setdefault(name, threading.Lock())
+        with lock:
+            if name not in self._components:
+                self._components[name] = factory()
+        return self._components[name]
+
+    @property
+    def embeddings(self):
+        """(Embedding模型, 向量维度)"""
+        return self._get("embeddings", create_embeddings)
+
+    @property
+    def vector_store(self):
+        return self._get("vector_store", lambda: VectorStore(*self.embeddings))
+
+    @property
+    def llm_manager(self):
+        return self._get("llm_manager", LLMManager)
+
+    @property
+    def conversation_memory(self):
+        return self._get("conversation_memory", ConversationMemory)
+
+    @property
+    def semantic_cache(self):
+        return self._get("semantic_cache", SemanticCache)
+
+    @property
+    def user_contexts(self) -> Optional[UserContextCache]:
+        return self._get("user_contexts", lambda: (
+            UserContextCache() if settings.user_context_cache_enabled else None
+        ))
+
+    @property
+    def history_summarizer(self):
+        return self._get("history_summarizer", lambda: HistorySummarizer(
+            self.llm_manager, self.conversation_memory
+        ))
+
+    @property
+    def chat_agent(self):
+        return self._get("chat_agent", lambda: ChatAgent(
+            llm_manager=self.llm_manager,
+            vector_store=self.vector_store,
+            conversation_memory=self.conversation_memory,
+            semantic_cache=self.semantic_cache,
+            summarizer=self.history_summarizer,
+            user_contexts=self.user_contexts
+        ))
+
+    @property
+    def conversation_writer(self):
+        return self._get("conversation_writer", lambda: ConversationWriter(self.vector_store))
+
+    @property
+    def health_extractor(self) -> Optional[HealthExtractor]:
+        # 共用对话请求的LLMManager，提取的并发调用数由LLMExtractor自己的信号量限制
+        return self._get("health_extractor", lambda: (
+            HealthExtractor(self.llm_manager if settings.health_extractor == "llm" else None)
+            if settings.health_extraction_enabled else None
+        ))
+
+    def embedding_cache_stats(self) -> Optional[Dict[str, float]]:
+        """Embedding结果缓存命中率（未加载或未启用时为None）"""
+        vector_store = self._components.get("vector_store")
+        service = getattr(vector_store, "embedding_service", None)
+        cache = getattr(service, "cache", None)
+        return cache.stats() if cache is not None else None
+
+    def hot_index_stats(self) -> Optional[Dict[str, float]]:
+        """近期对话索引命中率和内存占用（未加载或未启用时为None）"""
+        hot_index = getattr(self._components.get("vector_store"), "hot_index", None)
+        return hot_index.stats() if hot_index is not None else None
+
+    @property
+    def ready(self) -> bool:
+        """预热已结束且所有组件加载成功"""
+        if self._warmup_task is None or not self._warmup_task.done():
+            return False
+        return all(s == "ready" for s in self.status.values())
+
+    @property
+    def warming_up(self) -> bool:
+        return self._warmup_task is not None and not self._warmup_task.done()
+
+    async def _probe_database(self):
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    async def _probe_redis(self):
+        await get_redis().ping()
+
+    async def _probe_qdrant(self):
+        # 只探测已创建的客户端，不在健康检查中触发组件加载
+        vector_store = self._components.get("vector_store")
+        if vector_store is None:
+            raise RuntimeError("向量存储尚未初始化")
+        await vector_store.client.get_collections()
+
+    async def _probe_embeddings(self):
+        if self.status.get("embeddings") != "ready":
+            raise RuntimeError(f"Embedding模型未加载: {self.status.get('embeddings', 'pending')}")
+
+    def start_warmup(self):
+        """在后台启动预热，不阻塞应用启动"""
+        if self._warmup_task is None:
+            self._warmup_task = asyncio.create_task(self.warmup())
+
+    async def wait_until_ready(self):
+        """等待预热结束（请求在预热期间到达时使用）"""
+        if self._warmup_task is None:
+            self.start_warmup()
+        await asyncio.shield(self._warmup_task)
+
+    async def warmup(self):
+        """并行加载各组件：数据库初始化、Embedding模型、Qdrant集合、LLM客户端、Redis"""
+        async def load(name: str, factory: Callable[[], object]):
+            self.status[name] = "loading"
+            start = time.perf_counter()
+            try:
+                if asyncio.iscoroutinefunction(factory):
+                    await factory()
+                else:
+                    await asyncio.to_thread(factory)
+                self.status[name] = "ready"
+                logger.info("组件就绪", extra={"component": name, "seconds": round(time.perf_counter() - start, 1)})
+            except Exception as e:
+                self.status[name] = f"failed: {e}"
+                logger.error("组件加载失败", extra={"component": name, "error": repr(e)})
+
+        await asyncio.gather(
+            load("database", init_db),
+            load("embeddings", lambda: self.embeddings),
+            load("llm_manager", lambda: self.llm_manager),
+            load("conversation_memory", lambda: self.conversation_memory),
+            load("tokenizer", lambda: [get_encoding(m) for m in (DEEPSEEK_MODEL, GPT_MODEL)]),
+        )
+        # VectorStore依赖已加载的Embedding模型
+        await load("vector_store", lambda: self.vector_store)
+        if self.status["vector_store"] == "ready":
+            await load("qdrant", self.vector_store.ensure_collections)
+        await load("chat_agent", lambda: self.chat_agent)
+
+        if self.status.get("vector_store") == "ready":
+            await self.conversation_writer.start()
+        if self.user_contexts is not None:
+            await self.user_contexts.start()
+        if self.status.get("database") == "ready" and self.health_extractor is not None:
+            await self.health_extractor.start()
+
+        # 预热任务此时尚未结束，不能用self.ready判断
+        ready = all(s == "ready" for s in self.status.values())
+        logger.log(
+            logging.INFO if ready else logging.WARNING,
+            "组件预热完成", extra={"ready": ready, "embedding": settings.embedding_model}
+        )
+
+    async def shutdown(self):
+        """关闭时写完队列中剩余的对话，再释放连接"""
+        health_extractor = self._components.get("health_extractor")
+        if health_extractor is not None:
+            await health_extractor.stop()
+        writer = self._components.get("conversation_writer")
+        if writer is not None:
+            await writer.stop()
+        user_contexts = self._components.get("user_contexts")
+        if user_contexts is not None:
+            await user_contexts.close()
+        summarizer = self._components.get("history_summarizer")
+        if summarizer is not None:
+            await summarizer.close()
+        vector_store = self._components.get("vector_store")
+        if vector_store is not None:
+            await vector_store.close()
+        llm_manager = self._components.get("llm_manager")
+        if llm_manager is not None:
+            await llm_manager.close()
+
+registry = ComponentRegistry()
@@ -0,0 +1,228 @@
+import bisect
+import contextvars
+import functools
+import logging
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class Histogram:
+    """Prometheus风格直方图（累计桶 + sum + count），按标签值分序列"""
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # 各桶计数..., sum, count
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for key, series in sorted(snapshot.items()):
+            labels = _labels(self.labelnames, key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames + ('le',), key + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{labels} {series[-2]}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+class Counter:
+    """Prometheus风格计数器"""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = dict(self._values)
+        for key, value in sorted(snapshot.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List = []
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus文本格式（/metrics）"""
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+metrics = MetricsRegistry()
+
+# 阶段耗时多在毫秒级（语言检测、Redis、Qdrant），低端桶更细
+SPAN_BUCKETS = (0.0005, 0.001, 0.0025) + Histogram.DEFAULT_BUCKETS
+
+SPAN_SECONDS = metrics.histogram("nuanyangyang_span_seconds", "各阶段耗时（秒）", ["span"], buckets=SPAN_BUCKETS)
+REQUEST_SECONDS = metrics.histogram("nuanyangyang_request_seconds", "请求总耗时（秒）", ["endpoint"])
+REQUESTS = metrics.counter("nuanyangyang_requests_total", "请求数", ["endpoint", "status"])
+LLM_TOKENS = metrics.counter("nuanyangyang_llm_tokens_total", "LLM token用量", ["model", "kind"])
+CACHE_LOOKUPS = metrics.counter("nuanyangyang_cache_lookups_total", "缓存查询次数", ["cache", "result"])
+
+@dataclass
+class Trace:
+    """一次请求内记录的所有阶段"""
+    trace_id: str
+    endpoint: str
+    start: float
+    spans: List[Tuple[str, float, float]] = field(default_factory=list)  # (阶段, 开始偏移ms, 耗时ms)
+
+    def breakdown(self) -> Dict[str, float]:
+        """按阶段名汇总的耗时（毫秒）"""
+        totals: Dict[str, float] = {}
+        for name, _, duration in self.spans:
+            totals[name] = round(totals.get(name, 0.0) + duration, 1)
+        return totals
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace is not None else None
+
+def record(name: str, seconds: float):
+    """记录一个阶段的耗时
+
+    跨任务或跨yield的阶段（如流式首token）无法用with包裹时直接调用。
+    asyncio.gather/create_task创建的子任务会复制上下文，记录到同一个Trace中。
+    """
+    if not settings.tracing_enabled:
+        return
+    SPAN_SECONDS.observe(seconds, span=name)
+    trace = _current_trace.get()
+    if trace is not None:
+        now = time.perf_counter()
+        trace.spans.append((name, (now - seconds - trace.start) * 1000, seconds * 1000))
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+def span(name: str):
+    """`with span("qdrant.search"):` 记录一个阶段；关闭追踪时返回共享的空操作对象"""
+    if not settings.tracing_enabled:
+        return _NOOP_SPAN
+    return _Span(name)
+
+def traced(name: str):
+    """异步函数装饰器：整个调用记为一个阶段"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not settings.tracing_enabled:
+                return await func(*args, **kwargs)
+            with _Span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class trace_request:
+    """请求级追踪：生成trace_id，结束时记录总耗时并输出各阶段耗时的结构化日志
+
+    用法: `with trace_request("chat") as trace:`，关闭追踪时trace为None。
+    """
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.trace: Optional[Trace] = None
+        self.status = "ok"
+        self._token = None
+
+    def __enter__(self) -> Optional[Trace]:
+        if settings.tracing_enabled:
+            self.trace = Trace(uuid.uuid4().hex[:16], self.endpoint, time.perf_counter())
+            self._token = _current_trace.set(self.trace)
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.trace is None:
+            return False
+        if exc_type is not None:
+            self.status = "error"
+        duration = time.perf_counter() - self.trace.start
+        REQUEST_SECONDS.observe(duration, endpoint=self.endpoint)
+        REQUESTS.inc(endpoint=self.endpoint, status=self.status)
+
+        logger.info("请求完成", extra={
+            "endpoint": self.endpoint,
+            "status": self.status,
+            "duration_ms": round(duration * 1000, 1),
+            "spans": self.trace.breakdown(),
+        })
+        try:
+            _current_trace.reset(self._token)
+        except ValueError:
+            # 在其他上下文中结束（如流式响应被其他任务迭代），直接清空
+            _current_trace.set(None)
+        return False
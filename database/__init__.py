@@ -1,26 +1,42 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
+import asyncio
+import logging
+from typing import AsyncIterator
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from config.settings import settings
-from .models import Base
+from .models import Base, Conversation
 
-# 创建数据库引擎
-engine = create_engine(settings.database_url)
+logger = logging.getLogger(__name__)
 
-# 创建会话工厂
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 创建异步数据库引擎（asyncpg），连接池参数可在配置中调整
+engine = create_async_engine(
+    settings.async_database_url,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=settings.db_pool_pre_ping
+)
 
-def get_db() -> Session:
+# 创建会话工厂（提交后不过期对象，避免异步环境下的隐式懒加载）
+SessionLocal = async_sessionmaker(
+    bind=engine,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+async def get_db() -> AsyncIterator[AsyncSession]:
     """获取数据库会话"""
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-def init_db():
+async def init_db():
     """初始化数据库"""
-    Base.metadata.create_all(bind=engine)
-    print("Database initialized successfully!")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        # create_all不会给已存在的表补建索引
+        for index in Conversation.__table__.indexes:
+            await conn.run_sync(lambda sync_conn: index.create(sync_conn, checkfirst=True))
+    logger.info("Database initialized successfully!")
 
 if __name__ == "__main__":
-    init_db()
+    asyncio.run(init_db())
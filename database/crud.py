@@ -1,11 +1,29 @@
-from sqlalchemy.orm import Session
+import base64
+from sqlalchemy import insert, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 from . import models
-from typing import Optional, List
+from typing import AsyncIterator, Dict, Optional, List, Tuple
 from datetime import datetime
+from core.tracing import traced
+
+def encode_cursor(conversation: models.Conversation) -> str:
+    """翻页游标：最后一条对话的 (created_at, conversation_id)"""
+    raw = f"{conversation.created_at.isoformat()}|{conversation.conversation_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """解析翻页游标，格式错误时抛出ValueError"""
+    try:
+        created_at, conversation_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|", 1)
+        return datetime.fromisoformat(created_at), conversation_id
+    except Exception as e:
+        raise ValueError(f"无效的游标: {cursor}") from e
 
 class UserCRUD:
     @staticmethod
-    def create_user(db: Session, name: str, age: int, gender: str, language: str = "zh"):
+    async def create_user(db: AsyncSession, name: str, age: int, gender: str, language: str = "zh"):
         user = models.User(
             name=name,
             age=age,
@@ -13,26 +31,79 @@ class UserCRUD:
             preferred_language=language
         )
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
         return user
     
     @staticmethod
-    def get_user(db: Session, user_id: str) -> Optional[models.User]:
-        return db.query(models.User).filter(models.User.user_id == user_id).first()
+    @traced("db.get_user")
+    async def get_user(db: AsyncSession, user_id: str) -> Optional[models.User]:
+        result = await db.execute(
+            select(models.User).where(models.User.user_id == user_id)
+        )
+        return result.scalars().first()
+    
+    @staticmethod
+    @traced("db.get_user_with_profile")
+    async def get_user_with_profile(db: AsyncSession, user_id: str) -> Optional[models.User]:
+        """一次查询（LEFT JOIN）加载用户及其画像"""
+        result = await db.execute(
+            select(models.User)
+            .options(joinedload(models.User.profile))
+            .where(models.User.user_id == user_id)
+        )
+        return result.scalars().first()
     
     @staticmethod
-    def get_or_create_default_user(db: Session) -> models.User:
+    @traced("db.get_or_create_default_user")
+    async def get_or_create_default_user(db: AsyncSession) -> models.User:
         """获取或创建默认用户（用于MVP测试）"""
-        user = db.query(models.User).first()
+        # 按创建时间排序，保证每次（每个进程）取到同一个用户
+        result = await db.execute(
+            select(models.User).order_by(models.User.created_at, models.User.user_id).limit(1)
+        )
+        user = result.scalars().first()
         if not user:
-            user = UserCRUD.create_user(db, "测试用户", 70, "female", "zh")
+            user = await UserCRUD.create_user(db, "测试用户", 70, "female", "zh")
+        return user
+
+    @staticmethod
+    @traced("db.update_user")
+    async def update_user(db: AsyncSession, user_id: str, fields: Dict) -> Optional[models.User]:
+        """更新用户基本信息（只更新fields中的字段），用户不存在时返回None
+        
+        调用方需随后调用 UserContextCache.invalidate(user_id)。
+        """
+        user = await UserCRUD.get_user(db, user_id)
+        if user is None:
+            return None
+        for name, value in fields.items():
+            setattr(user, name, value)
+        await db.commit()
         return user
+    
+    @staticmethod
+    @traced("db.update_profile")
+    async def update_profile(db: AsyncSession, user_id: str, fields: Dict) -> Optional[models.UserProfile]:
+        """更新用户画像（不存在时创建），用户不存在时返回None
+        
+        调用方需随后调用 UserContextCache.invalidate(user_id)。
+        """
+        user = await UserCRUD.get_user_with_profile(db, user_id)
+        if user is None:
+            return None
+        profile = user.profile
+        if profile is None:
+            profile = models.UserProfile(user_id=user_id)
+            db.add(profile)
+        for name, value in fields.items():
+            setattr(profile, name, value)
+        await db.commit()
+        return profile
 
 class ConversationCRUD:
     @staticmethod
-    def save_conversation(
-        db: Session,
+    async def save_conversation(
+        db: AsyncSession,
         user_id: str,
         language: str,
         user_message: str,
@@ -47,26 +118,121 @@ class ConversationCRUD:
             emotion_score=emotion_score
         )
         db.add(conversation)
-        db.commit()
-        db.refresh(conversation)
+        await db.commit()
         return conversation
     
     @staticmethod
-    def get_recent_conversations(
-        db: Session,
+    @traced("db.save_conversations")
+    async def save_conversations(db: AsyncSession, rows: List[dict]) -> int:
+        """批量保存对话（一次提交），rows中可预先指定conversation_id
+
+        created_at 统一设为写入时间并回写到rows中，调用方随后用同一时间写向量payload。
+        write-behind队列中排队或重试较久的对话因此不会带着更早的时间提交，
+        落到健康信息提取的水位线之后被跳过。
+        """
+        now = datetime.utcnow()
+        for row in rows:
+            row["created_at"] = now
+        db.add_all([models.Conversation(**row) for row in rows])
+        await db.commit()
+        return len(rows)
+    
+    @staticmethod
+    async def get_recent_conversations(
+        db: AsyncSession,
         user_id: str,
         limit: int = 10
     ) -> List[models.Conversation]:
-        return db.query(models.Conversation)\
-            .filter(models.Conversation.user_id == user_id)\
-            .order_by(models.Conversation.created_at.desc())\
-            .limit(limit)\
-            .all()
+        result = await db.execute(
+            select(models.Conversation)
+            .where(models.Conversation.user_id == user_id)
+            .order_by(models.Conversation.created_at.desc())
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+    
+    @staticmethod
+    async def get_conversations_by_ids(db: AsyncSession, conversation_ids: List[str]) -> List[models.Conversation]:
+        result = await db.execute(
+            select(models.Conversation).where(models.Conversation.conversation_id.in_(conversation_ids))
+        )
+        return list(result.scalars().all())
+    
+    @staticmethod
+    @traced("db.get_conversation_page")
+    async def get_conversation_page(
+        db: AsyncSession,
+        user_id: str,
+        limit: int,
+        before: Optional[Tuple[datetime, str]] = None
+    ) -> List[models.Conversation]:
+        """按时间倒序的一页对话（keyset分页）
+        
+        before为上一页最后一条的 (created_at, conversation_id)，沿
+        ix_conversations_user_created 索引直接定位，翻到再深的页也不需要OFFSET扫描。
+        """
+        query = select(models.Conversation).where(models.Conversation.user_id == user_id)
+        if before is not None:
+            query = query.where(
+                tuple_(models.Conversation.created_at, models.Conversation.conversation_id) < tuple_(*before)
+            )
+        result = await db.execute(
+            query.order_by(models.Conversation.created_at.desc(), models.Conversation.conversation_id.desc())
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+    
+    @staticmethod
+    async def stream_conversations(
+        db: AsyncSession,
+        user_id: str,
+        batch_size: int = 500
+    ) -> AsyncIterator[models.Conversation]:
+        """按时间顺序逐条产出用户的全部对话
+        
+        使用服务端游标，每次从数据库取batch_size条，内存占用与历史长度无关。
+        """
+        result = await db.stream(
+            select(models.Conversation)
+            .where(models.Conversation.user_id == user_id)
+            .order_by(models.Conversation.created_at, models.Conversation.conversation_id)
+            .execution_options(yield_per=batch_size)
+        )
+        async for conversation in result.scalars():
+            yield conversation
+
+    @staticmethod
+    @traced("db.get_conversations_after")
+    async def get_conversations_after(
+        db: AsyncSession,
+        after: Optional[Tuple[datetime, str]],
+        before: datetime,
+        limit: int
+    ) -> List[models.Conversation]:
+        """按时间顺序取水位线之后、before之前的对话（ix_conversations_created）"""
+        query = select(models.Conversation).where(models.Conversation.created_at < before)
+        if after is not None:
+            query = query.where(
+                tuple_(models.Conversation.created_at, models.Conversation.conversation_id) > tuple_(*after)
+            )
+        result = await db.execute(
+            query.order_by(models.Conversation.created_at, models.Conversation.conversation_id).limit(limit)
+        )
+        return list(result.scalars().all())
+    
+    @staticmethod
+    async def set_emotion_scores(db: AsyncSession, scores: Dict[str, float]):
+        """按主键批量更新情绪分（executemany，不提交）"""
+        if scores:
+            await db.execute(
+                update(models.Conversation),
+                [{"conversation_id": cid, "emotion_score": score} for cid, score in scores.items()]
+            )
 
 class HealthRecordCRUD:
     @staticmethod
-    def create_record(
-        db: Session,
+    async def create_record(
+        db: AsyncSession,
         user_id: str,
         record_type: str,
         value: dict,
@@ -79,6 +245,31 @@ class HealthRecordCRUD:
             extracted_from_conversation_id=conversation_id
         )
         db.add(record)
-        db.commit()
-        db.refresh(record)
+        await db.commit()
         return record
+    
+    @staticmethod
+    async def create_records(db: AsyncSession, rows: List[dict]) -> int:
+        """批量插入健康记录（一条INSERT，不提交）"""
+        if rows:
+            await db.execute(insert(models.HealthRecord), rows)
+        return len(rows)
+
+class WatermarkCRUD:
+    @staticmethod
+    async def lock(db: AsyncSession, name: str, skip_locked: bool = True) -> Optional[models.ExtractionWatermark]:
+        """锁定水位线（不存在时创建），直到事务结束
+        
+        skip_locked时其他进程已持有锁则返回None（SKIP LOCKED），否则等待锁释放。
+        """
+        await db.execute(
+            pg_insert(models.ExtractionWatermark)
+            .values(name=name, processed=0)
+            .on_conflict_do_nothing(index_elements=["name"])
+        )
+        result = await db.execute(
+            select(models.ExtractionWatermark)
+            .where(models.ExtractionWatermark.name == name)
+            .with_for_update(skip_locked=skip_locked)
+        )
+        return result.scalars().first()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, JSON, Float, ForeignKey, Text
+from sqlalchemy import Column, String, Integer, DateTime, JSON, Float, ForeignKey, Text, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -25,6 +25,7 @@ class User(Base):
     # Relationships
     conversations = relationship("Conversation", back_populates="user")
     health_records = relationship("HealthRecord", back_populates="user")
+    profile = relationship("UserProfile", back_populates="user", uselist=False)
 
 class UserProfile(Base):
     __tablename__ = "user_profiles"
@@ -36,9 +37,18 @@ class UserProfile(Base):
     medical_history = Column(JSON)
     medications = Column(JSON)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    user = relationship("User", back_populates="profile")
 
 class Conversation(Base):
     __tablename__ = "conversations"
+    # 按用户、时间顺序翻页和导出（conversation_id保证同一时刻的多条对话顺序确定）；
+    # 按时间顺序扫描全部对话（后台健康信息提取的水位线）
+    __table_args__ = (
+        Index("ix_conversations_user_created", "user_id", "created_at", "conversation_id"),
+        Index("ix_conversations_created", "created_at", "conversation_id"),
+    )
     
     conversation_id = Column(String, primary_key=True, default=generate_uuid)
     user_id = Column(String, ForeignKey("users.user_id"))
@@ -63,3 +73,16 @@ class HealthRecord(Base):
     
     # Relationships
     user = relationship("User", back_populates="health_records")
+
+class ExtractionWatermark(Base):
+    """后台处理任务的进度：已处理到的最后一条对话 (created_at, conversation_id)"""
+    __tablename__ = "extraction_watermarks"
+    
+    name = Column(String(50), primary_key=True)
+    last_created_at = Column(DateTime)
+    last_conversation_id = Column(String)
+    processed = Column(Integer, default=0)
+    # 正在处理下一批的进程及其租约到期时间（分类期间不持有行锁）
+    lease_owner = Column(String)
+    leased_until = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,60 +1,123 @@
-import redis
 import json
+import logging
 from config.settings import settings
-from typing import List, Dict, Optional
+from memory.redis_client import get_redis
+from core.tracing import span
+from typing import List, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 只有列表开头仍是被摘要的那些消息、且摘要未被其他任务更新时才折叠，否则不做修改
+COMPACT_SCRIPT = """
+local count = tonumber(ARGV[1])
+local current = redis.call('GET', KEYS[2]) or ''
+if current ~= ARGV[2] then
+    return 0
+end
+local head = redis.call('LRANGE', KEYS[1], 0, count - 1)
+if #head ~= count then
+    return 0
+end
+for i = 1, count do
+    if head[i] ~= ARGV[i + 4] then
+        return 0
+    end
+end
+redis.call('LTRIM', KEYS[1], count, -1)
+redis.call('SET', KEYS[2], ARGV[3], 'EX', ARGV[4])
+return 1
+"""
 
 class ConversationMemory:
+    """短期会话记忆
+
+    每个用户一个Redis列表，每个元素是一条JSON消息。写入使用
+    RPUSH/LTRIM/EXPIRE 流水线（MULTI/EXEC），一次往返完成且原子执行，
+    同一用户的并发轮次不会互相覆盖。
+    较早的消息由 HistorySummarizer 折叠为滚动摘要，单独存放在一个键中。
+    """
+
     def __init__(self):
-        self.redis_client = redis.Redis(
-            host=settings.redis_host,
-            port=settings.redis_port,
-            decode_responses=True
-        )
+        self.redis_client = get_redis()
         self.ttl = 3600  # 1小时过期
+        self.max_messages = settings.history_max_messages
+        self._compact_script = self.redis_client.register_script(COMPACT_SCRIPT)
     
     def _get_key(self, user_id: str) -> str:
-        return f"conversation:{user_id}"
+        return f"conversation_history:{user_id}"
     
-    def add_message(self, user_id: str, role: str, content: str):
+    def _get_summary_key(self, user_id: str) -> str:
+        return f"conversation_summary:{user_id}"
+    
+    @staticmethod
+    def _encode(message: Dict) -> str:
+        return json.dumps(message, ensure_ascii=False)
+    
+    async def _append(self, user_id: str, messages: List[Dict]):
+        key = self._get_key(user_id)
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, *[self._encode(m) for m in messages])
+            pipe.ltrim(key, -self.max_messages, -1)
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+    
+    async def add_message(self, user_id: str, role: str, content: str):
         """添加消息到会话记忆"""
         try:
-            key = self._get_key(user_id)
-            message = {"role": role, "content": content}
-            
-            # 获取现有消息
-            messages = self.get_messages(user_id)
-            messages.append(message)
-            
-            # 只保留最近10条
-            if len(messages) > 10:
-                messages = messages[-10:]
-            
-            # 存储
-            self.redis_client.setex(
-                key,
-                self.ttl,
-                json.dumps(messages, ensure_ascii=False)
-            )
+            await self._append(user_id, [{"role": role, "content": content}])
         except Exception as e:
-            print(f"Error adding message to conversation memory: {e}")
+            logger.warning("Error adding message to conversation memory", extra={"error": repr(e)})
     
-    def get_messages(self, user_id: str) -> List[Dict]:
+    async def add_turn(self, user_id: str, user_message: str, bot_response: str):
+        """原子地添加一轮对话（用户消息 + 助手回复），只需一次往返"""
+        try:
+            with span("redis.add_turn"):
+                await self._append(user_id, [
+                    {"role": "user", "content": user_message},
+                    {"role": "assistant", "content": bot_response}
+                ])
+        except Exception as e:
+            logger.warning("Error adding turn to conversation memory", extra={"error": repr(e)})
+    
+    async def get_messages(self, user_id: str) -> List[Dict]:
         """获取会话记忆"""
         try:
             key = self._get_key(user_id)
-            data = self.redis_client.get(key)
-            
-            if data:
-                return json.loads(data)
-            return []
+            items = await self.redis_client.lrange(key, 0, -1)
+            return [json.loads(item) for item in items]
         except Exception as e:
-            print(f"Error getting conversation memory: {e}")
+            logger.warning("Error getting conversation memory", extra={"error": repr(e)})
             return []
     
-    def clear(self, user_id: str):
+    async def get_history(self, user_id: str) -> Tuple[Optional[str], List[Dict]]:
+        """一次往返获取 (历史摘要, 最近消息)"""
+        try:
+            with span("redis.get_history"):
+                async with self.redis_client.pipeline(transaction=False) as pipe:
+                    pipe.get(self._get_summary_key(user_id))
+                    pipe.lrange(self._get_key(user_id), 0, -1)
+                    summary, items = await pipe.execute()
+            return summary, [json.loads(item) for item in items]
+        except Exception as e:
+            logger.warning("Error getting conversation history", extra={"error": repr(e)})
+            return None, []
+    
+    async def compact(self, user_id: str, messages: List[Dict], previous: Optional[str], summary: str) -> bool:
+        """删除已折叠进摘要的最早消息并保存新摘要
+        
+        messages和previous是生成摘要时读到的最早几条消息和旧摘要。摘要期间列表
+        可能已被截断或被其他进程折叠，此时不做修改并返回False，避免删掉未摘要的消息。
+        """
+        result = await self._compact_script(
+            keys=[self._get_key(user_id), self._get_summary_key(user_id)],
+            args=[len(messages), previous or "", summary, settings.history_summary_ttl,
+                  *[self._encode(m) for m in messages]]
+        )
+        return bool(result)
+    
+    async def clear(self, user_id: str):
         """清空会话记忆"""
         try:
-            key = self._get_key(user_id)
-            self.redis_client.delete(key)
+            await self.redis_client.delete(self._get_key(user_id), self._get_summary_key(user_id))
         except Exception as e:
-            print(f"Error clearing conversation memory: {e}")
+            logger.warning("Error clearing conversation memory", extra={"error": repr(e)})
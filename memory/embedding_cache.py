@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from config.settings import settings
+from core.tracing import CACHE_LOOKUPS
+from memory.redis_client import get_binary_redis
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingCache:
+    """Embedding结果缓存：进程内LRU + Redis
+
+    以文本内容的SHA-256为键，按模型名和向量维度区分命名空间，换模型或
+    截断维度后不会读到旧向量。向量以float16字节存储（1024维约2KB），
+    进程重启和多个worker之间通过Redis共享。Redis不可用或超时时只用本地缓存。
+    """
+
+    def __init__(
+        self,
+        model: str,
+        dimension: int,
+        redis_client=None,
+        max_entries: Optional[int] = None,
+        ttl: Optional[int] = None
+    ):
+        self.namespace = f"embedding:{model}:{dimension}"
+        self.redis_client = redis_client if redis_client is not None else get_binary_redis()
+        self.max_entries = max_entries or settings.embedding_cache_size
+        self.ttl = ttl or settings.embedding_cache_ttl
+        self._local: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._pending_writes: set = set()
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _key(self, text: str) -> str:
+        return f"{self.namespace}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    @staticmethod
+    def _encode(vector) -> bytes:
+        return np.asarray(vector, dtype=np.float16).tobytes()
+
+    @staticmethod
+    def _decode(data: bytes) -> np.ndarray:
+        return np.frombuffer(data, dtype=np.float16)
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._local[key] = vector
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    def get_local(self, text: str) -> Optional[List[float]]:
+        """只查进程内缓存（不等待I/O，请求路径上的快速通道）"""
+        key = self._key(text)
+        vector = self._local.get(key)
+        if vector is None:
+            return None
+        self._local.move_to_end(key)
+        self.local_hits += 1
+        CACHE_LOOKUPS.inc(cache="embedding", result="local_hit")
+        return vector.astype(np.float32).tolist()
+
+    async def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """批量查询：先查本地，未命中的用一次MGET查Redis"""
+        keys = [self._key(text) for text in texts]
+        results: List[Optional[np.ndarray]] = [self._local.get(key) for key in keys]
+        missing = [i for i, vector in enumerate(results) if vector is None]
+        self.local_hits += len(texts) - len(missing)
+
+        if missing:
+            try:
+                values = await asyncio.wait_for(
+                    self.redis_client.mget([keys[i] for i in missing]),
+                    timeout=settings.embedding_cache_redis_timeout
+                )
+            except Exception as e:
+                logger.warning("读取Embedding缓存失败", extra={"error": repr(e)})
+                values = [None] * len(missing)
+            for i, data in zip(missing, values):
+                if data is None:
+                    continue
+                results[i] = self._decode(data)
+                self._remember(keys[i], results[i])
+                self.redis_hits += 1
+        misses = sum(1 for vector in results if vector is None)
+        self.misses += misses
+
+        CACHE_LOOKUPS.inc(len(texts) - len(missing), cache="embedding", result="local_hit")
+        CACHE_LOOKUPS.inc(len(missing) - misses, cache="embedding", result="redis_hit")
+        CACHE_LOOKUPS.inc(misses, cache="embedding", result="miss")
+        return [None if vector is None else vector.astype(np.float32).tolist() for vector in results]
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        """写入本地缓存，Redis在后台写入（不阻塞下一批embedding）"""
+        items = {}
+        for text, vector in zip(texts, vectors):
+            key = self._key(text)
+            encoded = self._encode(vector)
+            self._remember(key, self._decode(encoded))
+            items[key] = encoded
+        if items:
+            task = asyncio.create_task(self._write(items))
+            self._pending_writes.add(task)
+            task.add_done_callback(self._pending_writes.discard)
+
+    async def _write(self, items: Dict[str, bytes]):
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for key, data in items.items():
+                    pipe.set(key, data, ex=self.ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning("写入Embedding缓存失败", extra={"error": repr(e)})
+
+    async def close(self):
+        """等待后台写入完成"""
+        if self._pending_writes:
+            await asyncio.gather(*self._pending_writes, return_exceptions=True)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.local_hits + self.redis_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.local_hits + self.redis_hits) / total, 4) if total else 0.0,
+            "entries": len(self._local),
+        }
@@ -0,0 +1,120 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from config.settings import settings
+from memory.embedding_cache import EmbeddingCache
+
+class EmbeddingService:
+    """Embedding微批处理服务
+
+    把并发请求在一个很短的时间窗口内合并成一批，每批只调用一次
+    embed_documents，并在独立的工作线程中执行，不阻塞事件循环。
+    模型推理期间到达的请求自动累积成下一批。
+    配置了EmbeddingCache时，进程内命中直接返回，其余文本按批查询Redis，
+    只对未命中的（去重后的）文本调用模型。
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        max_batch_size: Optional[int] = None,
+        max_wait: Optional[float] = None,
+        cache: Optional[EmbeddingCache] = None
+    ):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.max_batch_size = max_batch_size or settings.embedding_batch_size
+        self.max_wait = settings.embedding_batch_wait if max_wait is None else max_wait
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+        self._queue: Optional[asyncio.Queue] = None
+        self._collector: Optional[asyncio.Task] = None
+
+    def _ensure_started(self):
+        if self._collector is None or self._collector.done():
+            self._queue = asyncio.Queue()
+            self._collector = asyncio.create_task(self._collect())
+
+    async def embed(self, text: str) -> List[float]:
+        """生成单条文本的embedding"""
+        if self.cache is not None:
+            vector = self.cache.get_local(text)
+            if vector is not None:
+                return vector
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """生成多条文本的embedding，与其他并发请求共享批次"""
+        return list(await asyncio.gather(*[self.embed(text) for text in texts]))
+
+    async def close(self):
+        """停止收集协程并释放工作线程"""
+        if self._collector is not None:
+            self._collector.cancel()
+            await asyncio.gather(self._collector, return_exceptions=True)
+            self._collector = None
+        if self.cache is not None:
+            await self.cache.close()
+        self._executor.shutdown(wait=False)
+
+    async def _next_batch(self) -> List[Tuple[str, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            # 先取走已经排队的请求，再在剩余时间窗口内等待新请求
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            # 调用方可能已取消（例如超时），跳过这些文本
+            batch = [(text, future) for text, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            texts = [text for text, _ in batch]
+            try:
+                vectors = await self._embed(loop, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+    async def _embed(self, loop, texts: List[str]) -> List[List[float]]:
+        """先查缓存，只对未命中的文本调用模型（同一批内相同文本只算一次）"""
+        if self.cache is None:
+            return await loop.run_in_executor(
+                self._executor, self.embeddings.embed_documents, texts
+            )
+
+        vectors = await self.cache.get_many(texts)
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        if missing:
+            computed = await loop.run_in_executor(
+                self._executor, self.embeddings.embed_documents, missing
+            )
+            self.cache.put_many(missing, computed)
+            by_text = dict(zip(missing, computed))
+            vectors = [by_text[t] if v is None else v for t, v in zip(texts, vectors)]
+        return vectors
@@ -0,0 +1,53 @@
+import logging
+from langchain_openai import OpenAIEmbeddings
+from langchain_community.embeddings import HuggingFaceEmbeddings
+from config.settings import settings
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+def create_embeddings() -> Tuple[Optional[object], int]:
+    """根据配置创建Embedding模型，返回 (模型, 向量维度)"""
+    embeddings = None
+    embedding_dim = 1024  # 默认维度
+    
+    if settings.embedding_model == "openai":
+        # OpenAI Embeddings（需要API密钥）
+        if settings.openai_api_key:
+            # text-embedding-3 支持Matryoshka截断：服务端直接返回前N维并重新归一化
+            embeddings = OpenAIEmbeddings(
+                openai_api_key=settings.openai_api_key,
+                model="text-embedding-3-small",
+                dimensions=settings.embedding_dimensions or None
+            )
+            embedding_dim = settings.embedding_dimensions or 1536
+            logger.info("使用OpenAI Embeddings", extra={"dimensions": embedding_dim})
+        else:
+            logger.warning("未配置OpenAI API密钥，将使用本地BGE-M3模型")
+            settings.embedding_model = "bge-m3"  # 自动切换
+    
+    if settings.embedding_model == "bge-m3-onnx":
+        # 导出的ONNX模型（可选int8量化），由onnxruntime在CPU上推理，向量与bge-m3兼容
+        try:
+            from memory.onnx_embeddings import OnnxEmbeddings
+            embeddings = OnnxEmbeddings()
+            embedding_dim = 1024
+        except (ImportError, FileNotFoundError) as e:
+            logger.warning("ONNX Embedding不可用，将使用本地BGE-M3模型", extra={"error": repr(e)})
+            settings.embedding_model = "bge-m3"  # 自动切换
+    
+    if settings.embedding_model == "bge-m3":
+        # BGE-M3本地模型（开源，无需API）
+        logger.info("加载BGE-M3本地Embedding模型（首次运行会下载模型，约2GB）")
+        embeddings = HuggingFaceEmbeddings(
+            model_name="BAAI/bge-m3",
+            model_kwargs={'device': 'cpu'},  # 使用CPU，如果有GPU可改为'cuda'
+            encode_kwargs={'normalize_embeddings': True}
+        )
+        if settings.embedding_max_length:
+            # 与ONNX后端使用相同的截断长度，两个后端对长文本生成的向量一致
+            embeddings.client.max_seq_length = settings.embedding_max_length
+        embedding_dim = 1024
+        logger.info("BGE-M3模型加载完成", extra={"max_length": embeddings.client.max_seq_length})
+    
+    return embeddings, embedding_dim
@@ -0,0 +1,134 @@
+"""导出BGE-M3为ONNX模型（可选int8动态量化）
+
+用法（在项目根目录执行，导出时需要torch、transformers、onnx和onnxruntime）:
+    python -m memory.export_onnx                       # 导出到 settings.embedding_onnx_path，并生成int8模型
+    python -m memory.export_onnx --output models/bge-m3-onnx --no-quantize
+    python -m memory.export_onnx --verify-only         # 只对比已导出模型与PyTorch模型的向量
+
+生成的目录包含:
+- model.onnx（+ model.onnx.data，float32权重超过2GB时存为外部数据）
+- model_int8.onnx（权重int8动态量化，激活在推理时量化）
+- tokenizer文件
+
+导出后在 .env 中设置 EMBEDDING_MODEL=bge-m3-onnx 即可使用。最后会用样例文本
+对比ONNX与PyTorch模型输出向量的余弦相似度，确认可以继续使用现有集合。
+"""
+import argparse
+import os
+import tempfile
+
+import numpy as np
+
+from config.settings import settings
+from memory.onnx_embeddings import MODEL_FILE, QUANTIZED_MODEL_FILE, OnnxEmbeddings
+
+MODEL_NAME = "BAAI/bge-m3"
+
+VERIFY_TEXTS = [
+    "你好，今天天气怎么样？",
+    "我昨晚睡得不太好，腰有点疼。",
+    "用户: 孙子下周末要来看我\n助手: 太好了，您一定很期待吧！",
+    "Goedemorgen, hoe gaat het met je?",
+    "Ik heb vandaag een wandeling gemaakt in het park.",
+    "My knee has been hurting since yesterday.",
+]
+
+def export(output: str, opset: int):
+    """导出float32模型：输入input_ids/attention_mask，输出last_hidden_state"""
+    import onnx
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    model = AutoModel.from_pretrained(MODEL_NAME).eval()
+    tokenizer.save_pretrained(output)
+
+    class HiddenStates(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+    sample = tokenizer(VERIFY_TEXTS[:2], padding=True, return_tensors="pt")
+    dynamic = {0: "batch", 1: "sequence"}
+    # 权重超过2GB时torch按张量拆成很多外部数据文件，先导出到临时目录再合并成一个文件
+    with tempfile.TemporaryDirectory() as tmp:
+        raw_path = os.path.join(tmp, MODEL_FILE)
+        with torch.no_grad():
+            torch.onnx.export(
+                HiddenStates(model),
+                (sample["input_ids"], sample["attention_mask"]),
+                raw_path,
+                input_names=["input_ids", "attention_mask"],
+                output_names=["last_hidden_state"],
+                dynamic_axes={"input_ids": dynamic, "attention_mask": dynamic, "last_hidden_state": dynamic},
+                opset_version=opset,
+                do_constant_folding=True
+            )
+        onnx_model = onnx.load(raw_path)
+        onnx.save_model(
+            onnx_model,
+            os.path.join(output, MODEL_FILE),
+            save_as_external_data=True,
+            all_tensors_to_one_file=True,
+            location=f"{MODEL_FILE}.data",
+            size_threshold=1024
+        )
+    print(f"✅ float32模型已导出: {os.path.join(output, MODEL_FILE)}")
+
+def quantize(output: str, per_channel: bool):
+    """int8动态量化：MatMul/Gather权重离线量化为int8，激活在推理时按批量化"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(
+        os.path.join(output, MODEL_FILE),
+        os.path.join(output, QUANTIZED_MODEL_FILE),
+        weight_type=QuantType.QInt8,
+        per_channel=per_channel,
+        extra_options={"MatMulConstBOnly": True}
+    )
+    size_mb = os.path.getsize(os.path.join(output, QUANTIZED_MODEL_FILE)) / 2 ** 20
+    print(f"✅ int8模型已导出: {os.path.join(output, QUANTIZED_MODEL_FILE)} ({size_mb:.0f}MB)")
+
+def reference_vectors() -> np.ndarray:
+    """当前后端（HuggingFaceEmbeddings，normalize_embeddings=True）的向量"""
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    model = HuggingFaceEmbeddings(
+        model_name=MODEL_NAME,
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'normalize_embeddings': True}
+    )
+    return np.asarray(model.embed_documents(VERIFY_TEXTS), dtype=np.float32)
+
+def verify(output: str, quantized_variants):
+    reference = reference_vectors()
+    for quantized in quantized_variants:
+        vectors = np.asarray(OnnxEmbeddings(output, quantized=quantized).embed_documents(VERIFY_TEXTS))
+        cosine = np.sum(vectors * reference, axis=1)
+        label = "int8" if quantized else "float32"
+        print(f"{label:<8} 与PyTorch模型的余弦相似度: 平均 {cosine.mean():.4f}, 最低 {cosine.min():.4f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="导出BGE-M3为ONNX模型")
+    parser.add_argument("--output", default=settings.embedding_onnx_path)
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--no-quantize", action="store_true", help="只导出float32模型")
+    parser.add_argument("--no-per-channel", action="store_true", help="int8量化按张量而不是按通道（精度略低）")
+    parser.add_argument("--verify-only", action="store_true")
+    args = parser.parse_args()
+
+    if not args.verify_only:
+        os.makedirs(args.output, exist_ok=True)
+        export(args.output, args.opset)
+        if not args.no_quantize:
+            quantize(args.output, per_channel=not args.no_per_channel)
+
+    variants = [False]
+    if os.path.exists(os.path.join(args.output, QUANTIZED_MODEL_FILE)):
+        variants.append(True)
+    verify(args.output, variants)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config.settings import settings
+from core.tracing import CACHE_LOOKUPS
+
+@dataclass
+class HotResult:
+    results: List[Dict]  # [{"text", "score"}]，按相似度降序
+    complete: bool  # 缓冲区包含该用户的全部历史或近期结果已足够相似，不需要再查询Qdrant
+    oldest: float  # 缓冲区中最早一条的created_at，更早的历史只在Qdrant中
+
+class UserRing:
+    """单个用户（单种语言）最近对话的向量环形缓冲区
+
+    向量按实际条数扩容（倍增），达到容量后覆盖最早的一条。向量写入时归一化，
+    点积即余弦相似度，与Qdrant的COSINE距离一致。
+    """
+
+    __slots__ = ("capacity", "vectors", "texts", "ids", "created_at", "count", "next", "complete", "seeded",
+                 "seeded_at", "string_bytes")
+
+    def __init__(self, dim: int, capacity: int, dtype, initial: int = 16):
+        self.capacity = capacity
+        self.vectors = np.empty((min(initial, capacity), dim), dtype=dtype)
+        self.created_at = np.empty(self.vectors.shape[0], dtype=np.float64)
+        self.texts: List[Optional[str]] = [None] * self.vectors.shape[0]
+        self.ids: List[Optional[str]] = [None] * self.vectors.shape[0]
+        self.count = 0
+        self.next = 0
+        self.complete = False  # 是否包含该用户的全部历史（从Qdrant加载过且未被覆盖）
+        self.seeded = False
+        self.seeded_at = 0.0  # 最近一次从Qdrant加载的时间（time.monotonic）
+        self.string_bytes = 0  # 文本和ID字符串占用的内存
+
+    @property
+    def nbytes(self) -> int:
+        # 文本通常比一条float16向量还大，和列表槽位一起计入
+        return self.vectors.nbytes + self.created_at.nbytes + self.string_bytes + 16 * len(self.texts)
+
+    def _grow(self):
+        size = min(self.capacity, self.vectors.shape[0] * 2)
+        self.vectors = np.resize(self.vectors, (size, self.vectors.shape[1]))
+        self.created_at = np.resize(self.created_at, size)
+        self.texts.extend([None] * (size - len(self.texts)))
+        self.ids.extend([None] * (size - len(self.ids)))
+
+    def add(self, conversation_id: str, text: str, vector: np.ndarray, created_at: float):
+        if self.count == self.vectors.shape[0] and self.count < self.capacity:
+            self._grow()
+        if self.count == self.capacity:
+            self.complete = False  # 覆盖最早的一条，更早的历史只剩Qdrant中有
+        else:
+            self.count += 1
+        i = self.next
+        if self.texts[i] is not None:
+            self.string_bytes -= sys.getsizeof(self.texts[i]) + sys.getsizeof(self.ids[i])
+        self.string_bytes += sys.getsizeof(text) + sys.getsizeof(conversation_id)
+        self.vectors[i] = vector
+        self.texts[i] = text
+        self.ids[i] = conversation_id
+        self.created_at[i] = created_at
+        self.next = (i + 1) % self.capacity
+
+    def entries(self) -> List[Tuple[str, str, np.ndarray, float]]:
+        """按写入顺序（从旧到新）返回全部条目"""
+        start = self.next if self.count == self.capacity else 0
+        order = [(start + k) % self.capacity for k in range(self.count)]
+        return [(self.ids[i], self.texts[i], self.vectors[i], self.created_at[i]) for i in order]
+
+    def search(self, query: np.ndarray, limit: int) -> List[Dict]:
+        scores = self.vectors[:self.count].astype(np.float32, copy=False) @ query
+        k = min(limit, self.count)
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{"text": self.texts[i], "score": float(scores[i])} for i in top]
+
+class HotIndex:
+    """进程内按用户的近期对话向量索引
+
+    每个（语言, 用户）一个环形缓冲区，保存最近 capacity 轮对话的向量（默认float16）。
+    检索时做一次矩阵-向量乘法取top-k，不访问Qdrant。用户按LRU淘汰，总内存（向量
+    和文本）不超过max_bytes。缓冲区包含用户全部历史时结果可直接使用；历史更长时，
+    近期对话足够相似（不低于min_score）也直接使用，否则由调用方只向Qdrant查询更早
+    的历史再合并。
+
+    缓冲区只包含本进程写入的对话，多进程部署时其他进程写入的对话不在其中，因此
+    加载超过ttl秒后视为过期：检索按未命中处理（由调用方查询Qdrant并重新加载）。
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        capacity: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        min_score: Optional[float] = None,
+        dtype: Optional[str] = None,
+        ttl: Optional[float] = None
+    ):
+        self.dim = dim
+        self.capacity = capacity or settings.hot_index_capacity
+        self.max_bytes = max_bytes or settings.hot_index_max_mb * 2 ** 20
+        self.min_score = settings.hot_index_min_score if min_score is None else min_score
+        self.dtype = np.dtype(dtype or settings.hot_index_dtype)
+        self.ttl = settings.hot_index_ttl if ttl is None else ttl
+        self._rings: "OrderedDict[Tuple[str, str], UserRing]" = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.partial = 0
+        self.misses = 0
+        self.stale = 0
+
+    def _expired(self, ring: UserRing) -> bool:
+        return self.ttl > 0 and time.monotonic() - ring.seeded_at > self.ttl
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def _ring(self, language: str, user_id: str) -> UserRing:
+        key = (language, user_id)
+        ring = self._rings.get(key)
+        if ring is None:
+            ring = self._rings[key] = UserRing(self.dim, self.capacity, self.dtype)
+            self.nbytes += ring.nbytes
+        self._rings.move_to_end(key)
+        return ring
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and len(self._rings) > 1:
+            _, ring = self._rings.popitem(last=False)
+            self.nbytes -= ring.nbytes
+
+    def add(self, user_id: str, language: str, conversation_id: str, text: str, vector, created_at: Optional[float] = None):
+        ring = self._ring(language, user_id)
+        before = ring.nbytes
+        ring.add(conversation_id, text, self._normalize(vector), created_at or time.time())
+        self.nbytes += ring.nbytes - before
+        self._evict()
+
+    def needs_seed(self, user_id: str, language: str) -> bool:
+        ring = self._rings.get((language, user_id))
+        return ring is None or not ring.seeded or self._expired(ring)
+
+    def seed(self, user_id: str, language: str, entries: Sequence[Tuple[str, str, Sequence[float], float]], complete: bool):
+        """用Qdrant中该用户最近的对话（从旧到新）初始化缓冲区
+
+        加载期间新写入的对话排在最后；complete表示entries就是该用户的全部历史。
+        """
+        old = self._rings.pop((language, user_id), None)
+        if old is not None:
+            self.nbytes -= old.nbytes
+        seen = {conversation_id for conversation_id, *_ in entries}
+        pending = [e for e in old.entries() if e[0] not in seen] if old is not None else []
+        ring = self._ring(language, user_id)
+        before = ring.nbytes
+        for conversation_id, text, vector, created_at in entries:
+            ring.add(conversation_id, text, self._normalize(vector), created_at)
+        ring.complete = complete and ring.count < ring.capacity
+        for conversation_id, text, vector, created_at in pending:
+            ring.add(conversation_id, text, vector, created_at)
+        ring.seeded = True
+        ring.seeded_at = time.monotonic()
+        self.nbytes += ring.nbytes - before
+        self._evict()
+
+    def search(self, user_id: str, language: str, query, limit: int) -> Optional[HotResult]:
+        """检索用户的近期对话；用户未加载或已过期时返回None"""
+        ring = self._rings.get((language, user_id))
+        if ring is None or not ring.seeded:
+            self.misses += 1
+            CACHE_LOOKUPS.inc(cache="hot_index", result="miss")
+            return None
+        if self._expired(ring):
+            self.stale += 1
+            CACHE_LOOKUPS.inc(cache="hot_index", result="stale")
+            return None
+        self._rings.move_to_end((language, user_id))
+        results = ring.search(self._normalize(query), limit)
+        oldest = float(ring.created_at[:ring.count].min()) if ring.count else time.time()
+        complete = ring.complete or (len(results) == limit and results[-1]["score"] >= self.min_score)
+        if complete:
+            self.hits += 1
+        else:
+            self.partial += 1
+        CACHE_LOOKUPS.inc(cache="hot_index", result="hit" if complete else "partial")
+        return HotResult(results=results, complete=complete, oldest=oldest)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.partial + self.misses + self.stale
+        return {
+            "hits": self.hits,
+            "partial": self.partial,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "users": len(self._rings),
+            "entries": sum(ring.count for ring in self._rings.values()),
+            "mb": round(self.nbytes / 2 ** 20, 2),
+        }
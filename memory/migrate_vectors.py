@@ -0,0 +1,84 @@
+"""向量集合迁移
+
+用法（在项目根目录执行）:
+    python -m memory.migrate_vectors            # 补建payload索引、更新多租户和量化配置
+    python -m memory.migrate_vectors --backfill # 同时为旧数据补充created_at
+
+旧版本写入的point没有created_at字段，--backfill 会按conversation_id
+从PostgreSQL查出创建时间并写回payload；找不到对应记录的point保持不变。
+"""
+import argparse
+import asyncio
+
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import (
+    Filter, IsEmptyCondition, PayloadField, SetPayload, SetPayloadOperation
+)
+from sqlalchemy import select
+
+from config.settings import settings
+from database import SessionLocal, engine
+from database import models
+from memory.vector_store import collection_alias, create_client, migrate_collections, to_timestamp
+
+async def backfill_created_at(client: AsyncQdrantClient, collection_name: str, batch_size: int) -> int:
+    """为缺少created_at的point补充时间戳，返回更新数量"""
+    updated = 0
+    offset = None
+    missing = Filter(must=[IsEmptyCondition(is_empty=PayloadField(key="created_at"))])
+    while True:
+        points, offset = await client.scroll(
+            collection_name=collection_name,
+            scroll_filter=missing,
+            limit=batch_size,
+            offset=offset,
+            with_payload=["conversation_id"],
+            with_vectors=False
+        )
+        if not points:
+            break
+
+        conversation_ids = [
+            p.payload["conversation_id"] for p in points if p.payload.get("conversation_id")
+        ]
+        async with SessionLocal() as db:
+            result = await db.execute(
+                select(models.Conversation.conversation_id, models.Conversation.created_at)
+                .where(models.Conversation.conversation_id.in_(conversation_ids))
+            )
+            created = dict(result.all())
+
+        operations = [
+            SetPayloadOperation(set_payload=SetPayload(
+                payload={"created_at": to_timestamp(created[p.payload["conversation_id"]])},
+                points=[p.id]
+            ))
+            for p in points
+            if p.payload.get("conversation_id") in created
+        ]
+        if operations:
+            await client.batch_update_points(collection_name=collection_name, update_operations=operations)
+            updated += len(operations)
+
+        if offset is None:
+            break
+    print(f"✅ 集合 {collection_name} 补充created_at: {updated} 条")
+    return updated
+
+async def main():
+    parser = argparse.ArgumentParser(description="向量集合迁移")
+    parser.add_argument("--backfill", action="store_true", help="为旧数据补充created_at")
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    client = create_client()
+    await migrate_collections(client)
+
+    if args.backfill:
+        for lang in settings.supported_languages:
+            await backfill_created_at(client, collection_alias(lang), args.batch_size)
+        await engine.dispose()
+    await client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+import logging
+import os
+from typing import List, Optional
+
+import numpy as np
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model_int8.onnx"
+MODEL_MAX_LENGTH = 8192  # BGE-M3（sentence-transformers的max_seq_length）
+
+class OnnxEmbeddings:
+    """用ONNX Runtime在CPU上运行导出的BGE-M3（LangChain Embeddings接口）
+
+    与 HuggingFaceEmbeddings(BAAI/bge-m3, normalize_embeddings=True) 一致：
+    取最后一层[CLS]向量并做L2归一化，输出1024维，可直接写入和检索现有集合。
+    截断长度与PyTorch后端相同（embedding_max_length，默认为模型上限8192）。
+    int8动态量化模型体积约为float32的1/4，向量与原模型的余弦相似度通常在0.99以上。
+    模型由 `python -m memory.export_onnx` 导出。
+    """
+
+    def __init__(
+        self,
+        model_dir: Optional[str] = None,
+        quantized: Optional[bool] = None,
+        threads: Optional[int] = None,
+        max_length: Optional[int] = None
+    ):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_dir = model_dir or settings.embedding_onnx_path
+        quantized = settings.embedding_onnx_quantized if quantized is None else quantized
+        threads = settings.embedding_onnx_threads if threads is None else threads
+
+        model_path = os.path.join(model_dir, QUANTIZED_MODEL_FILE if quantized else MODEL_FILE)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"未找到ONNX模型: {model_path}（先运行 python -m memory.export_onnx）")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        # 单次推理内部的并行线程数；0由ONNX Runtime按物理核数决定。
+        # 批处理已经合并了并发请求，算子之间不需要再并行
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_length = max_length or settings.embedding_max_length or min(
+            self.tokenizer.model_max_length, MODEL_MAX_LENGTH
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.model_path = model_path
+        logger.info("ONNX Embedding模型加载完成", extra={
+            "model": model_path, "threads": threads or "auto", "max_length": self.max_length
+        })
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np"
+        )
+        inputs = {name: encoded[name].astype(np.int64) for name in ("input_ids", "attention_mask")}
+        if "token_type_ids" in self.input_names:
+            inputs["token_type_ids"] = np.zeros_like(inputs["input_ids"])
+        hidden = self.session.run(None, inputs)[0]
+        cls = hidden[:, 0]
+        return cls / np.maximum(np.linalg.norm(cls, axis=1, keepdims=True), 1e-12)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        # 按长度分组，减少短句被补齐到长句长度的无效计算
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        chunks = []
+        batch_size = settings.embedding_batch_size
+        for start in range(0, len(order), batch_size):
+            indices = order[start:start + batch_size]
+            chunks.append((indices, self._embed([texts[i] for i in indices])))
+        vectors = np.empty((len(texts), chunks[0][1].shape[1]), dtype=np.float32)
+        for indices, chunk in chunks:
+            vectors[indices] = chunk
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
@@ -0,0 +1,29 @@
+import redis.asyncio as redis
+from config.settings import settings
+from typing import Optional
+
+_client: Optional[redis.Redis] = None
+_binary_client: Optional[redis.Redis] = None
+
+def _create_pool(decode_responses: bool) -> redis.ConnectionPool:
+    return redis.ConnectionPool(
+        host=settings.redis_host,
+        port=settings.redis_port,
+        max_connections=settings.redis_max_connections,
+        socket_timeout=settings.redis_socket_timeout,
+        decode_responses=decode_responses
+    )
+
+def get_redis() -> redis.Redis:
+    """获取进程内共享的异步Redis客户端（共用一个连接池）"""
+    global _client
+    if _client is None:
+        _client = redis.Redis(connection_pool=_create_pool(decode_responses=True))
+    return _client
+
+def get_binary_redis() -> redis.Redis:
+    """获取返回原始字节的Redis客户端（用于向量等二进制数据）"""
+    global _binary_client
+    if _binary_client is None:
+        _binary_client = redis.Redis(connection_pool=_create_pool(decode_responses=False))
+    return _binary_client
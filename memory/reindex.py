@@ -0,0 +1,284 @@
+"""重建向量索引：从PostgreSQL重新计算全部对话的embedding，写入新版本集合后原子切换别名
+
+用法（在项目根目录执行，使用 .env 中当前的 EMBEDDING_MODEL）:
+    python -m memory.reindex                          # 中断后再次运行会从断点继续
+    python -m memory.reindex --workers 4 --chunk-size 2000
+    python -m memory.reindex --restart                # 丢弃断点，新建集合重新开始
+    python -m memory.reindex --drop-old               # 切换后删除旧版本集合
+
+流程:
+1. 为每种语言新建 conversations_<语言>_<维度>d_<版本> 集合（导入期间不构建HNSW索引）
+2. 按conversation_id分块读取对话（keyset分页），在进程池中分批计算embedding，
+   写入新集合；每块写完后更新断点文件
+3. 恢复索引构建并等待完成，把别名 conversations_<语言> 原子切换到新集合
+4. 补写重建期间新增的对话（创建时间晚于开始时间减去 --overlap 秒）
+
+应用通过别名读写，切换后立即使用新集合。更换Embedding模型时，先用新配置运行
+本命令，完成后再用相同配置重启应用。旧版本直接以 conversations_<语言> 为集合名，
+需要加 --replace-legacy：切换时先删除旧集合再创建别名，期间检索会短暂降级为无RAG上下文。
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import CollectionStatus
+from sqlalchemy import func, select
+
+from config.settings import settings
+from database import SessionLocal, engine
+from database import models
+from memory.embeddings import create_embeddings
+from memory.vector_store import (
+    collection_alias, conversation_point, conversation_text, create_client, create_collection,
+    enable_indexing, switch_alias, versioned_collection_name
+)
+
+COLUMNS = (
+    models.Conversation.conversation_id,
+    models.Conversation.user_id,
+    models.Conversation.language,
+    models.Conversation.user_message,
+    models.Conversation.bot_response,
+    models.Conversation.created_at,
+)
+
+# ---- 进程池中的Embedding计算（每个子进程加载一份模型） ----
+
+_embeddings = None
+_dimension = 0
+
+def _init_worker(threads: int):
+    global _embeddings, _dimension
+    # 每个进程的推理线程数，避免多个进程争抢全部CPU核
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    settings.embedding_onnx_threads = threads
+    _embeddings, _dimension = create_embeddings()
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+
+def _describe():
+    """子进程实际使用的模型（加载失败时create_embeddings会回退到bge-m3）"""
+    return settings.embedding_model, _dimension, _embeddings is not None
+
+def _embed(texts: List[str]) -> np.ndarray:
+    return np.asarray(_embeddings.embed_documents(texts), dtype=np.float32)
+
+# ---- 断点 ----
+
+def load_checkpoint(path: str) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_checkpoint(path: str, checkpoint: Dict):
+    """先写临时文件再替换，中断时不会留下写了一半的断点"""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+# ---- 读取、计算、写入 ----
+
+async def count_rows() -> int:
+    async with SessionLocal() as db:
+        result = await db.execute(
+            select(func.count()).select_from(models.Conversation)
+            .where(models.Conversation.language.in_(settings.supported_languages))
+        )
+        return result.scalar_one()
+
+async def read_chunk(after_id: Optional[str], size: int) -> List[Dict]:
+    """按主键顺序读取下一块（keyset分页，不使用OFFSET）"""
+    query = select(*COLUMNS).where(models.Conversation.language.in_(settings.supported_languages))
+    if after_id is not None:
+        query = query.where(models.Conversation.conversation_id > after_id)
+    async with SessionLocal() as db:
+        result = await db.execute(query.order_by(models.Conversation.conversation_id).limit(size))
+        return [dict(row) for row in result.mappings()]
+
+async def index_rows(
+    rows: List[Dict],
+    pool: ProcessPoolExecutor,
+    client: AsyncQdrantClient,
+    collections: Dict[str, str],
+    batch_size: int
+):
+    """分批在进程池中计算embedding，按语言写入对应集合"""
+    loop = asyncio.get_running_loop()
+    texts = [conversation_text(row["user_message"], row["bot_response"]) for row in rows]
+    vectors = np.concatenate(await asyncio.gather(*[
+        loop.run_in_executor(pool, _embed, texts[i:i + batch_size])
+        for i in range(0, len(texts), batch_size)
+    ]))
+
+    by_language: Dict[str, List] = {}
+    for row, text, vector in zip(rows, texts, vectors):
+        by_language.setdefault(row["language"], []).append(conversation_point(row, text, vector.tolist()))
+    upload_size = settings.qdrant_upload_batch_size
+    await asyncio.gather(*[
+        client.upsert(collection_name=collections[language], points=points[i:i + upload_size], wait=True)
+        for language, points in by_language.items()
+        for i in range(0, len(points), upload_size)
+    ])
+
+class Progress:
+    def __init__(self, total: int, done: int):
+        self.total = total
+        self.done = done
+        self.processed = 0
+        self.start = time.perf_counter()
+
+    def add(self, count: int):
+        self.done += count
+        self.processed += count
+        elapsed = time.perf_counter() - self.start
+        rate = self.processed / elapsed if elapsed else 0.0
+        percent = self.done / self.total * 100 if self.total else 100.0
+        eta = (self.total - self.done) / rate if rate else 0.0
+        print(f"  {self.done}/{self.total} 行 ({percent:.1f}%), {rate:.0f} 行/秒, 预计剩余 {eta:.0f} 秒", flush=True)
+
+async def wait_indexed(client: AsyncQdrantClient, collection_name: str, poll: float = 2.0):
+    """等待HNSW索引构建完成（集合状态变为green）"""
+    while (await client.get_collection(collection_name)).status != CollectionStatus.GREEN:
+        await asyncio.sleep(poll)
+
+async def backfill(args, checkpoint: Dict, pool: ProcessPoolExecutor, client: AsyncQdrantClient):
+    total = await count_rows()
+    progress = Progress(total, checkpoint["rows"])
+    print(f"重建 {total} 条对话（已完成 {checkpoint['rows']} 条）")
+
+    next_chunk = asyncio.create_task(read_chunk(checkpoint["last_id"], args.chunk_size))
+    while True:
+        rows = await next_chunk
+        if not rows:
+            break
+        # 计算当前块时预读下一块
+        next_chunk = asyncio.create_task(read_chunk(rows[-1]["conversation_id"], args.chunk_size))
+        await index_rows(rows, pool, client, checkpoint["collections"], args.batch_size)
+        checkpoint["last_id"] = rows[-1]["conversation_id"]
+        checkpoint["rows"] += len(rows)
+        save_checkpoint(args.checkpoint, checkpoint)
+        progress.add(len(rows))
+
+async def switch(checkpoint: Dict, client: AsyncQdrantClient) -> Dict[str, Optional[str]]:
+    """恢复索引构建，等待完成后逐个语言切换别名，返回旧集合"""
+    existing = {c.name for c in (await client.get_collections()).collections}
+    previous = {}
+    for language, collection_name in checkpoint["collections"].items():
+        await enable_indexing(client, collection_name)
+        print(f"等待 {collection_name} 索引构建完成…", flush=True)
+        await wait_indexed(client, collection_name)
+        alias = collection_alias(language)
+        if alias in existing:
+            await client.delete_collection(alias)
+            print(f"已删除旧版本集合 {alias}")
+        previous[language] = await switch_alias(client, alias, collection_name)
+        print(f"✅ {alias} -> {collection_name}")
+    return previous
+
+async def catch_up(args, checkpoint: Dict, pool: ProcessPoolExecutor, client: AsyncQdrantClient):
+    """补写重建开始后新增的对话（应用在切换前写入的是旧集合）；重复写入按point ID覆盖"""
+    since = datetime.fromisoformat(checkpoint["started_at"]) - timedelta(seconds=args.overlap)
+    count = 0
+    async with SessionLocal() as db:
+        result = await db.stream(
+            select(*COLUMNS)
+            .where(models.Conversation.language.in_(settings.supported_languages))
+            .where(models.Conversation.created_at >= since)
+            .execution_options(yield_per=args.chunk_size)
+        )
+        async for partition in result.mappings().partitions():
+            rows = [dict(row) for row in partition]
+            await index_rows(rows, pool, client, checkpoint["collections"], args.batch_size)
+            count += len(rows)
+    print(f"补写重建期间新增的对话: {count} 条")
+
+async def main():
+    cpus = os.cpu_count() or 2
+    parser = argparse.ArgumentParser(description="从PostgreSQL重建向量索引")
+    parser.add_argument("--workers", type=int, default=max(1, cpus // 2), help="计算embedding的进程数")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="每次从数据库读取的行数（也是断点间隔）")
+    parser.add_argument("--batch-size", type=int, default=settings.embedding_batch_size, help="每个进程一次计算的文本数")
+    parser.add_argument("--checkpoint", default="reindex_checkpoint.json")
+    parser.add_argument("--restart", action="store_true", help="忽略已有断点，新建集合重新开始")
+    parser.add_argument("--overlap", type=float, default=300, help="补写新增对话时向前多取的秒数")
+    parser.add_argument("--drop-old", action="store_true", help="切换后删除别名原来指向的集合")
+    parser.add_argument("--replace-legacy", action="store_true", help="允许删除与别名同名的旧集合")
+    args = parser.parse_args()
+
+    threads = max(1, cpus // args.workers)
+    pool = ProcessPoolExecutor(
+        max_workers=args.workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(threads,)
+    )
+    client = create_client()
+    try:
+        model, dimension, loaded = await asyncio.get_running_loop().run_in_executor(pool, _describe)
+        if not loaded:
+            raise SystemExit("❌ 未配置Embedding模型")
+
+        collections = {c.name for c in (await client.get_collections()).collections}
+        legacy = [collection_alias(l) for l in settings.supported_languages if collection_alias(l) in collections]
+        if legacy and not args.replace_legacy:
+            raise SystemExit(f"❌ {', '.join(legacy)} 是集合而不是别名，确认可以删除后加 --replace-legacy 重新运行")
+
+        checkpoint = None if args.restart else load_checkpoint(args.checkpoint)
+        if checkpoint is not None and (checkpoint["model"], checkpoint["dimension"]) != (model, dimension):
+            raise SystemExit(
+                f"❌ 断点使用的模型为 {checkpoint['model']}（{checkpoint['dimension']}维），"
+                f"当前为 {model}（{dimension}维），加 --restart 重新开始"
+            )
+        if checkpoint is None:
+            version = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+            checkpoint = {
+                "model": model,
+                "dimension": dimension,
+                "collections": {
+                    language: versioned_collection_name(language, dimension, version)
+                    for language in settings.supported_languages
+                },
+                "started_at": datetime.utcnow().isoformat(),
+                "last_id": None,
+                "rows": 0,
+                "switched": False,
+            }
+            for collection_name in checkpoint["collections"].values():
+                await create_collection(client, collection_name, dimension, bulk_load=True)
+            save_checkpoint(args.checkpoint, checkpoint)
+        print(f"模型: {model}（{dimension}维），进程数: {args.workers}，每进程线程数: {threads}")
+
+        start = time.perf_counter()
+        if not checkpoint["switched"]:
+            await backfill(args, checkpoint, pool, client)
+            previous = await switch(checkpoint, client)
+            checkpoint["switched"] = True
+            checkpoint["previous"] = previous
+            save_checkpoint(args.checkpoint, checkpoint)
+        await catch_up(args, checkpoint, pool, client)
+
+        if args.drop_old:
+            for collection_name in checkpoint.get("previous", {}).values():
+                if collection_name and collection_name not in checkpoint["collections"].values():
+                    await client.delete_collection(collection_name)
+                    print(f"已删除旧集合 {collection_name}")
+        os.remove(args.checkpoint)
+        print(f"✅ 重建完成，用时 {time.perf_counter() - start:.0f} 秒")
+    finally:
+        pool.shutdown(cancel_futures=True)
+        await client.close()
+        await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
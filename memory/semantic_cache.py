@@ -0,0 +1,98 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config.settings import settings
+from core.tracing import CACHE_LOOKUPS
+
+@dataclass
+class CacheEntry:
+    vector: np.ndarray
+    response: str
+    created_at: float
+
+class SemanticCache:
+    """语义回复缓存
+
+    以（语言, 用户）为范围，缓存最近的 查询向量 -> 回复。新查询与缓存向量的
+    余弦相似度超过阈值即直接返回缓存的回复，省去一次LLM调用。
+    复用RAG检索时已经计算好的query embedding，不额外计算向量。
+    条目按TTL过期，用户范围按LRU淘汰。
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        ttl: Optional[float] = None,
+        max_users: Optional[int] = None,
+        max_entries_per_user: Optional[int] = None
+    ):
+        self.threshold = threshold or settings.semantic_cache_threshold
+        self.ttl = ttl or settings.semantic_cache_ttl
+        self.max_users = max_users or settings.semantic_cache_max_users
+        self.max_entries_per_user = max_entries_per_user or settings.semantic_cache_max_entries_per_user
+        self._scopes: "OrderedDict[Tuple[str, str], List[CacheEntry]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def enabled_for(language: str) -> bool:
+        """按人设（每种语言一套系统提示词）开关缓存"""
+        return (
+            settings.semantic_cache_enabled
+            and language not in settings.semantic_cache_disabled_personas
+        )
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def lookup(self, language: str, user_id: str, vector) -> Optional[str]:
+        """查找相似查询的缓存回复，未命中返回None"""
+        scope = (language, user_id)
+        entries = self._scopes.get(scope)
+        now = time.time()
+        if entries:
+            entries[:] = [e for e in entries if now - e.created_at < self.ttl]
+        if not entries:
+            self._scopes.pop(scope, None)
+            self.misses += 1
+            CACHE_LOOKUPS.inc(cache="semantic", result="miss")
+            return None
+
+        self._scopes.move_to_end(scope)
+        query = self._normalize(vector)
+        scores = np.stack([e.vector for e in entries]) @ query
+        best = int(np.argmax(scores))
+        if scores[best] >= self.threshold:
+            self.hits += 1
+            CACHE_LOOKUPS.inc(cache="semantic", result="hit")
+            return entries[best].response
+        self.misses += 1
+        CACHE_LOOKUPS.inc(cache="semantic", result="miss")
+        return None
+
+    def store(self, language: str, user_id: str, vector, response: str):
+        """缓存一条回复"""
+        scope = (language, user_id)
+        entries = self._scopes.setdefault(scope, [])
+        entries.append(CacheEntry(self._normalize(vector), response, time.time()))
+        if len(entries) > self.max_entries_per_user:
+            del entries[0]
+        self._scopes.move_to_end(scope)
+        while len(self._scopes) > self.max_users:
+            self._scopes.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "users": len(self._scopes),
+        }
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config.settings import settings
+from core.tracing import CACHE_LOOKUPS
+from database import models
+from database.crud import UserCRUD
+from memory.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+NEW_USER_INFO = {"zh": "新用户", "nl": "Nieuwe gebruiker", "en": "New user"}
+
+# 各语言的字段名；画像中的JSON字段为空时不输出
+LABELS = {
+    "zh": {"name": "姓名", "age": "年龄", "family_members": "家人", "interests": "兴趣爱好", "medications": "正在服用的药物"},
+    "nl": {"name": "Naam", "age": "Leeftijd", "family_members": "Familie", "interests": "Interesses", "medications": "Medicijnen"},
+    "en": {"name": "Name", "age": "Age", "family_members": "Family", "interests": "Interests", "medications": "Medications"},
+}
+
+PROFILE_FIELDS = ("family_members", "interests", "medications")
+
+def _format_value(value) -> str:
+    """画像JSON字段转为一行文本: ["园艺", "京剧"] / [{"name": "小明", "relation": "孙子"}] / {"孙子": "小明"}"""
+    if isinstance(value, dict):
+        return ", ".join(f"{k}: {v}" for k, v in value.items())
+    if isinstance(value, list):
+        return ", ".join(
+            " ".join(str(v) for v in item.values() if v) if isinstance(item, dict) else str(item)
+            for item in value
+        )
+    return str(value)
+
+def build_user_info(user: models.User, profile: Optional[models.UserProfile], language: str) -> str:
+    labels = LABELS[language]
+    lines = [f"{labels['name']}: {user.name}, {labels['age']}: {user.age}"]
+    if profile is not None:
+        for field in PROFILE_FIELDS:
+            value = getattr(profile, field)
+            if value:
+                lines.append(f"{labels[field]}: {_format_value(value)}")
+    return "\n".join(lines)
+
+@dataclass(frozen=True)
+class UserContext:
+    user_id: str
+    preferred_language: str
+    user_info: Dict[str, str]  # 语言 -> 预先拼好的用户信息
+
+    @classmethod
+    def from_user(cls, user: models.User) -> "UserContext":
+        """user的profile需已加载（UserCRUD.get_user_with_profile）"""
+        return cls(
+            user_id=user.user_id,
+            preferred_language=user.preferred_language,
+            user_info={language: build_user_info(user, user.profile, language) for language in LABELS}
+        )
+
+    def info(self, language: str) -> str:
+        return self.user_info.get(language, self.user_info["en"])
+
+class UserContextCache:
+    """用户上下文缓存：进程内TTL + LRU，多进程之间通过Redis发布/订阅失效
+
+    缓存用户及其画像（一次查询加载）和预先拼好的各语言用户信息，同一用户的
+    后续对话不再查询数据库；不存在的用户也会缓存（None）。修改用户或画像的
+    接口（PUT /api/users/...）提交后调用 invalidate()，所有进程删除该用户的条目。订阅中断期间可能错过失效
+    消息，重新订阅时清空本地缓存；TTL作为兜底。
+    """
+
+    def __init__(
+        self,
+        redis_client=None,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+        channel: Optional[str] = None
+    ):
+        self.redis_client = redis_client if redis_client is not None else get_redis()
+        self.max_entries = max_entries or settings.user_context_cache_size
+        self.ttl = ttl or settings.user_context_cache_ttl
+        self.channel = channel or settings.user_context_channel
+        self._entries: "OrderedDict[str, Tuple[float, Optional[UserContext]]]" = OrderedDict()
+        self._default_user_id: Optional[str] = None
+        self._version = 0  # 每次失效加一，加载期间发生失效时不写入加载结果
+        self._listener: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, db: AsyncSession, user_id: str) -> Optional[UserContext]:
+        """获取用户上下文，未缓存或已过期时从数据库加载"""
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            CACHE_LOOKUPS.inc(cache="user_context", result="hit")
+            return entry[1]
+        self.misses += 1
+        CACHE_LOOKUPS.inc(cache="user_context", result="miss")
+
+        version = self._version
+        user = await UserCRUD.get_user_with_profile(db, user_id)
+        context = UserContext.from_user(user) if user is not None else None
+        if version == self._version:
+            self._entries[user_id] = (time.monotonic() + self.ttl, context)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return context
+
+    async def default_user_id(self, db: AsyncSession) -> str:
+        """默认用户（MVP阶段）的ID，进程内只查询一次"""
+        if self._default_user_id is None:
+            user = await UserCRUD.get_or_create_default_user(db)
+            self._default_user_id = user.user_id
+        return self._default_user_id
+
+    def _drop(self, user_id: str):
+        self._version += 1
+        self._entries.pop(user_id, None)
+        if user_id == self._default_user_id:
+            self._default_user_id = None
+
+    async def invalidate(self, user_id: str):
+        """删除本进程的条目，并通知其他进程"""
+        self._drop(user_id)
+        try:
+            await self.redis_client.publish(self.channel, user_id)
+        except Exception as e:
+            logger.warning("发布用户上下文失效消息失败", extra={"user_id": user_id, "error": repr(e)})
+
+    def clear(self):
+        self._version += 1
+        self._entries.clear()
+        self._default_user_id = None
+
+    async def start(self):
+        """启动失效消息订阅"""
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            pubsub = self.redis_client.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                self.clear()
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is not None and message["type"] == "message":
+                        self._drop(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("用户上下文失效订阅中断，稍后重试", extra={"error": repr(e)})
+                await asyncio.sleep(5)
+            finally:
+                await pubsub.reset()
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": len(self._entries),
+        }
@@ -1,67 +1,277 @@
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import (
+    Distance, VectorParams, VectorParamsDiff, PointStruct, HnswConfigDiff,
+    Filter, FieldCondition, MatchValue,
+    KeywordIndexParams, PayloadSchemaType, ScalarQuantization,
+    ScalarQuantizationConfig, ScalarType, BinaryQuantization,
+    BinaryQuantizationConfig, SearchParams, QuantizationSearchParams,
+    OptimizersConfigDiff, CreateAlias, CreateAliasOperation, DeleteAlias, DeleteAliasOperation,
+    Range, OrderBy, Direction, IsEmptyCondition, PayloadField
+)
 from config.settings import settings
-from typing import List, Dict
-import uuid
+from memory.embeddings import create_embeddings
+from memory.embedding_cache import EmbeddingCache
+from memory.embedding_service import EmbeddingService
+from memory.hot_index import HotIndex
+from core.tracing import span
+from datetime import datetime, timezone
+from typing import List, Dict, Optional, Tuple
+import asyncio
+import logging
+import time
 
-class VectorStore:
-    def __init__(self):
-        self.client = QdrantClient(
-            host=settings.qdrant_host,
-            port=settings.qdrant_port
+logger = logging.getLogger(__name__)
+
+def collection_alias(language: str) -> str:
+    """读写使用的集合名（别名），指向当前版本的集合，重建索引时原子切换"""
+    return f"conversations_{language}"
+
+def versioned_collection_name(language: str, dimension: int, version: Optional[str] = None) -> str:
+    """别名背后的实际集合: conversations_<语言>_<维度>d_<版本>"""
+    version = version or datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    return f"{collection_alias(language)}_{dimension}d_{version}"
+
+def conversation_text(user_message: str, bot_response: str) -> str:
+    """一轮对话写入向量库时的文本（用户消息 + 回复）"""
+    return f"用户: {user_message}\n助手: {bot_response}"
+
+def conversation_point(conv: Dict, text: str, vector) -> PointStruct:
+    """以conversation_id作为point ID，重复写入同一条对话不会产生重复数据"""
+    return PointStruct(
+        id=conv["conversation_id"],
+        vector=vector,
+        payload={
+            "user_id": conv["user_id"],
+            "conversation_id": conv["conversation_id"],
+            "user_message": conv["user_message"],
+            "bot_response": conv["bot_response"],
+            "text": text,
+            "created_at": to_timestamp(conv.get("created_at"))
+        }
+    )
+
+def payload_index_schemas() -> Dict[str, object]:
+    """需要建立的payload索引：user_id（过滤）、conversation_id（定位）、created_at（时间范围/排序）"""
+    return {
+        "user_id": KeywordIndexParams(
+            type="keyword",
+            is_tenant=settings.qdrant_tenant_mode == "tenant"
+        ),
+        "conversation_id": PayloadSchemaType.KEYWORD,
+        "created_at": PayloadSchemaType.FLOAT,
+    }
+
+def tenant_hnsw_config() -> Optional[HnswConfigDiff]:
+    """多租户模式：不建全局HNSW图，只按user_id为每位用户单独建图"""
+    if settings.qdrant_tenant_mode == "tenant":
+        return HnswConfigDiff(payload_m=16, m=0)
+    return None
+
+def quantization_config():
+    """按配置返回量化参数；量化向量常驻内存，原始向量可放磁盘用于重打分"""
+    if settings.vector_quantization == "scalar":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(
+            type=ScalarType.INT8, quantile=0.99, always_ram=True
+        ))
+    if settings.vector_quantization == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    return None
+
+def search_params() -> Optional[SearchParams]:
+    """量化模式下的检索参数：先用量化向量粗排（过采样），再用原始向量重打分"""
+    if settings.vector_quantization == "none":
+        return None
+    return SearchParams(quantization=QuantizationSearchParams(
+        ignore=False,
+        rescore=settings.vector_rescore,
+        oversampling=settings.vector_oversampling
+    ))
+
+def before_filter(oldest: float) -> Filter:
+    """早于oldest的对话，包括没有created_at的旧数据（未运行 migrate_vectors --backfill 时）"""
+    return Filter(should=[
+        FieldCondition(key="created_at", range=Range(lt=oldest)),
+        IsEmptyCondition(is_empty=PayloadField(key="created_at")),
+    ])
+
+async def has_points_without_created_at(
+    client: AsyncQdrantClient, collection_name: str, user_id: Optional[str] = None
+) -> bool:
+    """是否存在没有created_at的旧数据（按created_at排序的scroll不会返回这些point）"""
+    conditions = [IsEmptyCondition(is_empty=PayloadField(key="created_at"))]
+    if user_id is not None:
+        conditions.append(FieldCondition(key="user_id", match=MatchValue(value=user_id)))
+    points, _ = await client.scroll(
+        collection_name=collection_name,
+        scroll_filter=Filter(must=conditions),
+        limit=1,
+        with_payload=False,
+        with_vectors=False
+    )
+    return bool(points)
+
+def create_client() -> AsyncQdrantClient:
+    """创建异步Qdrant客户端：优先gRPC，通道在进程内复用"""
+    return AsyncQdrantClient(
+        host=settings.qdrant_host,
+        port=settings.qdrant_port,
+        grpc_port=settings.qdrant_grpc_port,
+        prefer_grpc=settings.qdrant_prefer_grpc,
+        timeout=settings.qdrant_timeout
+    )
+
+async def ensure_payload_indexes(client: AsyncQdrantClient, collection_name: str) -> List[str]:
+    """为集合补建缺失的payload索引，返回新建的字段名"""
+    existing = (await client.get_collection(collection_name)).payload_schema or {}
+    created = []
+    for field_name, schema in payload_index_schemas().items():
+        if field_name in existing:
+            continue
+        await client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field_name,
+            field_schema=schema
         )
+        created.append(field_name)
+    if created:
+        logger.info("新建payload索引", extra={"collection": collection_name, "fields": created})
+    return created
+
+async def create_collection(client: AsyncQdrantClient, collection_name: str, dimension: int, bulk_load: bool = False):
+    """按当前配置（多租户、量化）创建集合并建立payload索引
+
+    bulk_load: 批量导入期间不构建HNSW索引，导入完成后调用 enable_indexing
+    """
+    await client.create_collection(
+        collection_name=collection_name,
+        vectors_config=VectorParams(
+            size=dimension,
+            distance=Distance.COSINE,
+            on_disk=settings.vector_on_disk
+        ),
+        hnsw_config=tenant_hnsw_config(),
+        quantization_config=quantization_config(),
+        optimizers_config=OptimizersConfigDiff(indexing_threshold=0) if bulk_load else None
+    )
+    await ensure_payload_indexes(client, collection_name)
+    logger.info("创建向量集合", extra={"collection": collection_name, "dimensions": dimension})
+
+async def enable_indexing(client: AsyncQdrantClient, collection_name: str, indexing_threshold: int = 20000):
+    """批量导入结束后恢复HNSW索引构建（Qdrant默认阈值）"""
+    await client.update_collection(
+        collection_name=collection_name,
+        optimizers_config=OptimizersConfigDiff(indexing_threshold=indexing_threshold)
+    )
+
+async def get_aliases(client: AsyncQdrantClient) -> Dict[str, str]:
+    """别名 -> 实际集合名"""
+    return {a.alias_name: a.collection_name for a in (await client.get_aliases()).aliases}
+
+async def collection_dimension(client: AsyncQdrantClient, collection_name: str) -> int:
+    return (await client.get_collection(collection_name)).config.params.vectors.size
+
+async def switch_alias(client: AsyncQdrantClient, alias: str, collection_name: str) -> Optional[str]:
+    """在一次请求中删除旧别名并创建新别名（原子切换），返回别名原来指向的集合"""
+    previous = (await get_aliases(client)).get(alias)
+    operations = []
+    if previous is not None:
+        operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias)))
+    operations.append(CreateAliasOperation(create_alias=CreateAlias(
+        collection_name=collection_name, alias_name=alias
+    )))
+    await client.update_collection_aliases(change_aliases_operations=operations)
+    logger.info("别名已切换", extra={"alias": alias, "collection": collection_name, "previous": previous})
+    return previous
+
+async def migrate_collections(client: AsyncQdrantClient):
+    """迁移已有集合：补建payload索引，并按当前多租户模式更新HNSW配置"""
+    for lang in settings.supported_languages:
+        collection_name = collection_alias(lang)
+        await ensure_payload_indexes(client, collection_name)
+        hnsw_config = tenant_hnsw_config()
+        if hnsw_config is not None:
+            await client.update_collection(
+                collection_name=collection_name,
+                hnsw_config=hnsw_config
+            )
+            logger.info("集合已切换为按用户建图", extra={"collection": collection_name})
+        if settings.vector_quantization != "none":
+            await client.update_collection(
+                collection_name=collection_name,
+                vectors_config={"": VectorParamsDiff(on_disk=settings.vector_on_disk)},
+                quantization_config=quantization_config()
+            )
+            logger.info("集合已启用量化", extra={"collection": collection_name, "quantization": settings.vector_quantization})
+
+def to_timestamp(value: Optional[datetime]) -> float:
+    """把数据库中的UTC时间（naive）转换为Unix时间戳"""
+    if value is None:
+        return time.time()
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+class VectorStore:
+    def __init__(self, embeddings=None, embedding_dim: Optional[int] = None):
+        self.client = create_client()
         
-        # 根据配置选择Embedding模型
-        self.embeddings = None
-        self.embedding_dim = 1024  # 默认维度
-        
-        if settings.embedding_model == "openai":
-            # OpenAI Embeddings（需要API密钥）
-            if settings.openai_api_key:
-                self.embeddings = OpenAIEmbeddings(
-                    openai_api_key=settings.openai_api_key,
-                    model="text-embedding-3-small"
-                )
-                self.embedding_dim = 1536
-                print("✅ 使用OpenAI Embeddings")
-            else:
-                print("⚠️  未配置OpenAI API密钥，将使用本地BGE-M3模型")
-                settings.embedding_model = "bge-m3"  # 自动切换
+        # 根据配置选择Embedding模型（也可由调用方注入共享的模型），并通过微批处理服务调用
+        if embeddings is None:
+            embeddings, embedding_dim = create_embeddings()
+        self.embeddings = embeddings
+        self.embedding_dim = embedding_dim
+        self.embedding_service = (
+            EmbeddingService(self.embeddings, cache=self._create_cache()) if self.embeddings else None
+        )
+        # 近期对话索引：用户最近的对话在进程内检索，更早的历史才查询Qdrant
+        self.hot_index = (
+            HotIndex(self.embedding_dim) if self.embeddings and settings.hot_index_enabled else None
+        )
+        self._seeding: Dict[Tuple[str, str], asyncio.Task] = {}
+    
+    def _create_cache(self) -> Optional[EmbeddingCache]:
+        """按当前Embedding模型和维度创建结果缓存（可在配置中关闭）"""
+        if not settings.embedding_cache_enabled:
+            return None
+        return EmbeddingCache(settings.embedding_model, self.embedding_dim)
+    
+    async def ensure_collections(self):
+        """为每种语言确保集合存在（只查询一次已有集合列表）
         
-        if settings.embedding_model == "bge-m3":
-            # BGE-M3本地模型（开源，无需API）
-            print("📦 加载BGE-M3本地Embedding模型（首次运行会下载模型，约2GB）...")
-            self.embeddings = HuggingFaceEmbeddings(
-                model_name="BAAI/bge-m3",
-                model_kwargs={'device': 'cpu'},  # 使用CPU，如果有GPU可改为'cuda'
-                encode_kwargs={'normalize_embeddings': True}
-            )
-            self.embedding_dim = 1024
-            print("✅ BGE-M3模型加载完成！支持中文、英语、荷兰语等100+语言")
+        获取集合列表失败时抛出异常，由调用方标记Qdrant不可用。
+        """
+        collections = (await self.client.get_collections()).collections
+        existing = {c.name for c in collections} | set(await get_aliases(self.client))
         
-        # 为每种语言创建集合
         for lang in settings.supported_languages:
-            self._ensure_collection(f"conversations_{lang}")
+            collection_name = collection_alias(lang)
+            try:
+                if collection_name not in existing:
+                    versioned = versioned_collection_name(lang, self.embedding_dim)
+                    await create_collection(self.client, versioned, self.embedding_dim)
+                    await switch_alias(self.client, collection_name, versioned)
+                    continue
+                dimension = await collection_dimension(self.client, collection_name)
+                if dimension != self.embedding_dim:
+                    # 切换了Embedding模型：写入和检索都会失败，需要从数据库重建
+                    logger.error("向量集合维度与Embedding模型不一致，请运行 python -m memory.reindex", extra={
+                        "collection": collection_name, "dimensions": dimension, "embedding_dimensions": self.embedding_dim
+                    })
+                await ensure_payload_indexes(self.client, collection_name)
+                if await has_points_without_created_at(self.client, collection_name):
+                    # 旧数据仍可检索，但近期对话索引无法按时间加载它们，每次都要回查Qdrant
+                    logger.warning("部分向量没有created_at，请运行 python -m memory.migrate_vectors --backfill", extra={
+                        "collection": collection_name
+                    })
+            except Exception as e:
+                logger.error("创建集合失败", extra={"collection": collection_name, "error": repr(e)})
     
-    def _ensure_collection(self, collection_name: str):
-        """确保集合存在"""
-        try:
-            collections = self.client.get_collections().collections
-            collection_names = [c.name for c in collections]
-            
-            if collection_name not in collection_names:
-                self.client.create_collection(
-                    collection_name=collection_name,
-                    vectors_config=VectorParams(
-                        size=self.embedding_dim,
-                        distance=Distance.COSINE
-                    )
-                )
-                print(f"✅ 创建向量集合: {collection_name} (维度: {self.embedding_dim})")
-        except Exception as e:
-            print(f"❌ 创建集合 {collection_name} 失败: {e}")
+    async def close(self):
+        """关闭Qdrant连接，等待Embedding缓存的后台写入"""
+        for task in list(self._seeding.values()):
+            task.cancel()
+        await asyncio.gather(*self._seeding.values(), return_exceptions=True)
+        if self.embedding_service is not None:
+            await self.embedding_service.close()
+        await self.client.close()
     
     async def add_conversation(
         self,
@@ -72,66 +282,159 @@ class VectorStore:
         conversation_id: str
     ):
         """添加对话到向量数据库"""
+        try:
+            await self.add_conversations([{
+                "user_id": user_id,
+                "language": language,
+                "user_message": user_message,
+                "bot_response": bot_response,
+                "conversation_id": conversation_id,
+                "created_at": datetime.utcnow()
+            }])
+        except Exception as e:
+            logger.error("保存对话到向量数据库失败", extra={"error": repr(e)})
+    
+    async def add_conversations(self, conversations: List[Dict]) -> int:
+        """批量添加对话到向量数据库
+        
+        每种语言只做一次批量embedding和一次写入。以conversation_id作为
+        point ID，重试时不会产生重复数据。失败时抛出异常，由调用方决定是否重试。
+        """
         # 如果没有配置embeddings，跳过向量存储
         if not self.embeddings:
-            print("⚠️  未配置Embedding模型，跳过向量存储")
-            return
-            
-        try:
+            logger.warning("未配置Embedding模型，跳过向量存储")
+            return 0
+        
+        by_language: Dict[str, List[Dict]] = {}
+        for conv in conversations:
+            by_language.setdefault(conv["language"], []).append(conv)
+        
+        for language, convs in by_language.items():
             # 合并对话内容
-            text = f"用户: {user_message}\n助手: {bot_response}"
+            texts = [conversation_text(conv["user_message"], conv["bot_response"]) for conv in convs]
             
-            # 生成embedding
-            embedding = await self.embeddings.aembed_query(text)
+            # 批量生成embedding
+            with span("embedding.batch"):
+                embeddings = await self.embedding_service.embed_many(texts)
             
-            # 存储到Qdrant
-            self.client.upsert(
-                collection_name=f"conversations_{language}",
-                points=[
-                    PointStruct(
-                        id=str(uuid.uuid4()),
-                        vector=embedding,
-                        payload={
-                            "user_id": user_id,
-                            "conversation_id": conversation_id,
-                            "user_message": user_message,
-                            "bot_response": bot_response,
-                            "text": text
-                        }
+            points = [
+                conversation_point(conv, text, embedding)
+                for conv, text, embedding in zip(convs, texts, embeddings)
+            ]
+            await self.upload(collection_alias(language), points)
+            if self.hot_index is not None:
+                for point in points:
+                    self.hot_index.add(
+                        point.payload["user_id"], language, point.payload["conversation_id"],
+                        point.payload["text"], point.vector, point.payload["created_at"]
                     )
-                ]
+        
+        logger.info("对话已保存到向量数据库", extra={"count": len(conversations), "embedding_model": settings.embedding_model})
+        return len(conversations)
+    
+    async def upload(self, collection_name: str, points: List[PointStruct]):
+        """写入points
+        
+        常规小批次直接upsert，复用异步gRPC通道；超过一个上传批次的大批量
+        走upload_points分批（可并行）上传。upload_points在异步客户端中也是
+        同步实现，会新建连接，因此放到线程中执行，不阻塞事件循环。
+        """
+        if len(points) <= settings.qdrant_upload_batch_size:
+            with span("qdrant.upsert"):
+                await self.client.upsert(collection_name=collection_name, points=points)
+            return
+        with span("qdrant.upload"):
+            await asyncio.to_thread(
+                self.client.upload_points,
+                collection_name=collection_name,
+                points=points,
+                batch_size=settings.qdrant_upload_batch_size,
+                parallel=settings.qdrant_upload_parallel,
+                wait=True
+            )
+    
+    async def embed_query(self, query: str) -> Optional[List[float]]:
+        """生成查询向量；未配置Embedding模型时返回None"""
+        if not self.embeddings:
+            return None
+        with span("embedding.query"):
+            return await self.embedding_service.embed(query)
+    
+    def _schedule_seed(self, user_id: str, language: str):
+        key = (language, user_id)
+        if key in self._seeding:
+            return
+        task = asyncio.create_task(self._seed_hot_index(user_id, language))
+        self._seeding[key] = task
+        task.add_done_callback(lambda _: self._seeding.pop(key, None))
+    
+    async def _seed_hot_index(self, user_id: str, language: str):
+        """从Qdrant加载用户最近的对话到近期索引（后台执行，不阻塞当前请求）"""
+        capacity = self.hot_index.capacity
+        try:
+            points, _ = await self.client.scroll(
+                collection_name=collection_alias(language),
+                scroll_filter=Filter(must=[
+                    FieldCondition(key="user_id", match=MatchValue(value=user_id))
+                ]),
+                limit=capacity,
+                order_by=OrderBy(key="created_at", direction=Direction.DESC),
+                with_payload=["conversation_id", "text", "created_at"],
+                with_vectors=True
+            )
+            # 按created_at排序会漏掉没有created_at的旧数据，存在时不能认为索引已覆盖全部对话
+            legacy = len(points) < capacity and await has_points_without_created_at(
+                self.client, collection_alias(language), user_id
             )
-            print(f"✅ 对话已保存到向量数据库 (模型: {settings.embedding_model})")
         except Exception as e:
-            print(f"❌ 保存对话到向量数据库失败: {e}")
+            logger.warning("加载近期对话索引失败", extra={"user_id": user_id, "error": repr(e)})
+            return
+        entries = [
+            (p.payload.get("conversation_id", str(p.id)), p.payload["text"], p.vector, p.payload.get("created_at", 0.0))
+            for p in reversed(points)
+        ]
+        self.hot_index.seed(user_id, language, entries, complete=len(points) < capacity and not legacy)
     
     async def search_similar_conversations(
         self,
         user_id: str,
         language: str,
         query: str,
-        limit: int = 3
+        limit: int = 3,
+        query_embedding: Optional[List[float]] = None
     ) -> List[Dict]:
-        """搜索相似对话"""
+        """搜索相似对话（可传入已计算好的query_embedding，避免重复计算）"""
         # 如果没有配置embeddings，返回空列表
         if not self.embeddings:
             return []
             
+        hot = None
         try:
             # 生成query embedding
-            query_embedding = await self.embeddings.aembed_query(query)
+            if query_embedding is None:
+                query_embedding = await self.embed_query(query)
+            
+            # 先查近期对话索引：结果足够时不访问Qdrant，否则只向Qdrant查询更早的历史
+            conditions = [FieldCondition(key="user_id", match=MatchValue(value=user_id))]
+            if self.hot_index is not None:
+                with span("hot_index.search"):
+                    hot = self.hot_index.search(user_id, language, query_embedding, limit)
+                if hot is None:
+                    self._schedule_seed(user_id, language)
+                elif hot.complete:
+                    return hot.results
+                else:
+                    conditions.append(before_filter(hot.oldest))
             
             # 搜索
-            results = self.client.search(
-                collection_name=f"conversations_{language}",
-                query_vector=query_embedding,
-                query_filter={
-                    "must": [
-                        {"key": "user_id", "match": {"value": user_id}}
-                    ]
-                },
-                limit=limit
-            )
+            with span("qdrant.search"):
+                results = (await self.client.query_points(
+                    collection_name=collection_alias(language),
+                    query=query_embedding,
+                    query_filter=Filter(must=conditions),
+                    search_params=search_params(),
+                    limit=limit
+                )).points
             
             similar_convs = [
                 {
@@ -140,11 +443,13 @@ class VectorStore:
                 }
                 for hit in results
             ]
+            if hot is not None:
+                similar_convs = sorted(hot.results + similar_convs, key=lambda c: c["score"], reverse=True)[:limit]
             
             if similar_convs:
-                print(f"🔍 找到 {len(similar_convs)} 条相似对话 (模型: {settings.embedding_model})")
+                logger.debug("找到相似对话", extra={"count": len(similar_convs)})
             
             return similar_convs
         except Exception as e:
-            print(f"❌ 搜索相似对话失败: {e}")
-            return []
+            logger.error("搜索相似对话失败", extra={"error": repr(e)})
+            return hot.results if hot is not None else []
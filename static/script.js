@@ -11,6 +11,21 @@ document.addEventListener('DOMContentLoaded', () => {
         messageElement.appendChild(p);
         chatBox.appendChild(messageElement);
         chatBox.scrollTop = chatBox.scrollHeight;
+        return p;
+    };
+
+    // 解析一段SSE文本，返回 {event, data}
+    const parseEvent = (raw) => {
+        let event = 'message';
+        const dataLines = [];
+        raw.split('\n').forEach((line) => {
+            if (line.startsWith('event:')) {
+                event = line.slice(6).trim();
+            } else if (line.startsWith('data:')) {
+                dataLines.push(line.slice(5).trim());
+            }
+        });
+        return { event, data: dataLines.length ? JSON.parse(dataLines.join('\n')) : {} };
     };
 
     const sendMessage = async () => {
@@ -20,8 +35,11 @@ document.addEventListener('DOMContentLoaded', () => {
         addMessage(message, 'user');
         userInput.value = '';
 
+        // 先创建一个空的机器人消息，随着token到达逐步填充
+        const botText = addMessage('', 'bot');
+
         try {
-            const response = await fetch('/api/chat', {
+            const response = await fetch('/api/chat/stream', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
@@ -29,15 +47,37 @@ document.addEventListener('DOMContentLoaded', () => {
                 body: JSON.stringify({ message: message })
             });
 
-            if (!response.ok) {
+            if (!response.ok || !response.body) {
                 throw new Error('Network response was not ok');
             }
 
-            const data = await response.json();
-            addMessage(data.reply, 'bot');
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder('utf-8');
+            let buffer = '';
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                // SSE事件以空行分隔
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const raw = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+                    const { event, data } = parseEvent(raw);
+
+                    if (event === 'token') {
+                        botText.textContent += data.token;
+                        chatBox.scrollTop = chatBox.scrollHeight;
+                    } else if (event === 'done' || event === 'error') {
+                        botText.textContent = data.reply;
+                    }
+                }
+            }
         } catch (error) {
             console.error('Error:', error);
-            addMessage('Sorry, something went wrong.', 'bot');
+            botText.textContent = 'Sorry, something went wrong.';
         }
     };
 
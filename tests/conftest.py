@@ -0,0 +1,7 @@
+import os
+
+# Settings要求的必填项；单元测试不连接数据库和LLM服务
+os.environ.setdefault("DEEPSEEK_API_KEY", "test")
+os.environ.setdefault("POSTGRES_USER", "test")
+os.environ.setdefault("POSTGRES_PASSWORD", "test")
+os.environ.setdefault("POSTGRES_DB", "test")
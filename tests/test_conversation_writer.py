@@ -0,0 +1,133 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+
+import core.conversation_writer as writer_module
+from config.settings import settings
+from core.conversation_writer import ConversationWriter, PendingConversation
+from database.crud import ConversationCRUD
+
+class FakeRedis:
+    """只实现写入管道用到的列表和集合命令"""
+
+    def __init__(self):
+        self.lists = {}
+        self.sets = {}
+
+    async def rpush(self, key, *values):
+        self.lists.setdefault(key, []).extend(values)
+
+    async def sadd(self, key, *values):
+        self.sets.setdefault(key, set()).update(values)
+
+    async def spop(self, key, count):
+        members = self.sets.get(key, set())
+        return [members.pop() for _ in range(min(count, len(members)))]
+
+class FakeVectorStore:
+    def __init__(self):
+        self.fail = False
+        self.added = []
+
+    async def add_conversations(self, rows):
+        if self.fail:
+            raise RuntimeError("qdrant down")
+        self.added.extend(row["conversation_id"] for row in rows)
+        return len(rows)
+
+@pytest.fixture
+def db(monkeypatch):
+    """模拟数据库：bad_ids中的行写入失败（整批提交时整批失败）"""
+    state = {"saved": [], "bad_ids": set(), "batches": 0}
+
+    async def save_rows(rows):
+        state["batches"] += 1
+        if any(row["conversation_id"] in state["bad_ids"] for row in rows):
+            raise RuntimeError("constraint violation")
+        state["saved"].extend(row["conversation_id"] for row in rows)
+        return len(rows)
+
+    async def get_conversations_by_ids(session, ids):
+        return [
+            SimpleNamespace(conversation_id=i, user_id="u1", language="zh",
+                            user_message="m", bot_response="b", created_at=None)
+            for i in ids if i in state["saved"]
+        ]
+
+    @asynccontextmanager
+    async def session_local():
+        yield None
+
+    monkeypatch.setattr(ConversationWriter, "_save_rows", staticmethod(save_rows))
+    monkeypatch.setattr(ConversationCRUD, "get_conversations_by_ids", staticmethod(get_conversations_by_ids))
+    monkeypatch.setattr(writer_module, "SessionLocal", session_local)
+    monkeypatch.setattr(settings, "write_retry_backoff", 0.0)
+    monkeypatch.setattr(settings, "write_flush_interval", 0.01)
+    return state
+
+def pending(*ids):
+    return [
+        PendingConversation(conversation_id=i, user_id="u1", language="zh", user_message="m", bot_response="b")
+        for i in ids
+    ]
+
+def test_batch_failure_salvages_good_rows(db):
+    redis, vectors = FakeRedis(), FakeVectorStore()
+    writer = ConversationWriter(vectors, redis_client=redis)
+    db["bad_ids"] = {"b"}
+    asyncio.run(writer._write_batch(pending("a", "b", "c")))
+    assert db["saved"] == ["a", "c"]
+    assert db["batches"] == settings.write_max_retries + 3
+    assert vectors.added == ["a", "c"]
+    dead = [json.loads(row) for row in redis.lists[settings.write_dead_letter_key]]
+    assert [row["conversation_id"] for row in dead] == ["b"]
+    assert dead[0]["user_message"] == "m"
+
+def test_vector_failure_is_repaired(db):
+    redis, vectors = FakeRedis(), FakeVectorStore()
+    writer = ConversationWriter(vectors, redis_client=redis)
+    vectors.fail = True
+
+    async def run():
+        await writer._write_batch(pending("a", "b"))
+        assert db["saved"] == ["a", "b"]
+        assert redis.sets[settings.write_vector_pending_key] == {"a", "b"}
+
+        # 补写失败时ID放回集合，下次重试
+        with pytest.raises(RuntimeError):
+            await writer.repair_vectors()
+        assert redis.sets[settings.write_vector_pending_key] == {"a", "b"}
+
+        vectors.fail = False
+        assert await writer.repair_vectors() == 2
+        assert sorted(vectors.added) == ["a", "b"]
+        assert redis.sets[settings.write_vector_pending_key] == set()
+        assert await writer.repair_vectors() == 0
+    asyncio.run(run())
+
+def test_worker_survives_unexpected_error(db, monkeypatch):
+    redis, vectors = FakeRedis(), FakeVectorStore()
+    writer = ConversationWriter(vectors, redis_client=redis)
+    original = writer._write_batch
+
+    async def write_batch(batch):
+        if any(item.user_message == "boom" for item in batch):
+            raise RuntimeError("unexpected")
+        await original(batch)
+
+    monkeypatch.setattr(writer, "_write_batch", write_batch)
+
+    async def run():
+        await writer.start()
+        await writer.submit("u1", "zh", "boom", "b")
+        await writer.queue.join()
+        await writer.submit("u1", "zh", "m", "b")
+        await writer.stop()
+
+    asyncio.run(run())
+    dead = [json.loads(row) for row in redis.lists[settings.write_dead_letter_key]]
+    assert [row["user_message"] for row in dead] == ["boom"]
+    assert len(db["saved"]) == 1 and vectors.added == db["saved"]
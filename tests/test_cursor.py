@@ -0,0 +1,28 @@
+import base64
+from datetime import datetime
+
+import pytest
+
+from database import models
+from database.crud import decode_cursor, encode_cursor
+
+def test_round_trip():
+    conversation = models.Conversation(conversation_id="c-1|x", created_at=datetime(2026, 1, 2, 3, 4, 5, 678))
+    assert decode_cursor(encode_cursor(conversation)) == (datetime(2026, 1, 2, 3, 4, 5, 678), "c-1|x")
+
+def test_cursor_is_url_safe():
+    conversation = models.Conversation(conversation_id="会话", created_at=datetime(2026, 1, 1))
+    cursor = encode_cursor(conversation)
+    assert all(c.isalnum() or c in "-_=" for c in cursor)
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not base64!",
+    "会话",
+    base64.urlsafe_b64encode(b"no-separator").decode(),
+    base64.urlsafe_b64encode(b"yesterday|c-1").decode(),
+    base64.urlsafe_b64encode(b"\xff\xfe|c-1").decode(),
+])
+def test_malformed_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
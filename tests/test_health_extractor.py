@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from core.health_extractor import KeywordExtractor, LLMExtractor
+
+def test_parse_fenced_array():
+    reply = "```json\n" + json.dumps([
+        {"id": 1, "emotion": -0.4, "signals": [{"type": "pain", "severity": "moderate", "detail": "腰疼"}]},
+        {"id": 2, "emotion": 0.6, "signals": []},
+    ], ensure_ascii=False) + "\n```"
+    first, second = LLMExtractor.parse(reply, 2)
+    assert first.emotion == -0.4
+    assert first.signals == [{"type": "pain", "severity": "moderate", "detail": "腰疼"}]
+    assert second.emotion == 0.6 and second.signals == []
+
+def test_parse_ignores_out_of_range_and_invalid_ids():
+    reply = json.dumps([
+        {"id": 0, "emotion": 1},
+        {"id": 3, "emotion": 1},
+        {"id": "x", "emotion": 1},
+        {"emotion": 1},
+        "not an object",
+        {"id": "2", "emotion": 0.5},
+    ])
+    first, second = LLMExtractor.parse(reply, 2)
+    assert first.emotion is None and first.signals == []
+    assert second.emotion == 0.5
+
+def test_parse_clamps_and_filters():
+    reply = json.dumps([{"id": 1, "emotion": -3, "signals": [
+        {"type": "fall", "severity": "extreme", "detail": "x" * 500},
+        {"type": "bogus"},
+        "pain",
+    ]}, {"id": 2, "emotion": "very happy"}])
+    first, second = LLMExtractor.parse(reply, 2)
+    assert first.emotion == -1.0
+    assert first.signals == [{"type": "fall", "severity": "mild", "detail": "x" * 200}]
+    assert second.emotion is None
+
+@pytest.mark.parametrize("reply", ["sorry, I cannot help", '{"id": 1}'])
+def test_parse_without_array_raises(reply):
+    with pytest.raises(ValueError):
+        LLMExtractor.parse(reply, 1)
+
+def test_parse_invalid_json_raises():
+    with pytest.raises(ValueError):
+        LLMExtractor.parse("[{id: 1,}]", 1)
+
+@pytest.mark.parametrize("text, language", [
+    ("I moved to Spain, my teacher loves painting", "en"),
+    ("I fell asleep early", "en"),
+    ("Het is zeer mooi weer, mijn moeder is moeilijk", "nl"),
+    ("太麻烦你了，真心疼你", "zh"),
+    ("I am not sad", "en"),
+    ("no pain today", "en"),
+    ("I don't feel lonely anymore", "en"),
+    ("Ik heb geen pijn", "nl"),
+    ("膝盖不疼了", "zh"),
+    ("今天没有头疼，也不孤单", "zh"),
+])
+def test_keywords_no_false_positives(text, language):
+    assert KeywordExtractor.classify(text, language).signals == []
+
+@pytest.mark.parametrize("text, language, expected", [
+    ("My back hurts and I had a fall", "en", {"pain", "fall"}),
+    ("Ik ben gevallen en voel me eenzaam", "nl", {"fall", "mood"}),
+    ("腰疼得厉害，晚上睡不着", "zh", {"pain", "sleep"}),
+    ("Ik heb hoofdpijn", None, {"pain"}),
+    ("I'm not sure why, but I feel sad", "en", {"mood"}),
+    ("Geen koorts, maar wel hoofdpijn", "nl", {"pain"}),
+])
+def test_keywords_detect_signals(text, language, expected):
+    assert {s["type"] for s in KeywordExtractor.classify(text, language).signals} == expected
+
+def test_keyword_emotion():
+    assert KeywordExtractor.classify("今天很开心", "zh").emotion == 1.0
+    assert KeywordExtractor.classify("Ik ben moe", "nl").emotion == -1.0
+    assert KeywordExtractor.classify("hello", "en").emotion == 0.0
+
+def test_keyword_emotion_context():
+    assert KeywordExtractor.classify("本月累计走了十万步", "zh").emotion == 0.0
+    assert KeywordExtractor.classify("今天好累", "zh").emotion == -1.0
+    assert KeywordExtractor.classify("Ik ga naar de markt", "nl").emotion == 0.0
+    assert KeywordExtractor.classify("I am not sad", "en").emotion == 0.0
+    assert KeywordExtractor.classify("I am not happy", "en").emotion == -1.0
+    assert KeywordExtractor.classify("我不开心", "zh").emotion == -1.0
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fakes import InMemoryConversationMemory
+from config.settings import settings
+from core.history_summarizer import HistorySummarizer
+
+class FakeLLM:
+    """摘要调用期间执行during（模拟并发的对话轮次或其他进程）"""
+
+    def __init__(self, during=None):
+        self.during = during
+        self.calls = 0
+
+    async def chat(self, language, system_prompt, user_message):
+        self.calls += 1
+        if self.during is not None:
+            await self.during()
+        return f"summary {self.calls}"
+
+async def fill(memory, user_id: str, turns: int, start: int = 0):
+    for i in range(start, start + turns):
+        await memory.add_turn(user_id, f"q{i}", f"a{i}")
+
+def test_compacts_older_messages():
+    async def run():
+        memory = InMemoryConversationMemory()
+        await fill(memory, "u1", settings.history_summary_trigger // 2)
+        summarizer = HistorySummarizer(FakeLLM(), memory)
+        await summarizer._summarize("u1", "zh")
+        summary, messages = await memory.get_history("u1")
+        assert summary == "summary 1"
+        assert len(messages) == settings.history_keep_recent
+        assert messages[-1]["content"] == f"a{settings.history_summary_trigger // 2 - 1}"
+    asyncio.run(run())
+
+def test_new_turns_during_summary_are_kept():
+    async def run():
+        memory = InMemoryConversationMemory()
+        await fill(memory, "u1", settings.history_summary_trigger // 2)
+        summarizer = HistorySummarizer(FakeLLM(lambda: fill(memory, "u1", 1, start=100)), memory)
+        await summarizer._summarize("u1", "zh")
+        summary, messages = await memory.get_history("u1")
+        assert summary == "summary 1"
+        assert [m["content"] for m in messages[-2:]] == ["q100", "a100"]
+        assert len(messages) == settings.history_keep_recent + 2
+    asyncio.run(run())
+
+def test_list_changed_during_summary_is_not_compacted():
+    async def run():
+        # 摘要期间新消息把列表截断，最早的消息已不是被摘要的那些
+        memory = InMemoryConversationMemory(max_messages=settings.history_summary_trigger)
+        await fill(memory, "u1", settings.history_summary_trigger // 2)
+        summarizer = HistorySummarizer(FakeLLM(lambda: fill(memory, "u1", 1, start=100)), memory)
+        await summarizer._summarize("u1", "zh")
+        summary, messages = await memory.get_history("u1")
+        assert summary is None
+        assert len(messages) == settings.history_summary_trigger
+        assert messages[0]["content"] == "q1"
+    asyncio.run(run())
+
+def test_summary_changed_during_summary_is_not_compacted():
+    async def run():
+        memory = InMemoryConversationMemory()
+        await fill(memory, "u1", settings.history_summary_trigger // 2)
+        other = HistorySummarizer(FakeLLM(), memory)  # 模拟另一个进程先完成了摘要
+        summarizer = HistorySummarizer(FakeLLM(lambda: other._summarize("u1", "zh")), memory)
+        await summarizer._summarize("u1", "zh")
+        summary, messages = await memory.get_history("u1")
+        assert summary == "summary 1"
+        assert len(messages) == settings.history_keep_recent
+    asyncio.run(run())
+
+def test_compact_script(monkeypatch):
+    """ConversationMemory.compact 的Lua脚本（需要安装 fakeredis[lua]，否则跳过）"""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    from memory import conversation_memory
+
+    monkeypatch.setattr(conversation_memory, "get_redis", lambda: fakeredis.FakeAsyncRedis(decode_responses=True))
+
+    async def run():
+        memory = conversation_memory.ConversationMemory()
+        await fill(memory, "u1", 3)
+        _, messages = await memory.get_history("u1")
+        older = messages[:4]
+        assert not await memory.compact("u1", older, "stale summary", "s1")
+        assert await memory.compact("u1", older, None, "s1")
+        summary, messages = await memory.get_history("u1")
+        assert summary == "s1" and [m["content"] for m in messages] == ["q2", "a2"]
+        # 列表开头已变化：不再删除
+        assert not await memory.compact("u1", older, "s1", "s2")
+        assert (await memory.get_history("u1"))[0] == "s1"
+    asyncio.run(run())
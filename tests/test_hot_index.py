@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from memory import hot_index
+from memory.hot_index import HotIndex, UserRing
+
+DIM = 8
+
+def unit(i: int) -> np.ndarray:
+    v = np.zeros(DIM, dtype=np.float32)
+    v[i % DIM] = 1.0
+    return v
+
+def test_ring_grows_until_capacity():
+    ring = UserRing(DIM, capacity=10, dtype=np.float32, initial=2)
+    for i in range(5):
+        ring.add(f"c{i}", f"t{i}", unit(i), float(i))
+    assert ring.vectors.shape[0] == 8
+    assert len(ring.texts) == len(ring.ids) == ring.created_at.shape[0] == 8
+    for i in range(5):
+        ring.add(f"c{i + 5}", f"t{i + 5}", unit(i), float(i + 5))
+    assert ring.vectors.shape[0] == 10
+    assert [e[0] for e in ring.entries()] == [f"c{i}" for i in range(10)]
+
+def test_ring_wraparound_keeps_newest_in_order():
+    ring = UserRing(DIM, capacity=3, dtype=np.float32, initial=2)
+    ring.complete = True
+    for i in range(5):
+        ring.add(f"c{i}", f"t{i}", unit(i), float(i))
+    assert ring.count == 3
+    assert not ring.complete
+    assert [e[0] for e in ring.entries()] == ["c2", "c3", "c4"]
+    assert [e[3] for e in ring.entries()] == [2.0, 3.0, 4.0]
+
+def test_ring_string_bytes_follow_overwrites():
+    ring = UserRing(DIM, capacity=2, dtype=np.float32)
+    ring.add("c0", "x" * 1000, unit(0), 0.0)
+    ring.add("c1", "x" * 1000, unit(1), 1.0)
+    full = ring.string_bytes
+    ring.add("c2", "y", unit(2), 2.0)
+    assert ring.string_bytes < full
+    assert ring.nbytes > ring.vectors.nbytes + ring.created_at.nbytes
+
+def test_ring_search_top_k():
+    ring = UserRing(DIM, capacity=4, dtype=np.float32)
+    for i in range(4):
+        ring.add(f"c{i}", f"t{i}", unit(i), float(i))
+    query = unit(2) + 0.5 * unit(1)
+    query /= np.linalg.norm(query)
+    assert [r["text"] for r in ring.search(query, 2)] == ["t2", "t1"]
+    assert len(ring.search(query, 10)) == 4
+
+def test_search_requires_seed():
+    index = HotIndex(DIM, capacity=4, max_bytes=2 ** 20, dtype="float32", ttl=0)
+    index.add("u", "zh", "c0", "t0", unit(0))
+    assert index.search("u", "zh", unit(0), 1) is None
+    index.seed("u", "zh", [], complete=True)
+    result = index.search("u", "zh", unit(0), 1)
+    assert result.complete and result.results[0]["text"] == "t0"
+
+def test_seed_keeps_entries_written_while_loading():
+    index = HotIndex(DIM, capacity=4, max_bytes=2 ** 20, dtype="float32", ttl=0)
+    index.add("u", "zh", "new", "new", unit(3), created_at=30.0)
+    index.seed("u", "zh", [("old", "old", unit(1), 10.0), ("new", "new", unit(3), 30.0)], complete=True)
+    ring = index._rings[("zh", "u")]
+    assert [e[0] for e in ring.entries()] == ["old", "new"]
+    assert ring.complete
+
+def test_expired_ring_is_a_miss(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(hot_index.time, "monotonic", lambda: now[0])
+    index = HotIndex(DIM, capacity=4, max_bytes=2 ** 20, dtype="float32", ttl=60)
+    index.seed("u", "zh", [("c0", "t0", unit(0), 1.0)], complete=True)
+    assert index.search("u", "zh", unit(0), 1) is not None
+    now[0] += 61
+    assert index.needs_seed("u", "zh")
+    assert index.search("u", "zh", unit(0), 1) is None
+    assert index.stats()["stale"] == 1
+
+def test_evicts_least_recently_used_user():
+    index = HotIndex(DIM, capacity=4, max_bytes=1, dtype="float32", ttl=0)
+    index.seed("a", "zh", [("c0", "t0", unit(0), 1.0)], complete=True)
+    index.seed("b", "zh", [("c1", "t1", unit(1), 1.0)], complete=True)
+    assert list(index._rings) == [("zh", "b")]
+    assert index.nbytes == index._rings[("zh", "b")].nbytes
+
+@pytest.mark.parametrize("dtype", ["float16", "float32"])
+def test_partial_when_history_exceeds_capacity(dtype):
+    index = HotIndex(DIM, capacity=2, max_bytes=2 ** 20, min_score=0.99, dtype=dtype, ttl=0)
+    index.seed("u", "zh", [(f"c{i}", f"t{i}", unit(i), float(i)) for i in range(2)], complete=False)
+    result = index.search("u", "zh", unit(5), 2)
+    assert not result.complete
+    assert result.oldest == 0.0
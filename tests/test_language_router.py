@@ -0,0 +1,54 @@
+import pytest
+
+from config.settings import settings
+from core.language_router import LanguageRouter, NGramDetector, ScriptDetector
+
+def test_cjk_ratio():
+    detector = ScriptDetector(cjk_ratio=0.3)
+    assert detector.detect("今天天气不错") == ("zh", 1.0)
+    assert detector.detect("我今天吃了pizza") == ("zh", 1.0)  # 4/9 汉字
+    assert detector.detect("I love 饺子 very much") is None  # 2/14 汉字
+    assert detector.detect("12345 !?") is None
+
+@pytest.mark.parametrize("text, expected", [
+    ("Ik heb slecht geslapen", "nl"),
+    ("Mijn rug doet pijn", "nl"),
+    ("Hoe gaat het met je?", "nl"),
+    ("I slept badly last night", "en"),
+    ("My knee hurts a little", "en"),
+    ("The doctor said I should walk more", "en"),
+])
+def test_ngram_nl_en(text, expected):
+    language, confidence = NGramDetector().detect(text)
+    assert language == expected and 0 < confidence <= 1
+
+def test_ngram_undecided():
+    assert NGramDetector().detect("ok") is None
+    assert NGramDetector().detect("") is None
+
+def test_short_input_uses_users_last_language():
+    router = LanguageRouter()
+    assert router.detect_language("ok", default="zh", user_id="u1") == "zh"
+    assert router.detect_language("Ik ben een beetje moe", user_id="u1") == "nl"
+    assert router.detect_language("ok", user_id="u1") == "nl"
+    assert router.detect_language("ja", user_id="u1") == "nl"
+    assert router.detect_language("ok", default="en", user_id="u2") == "en"
+    assert router.detect_language("ok", default="en") == "en"
+    # 可判断的消息会更新用户的语言
+    assert router.detect_language("我有点想我女儿了", user_id="u1") == "zh"
+    assert router.detect_language("ok", user_id="u1") == "zh"
+
+def test_user_language_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(settings, "language_cache_size", 2)
+    router = LanguageRouter()
+    router.detect_language("Ik heb slecht geslapen", user_id="u1")
+    router.detect_language("I slept badly last night", user_id="u2")
+    router.detect_language("ok", user_id="u1")  # u1变为最近使用
+    router.detect_language("今天天气不错", user_id="u3")
+    assert router.detect_language("ok", default="zh", user_id="u1") == "nl"
+    assert router.detect_language("ok", default="zh", user_id="u2") == "zh"
+
+def test_low_confidence_falls_back():
+    router = LanguageRouter(min_confidence=0.5)
+    assert router.detect_language("Hello, goedemorgen", default="zh") == "zh"  # 混合文本，置信度约0.33
+    assert router.detect_language("Mijn rug doet pijn", default="zh") == "nl"
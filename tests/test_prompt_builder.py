@@ -0,0 +1,80 @@
+import pytest
+
+from config.settings import settings
+from core import prompt_builder
+from core.prompt_builder import PromptBuilder
+
+@pytest.fixture(autouse=True)
+def char_counter(monkeypatch):
+    """按字符数估算token（ASCII约4个字符1 token），结果不依赖tiktoken编码文件"""
+    monkeypatch.setattr(prompt_builder, "get_encoding", lambda model: None)
+    monkeypatch.setattr(settings, "prompt_rag_max_tokens", 75)
+    monkeypatch.setattr(settings, "prompt_summary_max_tokens", 10)
+
+def turn(i: int):
+    return [
+        {"role": "user", "content": f"question number {i} " + "q" * 20},
+        {"role": "assistant", "content": f"answer number {i} " + "a" * 20},
+    ]
+
+def test_required_parts_are_kept_when_budget_is_exhausted():
+    built = PromptBuilder("test-model", budget=10).build(
+        language="en",
+        system_prompt="You are a friendly companion. " * 5,
+        user_message="How are you?",
+        history=turn(1),
+        snippets=[{"text": "old memory", "score": 0.9}],
+    )
+    assert built.system_prompt.startswith("You are a friendly companion.")
+    assert built.user_message == "How are you?"
+    assert built.history == []
+    assert built.dropped_snippets == 1 and built.dropped_messages == 2
+    assert built.tokens["rag"] == built.tokens["history"] == 0
+
+def test_summary_is_truncated_into_context():
+    built = PromptBuilder("test-model", budget=500).build(
+        language="en",
+        system_prompt="system",
+        user_message="hi",
+        context="User info: Anna, 82",
+        summary="s" * 400,
+    )
+    assert built.context.startswith("User info: Anna, 82\n<conversation_summary>\n")
+    assert 0 < built.tokens["summary"] <= settings.prompt_summary_max_tokens
+    assert built.tokens["context"] > built.tokens["summary"]
+
+def test_rag_snippets_by_score_within_cap():
+    snippets = [
+        {"text": "low score " + "l" * 20, "score": 0.2},
+        {"text": "best match " + "b" * 40, "score": 0.9},
+        {"text": "too long " + "x" * 400, "score": 0.8},
+        {"text": "second " + "s" * 20, "score": 0.5},
+    ]
+    built = PromptBuilder("test-model", budget=1000).build(
+        language="en", system_prompt="system", user_message="hi", snippets=snippets,
+    )
+    message = built.user_message
+    assert "too long" not in message
+    assert message.index("best match") < message.index("second")
+    assert "low score" not in message  # 超出 prompt_rag_max_tokens
+    assert built.dropped_snippets == 2
+    assert message.endswith("hi")
+    assert 0 < built.tokens["rag"] <= settings.prompt_rag_max_tokens + prompt_builder.MESSAGE_OVERHEAD
+
+def test_history_is_filled_newest_first():
+    history = turn(1) + turn(2) + turn(3)
+    builder = PromptBuilder("test-model", budget=1000)
+    full = builder.build(language="en", system_prompt="system", user_message="hi", history=history)
+    assert full.history == history and full.dropped_messages == 0
+
+    # 预算只够最近三条：最早的一条被丢弃，留下的以助手回复开头，也一并丢弃
+    per_message = builder._message_tokens(history[0]["content"])
+    budget = full.tokens["total"] - full.tokens["history"] + 3 * per_message
+    built = PromptBuilder("test-model", budget=budget).build(
+        language="en", system_prompt="system", user_message="hi", history=history,
+    )
+    assert built.history == turn(3)
+    assert built.history[0]["role"] == "user"
+    assert built.dropped_messages == 4
+    assert built.tokens["total"] <= budget
+    assert built.tokens["history"] == sum(builder._message_tokens(m["content"]) for m in turn(3))
@@ -0,0 +1,73 @@
+import numpy as np
+
+from config.settings import settings
+from memory import semantic_cache
+from memory.semantic_cache import SemanticCache
+
+def vector(*values):
+    return np.array(values, dtype=np.float32)
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+def test_threshold():
+    cache = SemanticCache(threshold=0.95, ttl=60, max_users=10, max_entries_per_user=10)
+    cache.store("zh", "u1", vector(1, 0, 0), "回复")
+    assert cache.lookup("zh", "u1", vector(2, 0, 0)) == "回复"  # 只比较方向
+    assert cache.lookup("zh", "u1", vector(1, 0.2, 0)) == "回复"  # 余弦约0.98
+    assert cache.lookup("zh", "u1", vector(1, 0.5, 0)) is None  # 余弦约0.89
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+
+def test_best_match_wins():
+    cache = SemanticCache(threshold=0.9, ttl=60, max_users=10, max_entries_per_user=10)
+    cache.store("en", "u1", vector(1, 0, 0), "first")
+    cache.store("en", "u1", vector(0, 1, 0), "second")
+    assert cache.lookup("en", "u1", vector(0.1, 1, 0)) == "second"
+
+def test_scoped_by_language_and_user():
+    cache = SemanticCache(threshold=0.9, ttl=60, max_users=10, max_entries_per_user=10)
+    cache.store("zh", "u1", vector(1, 0, 0), "回复")
+    assert cache.lookup("zh", "u2", vector(1, 0, 0)) is None
+    assert cache.lookup("nl", "u1", vector(1, 0, 0)) is None
+    assert cache.lookup("zh", "u1", vector(1, 0, 0)) == "回复"
+
+def test_ttl_expiry(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(semantic_cache, "time", clock)
+    cache = SemanticCache(threshold=0.9, ttl=60, max_users=10, max_entries_per_user=10)
+    cache.store("zh", "u1", vector(1, 0, 0), "旧回复")
+    clock.now += 30
+    cache.store("zh", "u1", vector(0, 1, 0), "新回复")
+    clock.now += 40
+    assert cache.lookup("zh", "u1", vector(1, 0, 0)) is None
+    assert cache.lookup("zh", "u1", vector(0, 1, 0)) == "新回复"
+    clock.now += 30
+    assert cache.lookup("zh", "u1", vector(0, 1, 0)) is None
+    assert cache.stats()["users"] == 0  # 全部过期后释放用户范围
+
+def test_lru_eviction():
+    cache = SemanticCache(threshold=0.9, ttl=60, max_users=2, max_entries_per_user=2)
+    cache.store("zh", "u1", vector(1, 0, 0), "a")
+    cache.store("zh", "u1", vector(0, 1, 0), "b")
+    cache.store("zh", "u1", vector(0, 0, 1), "c")
+    assert cache.lookup("zh", "u1", vector(1, 0, 0)) is None  # 每用户最多2条，最早的被淘汰
+    assert cache.lookup("zh", "u1", vector(0, 0, 1)) == "c"
+
+    cache.store("zh", "u2", vector(1, 0, 0), "u2")
+    assert cache.lookup("zh", "u1", vector(0, 1, 0)) == "b"  # u1变为最近使用
+    cache.store("zh", "u3", vector(1, 0, 0), "u3")
+    assert cache.lookup("zh", "u2", vector(1, 0, 0)) is None
+    assert cache.lookup("zh", "u1", vector(0, 1, 0)) == "b"
+    assert cache.stats()["users"] == 2
+
+def test_enabled_for_persona(monkeypatch):
+    monkeypatch.setattr(settings, "semantic_cache_enabled", True)
+    monkeypatch.setattr(settings, "semantic_cache_disabled_personas", ["nl"])
+    assert SemanticCache.enabled_for("zh")
+    assert not SemanticCache.enabled_for("nl")
+    monkeypatch.setattr(settings, "semantic_cache_enabled", False)
+    assert not SemanticCache.enabled_for("zh")
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fakes import LocalPubSubRedis
+from database import models
+from database.crud import UserCRUD
+from memory.user_context import UserContextCache
+
+def make_user(age: int, interests=None) -> models.User:
+    user = models.User(user_id="u1", name="王奶奶", age=age, preferred_language="zh")
+    user.profile = models.UserProfile(user_id="u1", interests=interests) if interests else None
+    return user
+
+@pytest.fixture
+def users(monkeypatch):
+    """模拟数据库中的用户行；loads记录查询次数"""
+    state = {"user": make_user(80), "loads": 0, "gate": None}
+
+    async def get_user_with_profile(db, user_id):
+        state["loads"] += 1
+        user = state["user"] if user_id == "u1" else None  # 查询时刻的数据
+        if state["gate"] is not None:
+            await state["gate"].wait()
+        return user
+
+    monkeypatch.setattr(UserCRUD, "get_user_with_profile", staticmethod(get_user_with_profile))
+    return state
+
+def test_get_is_cached(users):
+    async def run():
+        cache = UserContextCache(redis_client=LocalPubSubRedis(), max_entries=10, ttl=60)
+        first = await cache.get(None, "u1")
+        second = await cache.get(None, "u1")
+        assert first is second
+        assert users["loads"] == 1
+        assert await cache.get(None, "missing") is None
+        assert await cache.get(None, "missing") is None
+        assert users["loads"] == 2
+    asyncio.run(run())
+
+def test_update_then_get_returns_fresh_data(users):
+    async def run():
+        cache = UserContextCache(redis_client=LocalPubSubRedis(), max_entries=10, ttl=60)
+        assert "年龄: 80" in (await cache.get(None, "u1")).info("zh")
+        users["user"] = make_user(81, interests=["园艺"])
+        await cache.invalidate("u1")
+        info = (await cache.get(None, "u1")).info("zh")
+        assert "年龄: 81" in info and "兴趣爱好: 园艺" in info
+    asyncio.run(run())
+
+def test_load_racing_an_invalidation_is_not_cached(users):
+    async def run():
+        cache = UserContextCache(redis_client=LocalPubSubRedis(), max_entries=10, ttl=60)
+        users["gate"] = asyncio.Event()
+        loading = asyncio.create_task(cache.get(None, "u1"))
+        await asyncio.sleep(0)
+        # 加载期间用户被修改：已读到的旧数据可以返回给本次调用，但不能写入缓存
+        users["user"] = make_user(81)
+        await cache.invalidate("u1")
+        users["gate"].set()
+        assert "年龄: 80" in (await loading).info("zh")
+        users["gate"] = None
+        assert "年龄: 81" in (await cache.get(None, "u1")).info("zh")
+        assert users["loads"] == 2
+    asyncio.run(run())
+
+def test_invalidation_reaches_other_processes(users):
+    async def run():
+        bus = LocalPubSubRedis()
+        writer, reader = UserContextCache(redis_client=bus, ttl=60), UserContextCache(redis_client=bus, ttl=60)
+        await reader.start()
+        await asyncio.sleep(0.01)
+        await reader.get(None, "u1")
+        users["user"] = make_user(81)
+        await writer.invalidate("u1")
+        await asyncio.sleep(0.01)
+        assert "年龄: 81" in (await reader.get(None, "u1")).info("zh")
+        await reader.close()
+    asyncio.run(run())
+
+def test_lru_eviction(users):
+    async def run():
+        cache = UserContextCache(redis_client=LocalPubSubRedis(), max_entries=1, ttl=60)
+        await cache.get(None, "u1")
+        await cache.get(None, "other")
+        await cache.get(None, "u1")
+        assert users["loads"] == 3
+    asyncio.run(run())
@@ -0,0 +1,62 @@
+import asyncio
+import uuid
+
+import pytest
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import PointStruct
+
+from benchmarks.fakes import StubEmbeddings
+from config.settings import settings
+from memory import vector_store
+from memory.vector_store import VectorStore, collection_alias, has_points_without_created_at
+
+DIM = 16
+
+@pytest.fixture
+def store(monkeypatch):
+    """使用Qdrant本地模式（内存）的VectorStore"""
+    monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+    monkeypatch.setattr(vector_store, "create_client", lambda: AsyncQdrantClient(location=":memory:"))
+    return VectorStore(embeddings=StubEmbeddings(dim=DIM), embedding_dim=DIM)
+
+async def add_legacy_point(store: VectorStore, user_id: str, text: str):
+    """旧版本写入的point：payload中没有created_at"""
+    vector = StubEmbeddings(dim=DIM).embed_query(text)
+    await store.client.upsert(collection_alias("zh"), points=[PointStruct(
+        id=str(uuid.uuid4()), vector=vector, payload={"user_id": user_id, "text": text}
+    )])
+
+def test_legacy_points_are_searched_after_seeding(store):
+    async def run():
+        await store.ensure_collections()
+        await add_legacy_point(store, "u1", "用户: 我的猫叫咪咪\n助手: 好可爱")
+        await store.add_conversations([{
+            "conversation_id": str(uuid.uuid4()), "user_id": "u1", "language": "zh",
+            "user_message": "今天天气很好", "bot_response": "出去走走吧", "created_at": None,
+        }])
+        assert await has_points_without_created_at(store.client, collection_alias("zh"), "u1")
+        assert not await has_points_without_created_at(store.client, collection_alias("zh"), "u2")
+
+        await store.search_similar_conversations("u1", "zh", "我的猫", limit=2)
+        await asyncio.gather(*store._seeding.values())
+        # 近期索引只加载到有created_at的那一条，不能认为已覆盖全部历史
+        assert store.hot_index.search("u1", "zh", StubEmbeddings(dim=DIM).embed_query("猫"), 2).complete is False
+
+        results = await store.search_similar_conversations("u1", "zh", "我的猫", limit=2)
+        assert any("咪咪" in r["text"] for r in results)
+        await store.close()
+    asyncio.run(run())
+
+def test_seeding_without_legacy_points_is_complete(store):
+    async def run():
+        await store.ensure_collections()
+        await store.add_conversations([{
+            "conversation_id": str(uuid.uuid4()), "user_id": "u1", "language": "zh",
+            "user_message": "今天天气很好", "bot_response": "出去走走吧", "created_at": None,
+        }])
+        store.hot_index = type(store.hot_index)(DIM)  # 模拟重启后的空索引
+        await store.search_similar_conversations("u1", "zh", "天气", limit=2)
+        await asyncio.gather(*store._seeding.values())
+        assert store.hot_index.search("u1", "zh", StubEmbeddings(dim=DIM).embed_query("天气"), 2).complete
+        await store.close()
+    asyncio.run(run())